@@ -1,58 +1,214 @@
 // Personal Finance Tracker Application
+const TRANSACTIONS_PAGE_SIZE = 50;
+const VIRTUAL_ROW_FALLBACK_HEIGHT = 72;
+const SEARCH_DEBOUNCE_MS = 200;
+
+// Scrolling list that only keeps DOM nodes for the rows in view (plus a few
+// either side). Rows are absolutely positioned at index * rowHeight inside a
+// spacer as tall as the whole list, and the same nodes are refilled as the
+// user scrolls, so the cost of a render does not depend on the list length.
+class VirtualList {
+    constructor(container, { createRow, updateRow, onNearEnd, overscan = 10 }) {
+        this.container = container;
+        this.createRow = createRow;
+        this.updateRow = updateRow;
+        this.onNearEnd = onNearEnd;
+        this.overscan = overscan;
+        this.items = [];
+        this.rowHeight = 0;
+        this.rows = [];
+        this.frame = null;
+
+        this.viewport = document.createElement('div');
+        this.viewport.className = 'virtual-list';
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'virtual-list-spacer';
+        this.viewport.appendChild(this.spacer);
+
+        this.viewport.addEventListener('scroll', () => this.scheduleRender(), { passive: true });
+        window.addEventListener('resize', () => {
+            this.rowHeight = 0;
+            this.scheduleRender();
+        });
+    }
+
+    mount() {
+        if (this.viewport.parentNode !== this.container) {
+            this.container.replaceChildren(this.viewport);
+        }
+    }
+
+    setItems(items) {
+        this.items = items;
+        this.scheduleRender();
+    }
+
+    scheduleRender() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    render() {
+        // Measure with a real row: the height depends on the stylesheet and
+        // viewport width. A hidden list measures 0 and is measured again later.
+        if (!this.rowHeight && this.items.length > 0) {
+            if (this.rows.length === 0) {
+                const row = this.createRow();
+                this.spacer.appendChild(row);
+                this.rows.push(row);
+            }
+            this.rows[0].style.display = '';
+            this.updateRow(this.rows[0], this.items[0]);
+            this.rowHeight = this.rows[0].offsetHeight;
+        }
+
+        const height = this.rowHeight || VIRTUAL_ROW_FALLBACK_HEIGHT;
+        this.spacer.style.height = `${this.items.length * height}px`;
+        const first = Math.max(0, Math.floor(this.viewport.scrollTop / height) - this.overscan);
+        const last = Math.min(this.items.length,
+            Math.ceil((this.viewport.scrollTop + this.viewport.clientHeight) / height) + this.overscan);
+
+        while (this.rows.length < last - first) {
+            const row = this.createRow();
+            this.spacer.appendChild(row);
+            this.rows.push(row);
+        }
+
+        this.rows.forEach((row, offset) => {
+            const index = first + offset;
+            if (index < last) {
+                this.updateRow(row, this.items[index]);
+                row.style.transform = `translateY(${index * height}px)`;
+                row.style.display = '';
+            } else {
+                row.style.display = 'none';
+            }
+        });
+
+        if (this.onNearEnd && last >= this.items.length - this.overscan) {
+            this.onNearEnd();
+        }
+    }
+}
+
+// IndexedDB copy of the signed-in user's transactions and budgets, kept current
+// through /api/sync so the dashboard can render before the network answers.
+// It is cleared on logout unless the user opted to keep it on this device.
+// Every method quietly does nothing where IndexedDB is unavailable.
+class LocalStore {
+    constructor() {
+        this.db = null;
+    }
+
+    async open(userId) {
+        if (!('indexedDB' in window)) return;
+
+        if (!this.db) {
+            this.db = await new Promise((resolve, reject) => {
+                const request = indexedDB.open('finance-tracker', 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore('transactions', { keyPath: 'id' });
+                    request.result.createObjectStore('budgets', { keyPath: 'id' });
+                    request.result.createObjectStore('meta', { keyPath: 'key' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            }).catch(error => {
+                console.error('Local store unavailable:', error);
+                return null;
+            });
+        }
+
+        // Data kept across a logout is never shown to a different user
+        if ((await this.getMeta('userId')) !== userId) {
+            await this.clear();
+            await this.setMeta('userId', userId);
+        }
+    }
+
+    transaction(stores, mode, work) {
+        if (!this.db) return Promise.resolve(null);
+
+        return new Promise((resolve, reject) => {
+            const tx = this.db.transaction(stores, mode);
+            let result = null;
+            work(tx, value => { result = value; });
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    async getMeta(key) {
+        const entry = await this.transaction(['meta'], 'readonly', (tx, done) => {
+            const request = tx.objectStore('meta').get(key);
+            request.onsuccess = () => done(request.result);
+        });
+        return entry ? entry.value : null;
+    }
+
+    setMeta(key, value) {
+        return this.transaction(['meta'], 'readwrite', tx => tx.objectStore('meta').put({ key, value }));
+    }
+
+    getAll(store) {
+        return this.transaction([store], 'readonly', (tx, done) => {
+            const request = tx.objectStore(store).getAll();
+            request.onsuccess = () => done(request.result);
+        }).then(rows => rows || []);
+    }
+
+    // Apply one /api/sync page and its cursor atomically
+    applySync(page) {
+        return this.transaction(['transactions', 'budgets', 'meta'], 'readwrite', tx => {
+            for (const store of ['transactions', 'budgets']) {
+                const objectStore = tx.objectStore(store);
+                if (page.reset) {
+                    objectStore.clear();
+                }
+                for (const row of page[store]) {
+                    if (row.deleted_at) {
+                        objectStore.delete(row.id);
+                    } else {
+                        objectStore.put(row);
+                    }
+                }
+            }
+            tx.objectStore('meta').put({ key: 'syncCursor', value: page.nextCursor });
+        });
+    }
+
+    clear() {
+        return this.transaction(['transactions', 'budgets', 'meta'], 'readwrite', tx => {
+            ['transactions', 'budgets', 'meta'].forEach(store => tx.objectStore(store).clear());
+        });
+    }
+}
+
 class FinanceTracker {
     constructor() {
         this.currentUser = null;
-        this.users = [
-            {
-                id: 1,
-                username: "admin",
-                password: "password123",
-                email: "admin@example.com"
-            }
-        ];
-        this.transactions = [
-            {
-                id: 1,
-                user_id: 1,
-                amount: 45.99,
-                category: "Food",
-                description: "Grocery shopping",
-                transaction_type: "expense",
-                date: "2024-12-01",
-                created_at: new Date().toISOString()
-            },
-            {
-                id: 2,
-                user_id: 1,
-                amount: 2500.00,
-                category: "Income",
-                description: "Monthly salary",
-                transaction_type: "income",
-                date: "2024-12-01",
-                created_at: new Date().toISOString()
-            },
-            {
-                id: 3,
-                user_id: 1,
-                amount: 1200.00,
-                category: "Housing",
-                description: "Rent payment",
-                transaction_type: "expense",
-                date: "2024-12-01",
-                created_at: new Date().toISOString()
-            }
-        ];
-        this.budgets = [
-            { id: 1, user_id: 1, category: "Food", amount: 400, month: "2024-12" },
-            { id: 2, user_id: 1, category: "Transportation", amount: 200, month: "2024-12" },
-            { id: 3, user_id: 1, category: "Housing", amount: 1200, month: "2024-12" },
-            { id: 4, user_id: 1, category: "Entertainment", amount: 150, month: "2024-12" },
-            { id: 5, user_id: 1, category: "Healthcare", amount: 100, month: "2024-12" },
-            { id: 6, user_id: 1, category: "Shopping", amount: 250, month: "2024-12" }
-        ];
+        this.transactions = [];
+        this.transactionsCursor = null;
+        this.transactionsRequest = null;
+        this.transactionsGeneration = 0;
+        this.transactionFilters = {};
+        this.searchTimer = null;
         this.currentPage = 'login';
         this.editingTransaction = null;
         this.expenseChart = null;
+        this.trendChart = null;
+        // The loaded transactions in list order, and the same objects by id
+        this.transactionIndex = new Map();
+        this.transactionList = null;
+        // Last response and ETag per GET URL, revalidated with If-None-Match
+        this.validatedResponses = new Map();
+        this.localStore = new LocalStore();
+        this.syncRequest = null;
         
         this.init();
     }
@@ -80,6 +236,13 @@ class FinanceTracker {
         document.getElementById('add-transaction-btn').addEventListener('click', () => this.showTransactionForm());
         document.getElementById('transaction-form').addEventListener('submit', (e) => this.handleTransactionSubmit(e));
         document.getElementById('cancel-transaction').addEventListener('click', () => this.hideTransactionForm());
+        document.getElementById('transaction-filters').addEventListener('change', () => this.handleFilterChange());
+        document.getElementById('transaction-filters').addEventListener('submit', (e) => e.preventDefault());
+        // Search as the user types, once they pause
+        document.getElementById('filter-search').addEventListener('input', () => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.handleFilterChange(), SEARCH_DEBOUNCE_MS);
+        });
         
         // Budget management
         document.getElementById('budget-form').addEventListener('submit', (e) => this.handleBudgetSubmit(e));
@@ -88,24 +251,157 @@ class FinanceTracker {
         document.getElementById('trans-date').value = new Date().toISOString().split('T')[0];
     }
 
-    handleLogin(e) {
+    async request(url, options = {}) {
+        const isGet = !options.method || options.method.toUpperCase() === 'GET';
+        const cached = isGet ? this.validatedResponses.get(url) : null;
+        const response = await fetch(url, {
+            credentials: 'same-origin',
+            // GET validators are handled here rather than by the browser cache
+            ...(isGet ? { cache: 'no-store' } : {}),
+            ...options,
+            headers: {
+                'Content-Type': 'application/json',
+                ...(cached ? { 'If-None-Match': cached.etag } : {}),
+                ...options.headers
+            }
+        });
+
+        // Nothing changed on the server: reuse the previous body
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+
+        const data = await response.json().catch(() => ({}));
+
+        if (!response.ok) {
+            throw new Error(data.error || `Request failed with status ${response.status}`);
+        }
+
+        const etag = response.headers.get('ETag');
+        if (isGet && etag) {
+            this.rememberResponse(url, etag, data);
+        }
+
+        return data;
+    }
+
+    rememberResponse(url, etag, data) {
+        this.validatedResponses.delete(url);
+        this.validatedResponses.set(url, { etag, data });
+        // Keep the most recently used 50 URLs
+        if (this.validatedResponses.size > 50) {
+            this.validatedResponses.delete(this.validatedResponses.keys().next().value);
+        }
+    }
+
+    async handleLogin(e) {
         e.preventDefault();
         const username = document.getElementById('username').value;
         const password = document.getElementById('password').value;
-        
-        const user = this.users.find(u => u.username === username && u.password === password);
-        
-        if (user) {
-            this.currentUser = user;
+        const keepLocalData = document.getElementById('keep-local-data').checked;
+        
+        try {
+            const data = await this.request('/api/auth/login', {
+                method: 'POST',
+                body: JSON.stringify({ username, password })
+            });
+            this.currentUser = data.user;
+            this.hideError('login-error');
             this.showPage('dashboard');
-            this.updateDashboard();
-        } else {
+        } catch (error) {
             this.showError('login-error', 'Invalid username or password');
+            return;
         }
+
+        // Paint from the local copy first, then catch up with the server
+        try {
+            await this.localStore.open(this.currentUser.id);
+            await this.localStore.setMeta('keepAfterLogout', keepLocalData);
+            await this.renderDashboardFromLocal();
+        } catch (error) {
+            console.error('Local store error:', error);
+        }
+        this.updateDashboard();
+        this.syncLocalData();
     }
 
-    handleLogout() {
+    // Pull every change since the stored cursor into the local store
+    syncLocalData() {
+        if (!this.syncRequest) {
+            this.syncRequest = (async () => {
+                let cursor = await this.localStore.getMeta('syncCursor');
+                let page;
+                do {
+                    page = await this.request(`/api/sync${cursor ? `?since=${encodeURIComponent(cursor)}` : ''}`);
+                    await this.localStore.applySync(page);
+                    cursor = page.nextCursor;
+                } while (page.hasMore);
+            })()
+                .catch(error => console.error('Sync error:', error))
+                .finally(() => { this.syncRequest = null; });
+        }
+        return this.syncRequest;
+    }
+
+    // Dashboard figures computed from the local store, shown until the server's arrive
+    async renderDashboardFromLocal() {
+        const transactions = (await this.localStore.getAll('transactions')).map(t => this.normalizeTransaction(t));
+        if (transactions.length === 0) return;
+
+        const month = new Date().toISOString().slice(0, 7);
+        let balance = 0;
+        let income = 0;
+        let expenses = 0;
+        const categories = new Map();
+        for (const t of transactions) {
+            const signed = t.transaction_type === 'income' ? t.amount : -t.amount;
+            balance += signed;
+            if (t.date.startsWith(month)) {
+                if (t.transaction_type === 'income') {
+                    income += t.amount;
+                } else {
+                    expenses += t.amount;
+                    categories.set(t.category, (categories.get(t.category) || 0) + t.amount);
+                }
+            }
+        }
+
+        document.getElementById('current-balance').textContent = this.formatCurrency(balance);
+        document.getElementById('monthly-income').textContent = this.formatCurrency(income);
+        document.getElementById('monthly-expenses').textContent = this.formatCurrency(expenses);
+        this.updateExpenseChart([...categories]
+            .map(([category, amount]) => ({ category, amount }))
+            .sort((a, b) => b.amount - a.amount));
+
+        const recent = transactions
+            .sort((a, b) => b.date.localeCompare(a.date) || b.created_at.localeCompare(a.created_at) || b.id - a.id)
+            .slice(0, 5);
+        this.updateRecentTransactions(recent);
+    }
+
+    async handleLogout() {
+        try {
+            await this.request('/api/auth/logout', { method: 'POST' });
+        } catch (error) {
+            console.error('Logout error:', error);
+        }
+
         this.currentUser = null;
+        this.transactions = [];
+        this.transactionIndex.clear();
+        this.transactionsCursor = null;
+        this.validatedResponses.clear();
+        // Anyone using this browser next could read the local copy, so it only
+        // survives logout when the user asked for that at login
+        try {
+            // Let a sync in flight finish first so it cannot refill the store
+            await this.syncRequest;
+            if (!(await this.localStore.getMeta('keepAfterLogout'))) {
+                await this.localStore.clear();
+            }
+        } catch (error) {
+            console.error('Local store error:', error);
+        }
         this.showPage('login');
         document.getElementById('login-form').reset();
         this.hideError('login-error');
@@ -140,59 +436,116 @@ class FinanceTracker {
         this.currentPage = pageId;
     }
 
-    updateDashboard() {
+    async updateDashboard() {
         if (!this.currentUser) return;
         
-        const userTransactions = this.getUserTransactions();
-        const currentMonth = new Date().toISOString().slice(0, 7);
-        const monthlyTransactions = userTransactions.filter(t => t.date.startsWith(currentMonth));
-        
-        // Calculate totals
-        const totalIncome = monthlyTransactions
-            .filter(t => t.transaction_type === 'income')
-            .reduce((sum, t) => sum + t.amount, 0);
-        
-        const totalExpenses = monthlyTransactions
-            .filter(t => t.transaction_type === 'expense')
-            .reduce((sum, t) => sum + t.amount, 0);
-        
-        const currentBalance = totalIncome - totalExpenses;
-        
-        // Update summary cards
-        document.getElementById('current-balance').textContent = this.formatCurrency(currentBalance);
-        document.getElementById('monthly-income').textContent = this.formatCurrency(totalIncome);
-        document.getElementById('monthly-expenses').textContent = this.formatCurrency(totalExpenses);
-        
-        // Update charts
-        this.updateExpenseChart(monthlyTransactions);
-        this.updateRecentTransactions(userTransactions.slice(-5).reverse());
+        try {
+            const [stats, recent, trends] = await Promise.all([
+                this.request('/api/dashboard/stats'),
+                this.request('/api/transactions?limit=5'),
+                this.request('/api/trends?granularity=month')
+            ]);
+        
+            // Update summary cards
+            document.getElementById('current-balance').textContent = this.formatCurrency(stats.balance);
+            document.getElementById('monthly-income').textContent = this.formatCurrency(stats.income);
+            document.getElementById('monthly-expenses').textContent = this.formatCurrency(stats.expenses);
+        
+            // Update charts
+            this.updateExpenseChart(stats.categoryBreakdown);
+            this.updateTrendChart(trends);
+            this.updateRecentTransactions(recent.transactions.map(t => this.normalizeTransaction(t)));
+        } catch (error) {
+            console.error('Dashboard error:', error);
+        }
     }
 
-    updateExpenseChart(transactions) {
-        const expenseTransactions = transactions.filter(t => t.transaction_type === 'expense');
-        const categoryTotals = {};
-        
-        expenseTransactions.forEach(t => {
-            categoryTotals[t.category] = (categoryTotals[t.category] || 0) + t.amount;
+    // Copy new labels and dataset values into a live chart, touching only what
+    // changed. Returns false when nothing did, so the redraw can be skipped.
+    patchChart(chart, labels, datasets) {
+        let changed = false;
+        const same = (a, b) => a.length === b.length && a.every((value, i) => value === b[i]);
+
+        if (!same(chart.data.labels, labels)) {
+            chart.data.labels = labels;
+            changed = true;
+        }
+        datasets.forEach((values, i) => {
+            const dataset = chart.data.datasets[i];
+            for (const [key, value] of Object.entries(values)) {
+                if (!same(dataset[key], value)) {
+                    dataset[key] = value;
+                    changed = true;
+                }
+            }
         });
-        
-        const ctx = document.getElementById('expense-chart').getContext('2d');
-        
+        return changed;
+    }
+
+    updateExpenseChart(categoryBreakdown) {
+        const colors = ['#1FB8CD', '#FFC185', '#B4413C', '#ECEBD5', '#5D878F', '#DB4545', '#D2BA4C', '#964325'];
+        const labels = categoryBreakdown.map(c => c.category);
+        const dataset = {
+            data: categoryBreakdown.map(c => c.amount),
+            backgroundColor: colors.slice(0, categoryBreakdown.length)
+        };
+
         if (this.expenseChart) {
-            this.expenseChart.destroy();
+            if (this.patchChart(this.expenseChart, labels, [dataset])) {
+                this.expenseChart.update();
+            }
+            return;
         }
-        
-        const colors = ['#1FB8CD', '#FFC185', '#B4413C', '#ECEBD5', '#5D878F', '#DB4545', '#D2BA4C', '#964325'];
-        
+
+        const ctx = document.getElementById('expense-chart').getContext('2d');
         this.expenseChart = new Chart(ctx, {
             type: 'pie',
             data: {
-                labels: Object.keys(categoryTotals),
-                datasets: [{
-                    data: Object.values(categoryTotals),
-                    backgroundColor: colors.slice(0, Object.keys(categoryTotals).length),
-                    borderWidth: 0
-                }]
+                labels,
+                datasets: [{ ...dataset, borderWidth: 0 }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        position: 'bottom',
+                        labels: {
+                            padding: 20,
+                            usePointStyle: true
+                        }
+                    }
+                }
+            }
+        });
+    }
+
+    // Income and expense bars with a net line, from the server's monthly
+    // trends (the 12 months up to today by default)
+    updateTrendChart(trends) {
+        const months = trends.periods.map(period => period.period);
+        const income = trends.periods.map(period => period.income);
+        const expenses = trends.periods.map(period => period.expenses);
+        const net = trends.periods.map(period => period.net);
+        const datasets = [{ data: income }, { data: expenses }, { data: net }];
+
+        if (this.trendChart) {
+            if (this.patchChart(this.trendChart, months, datasets)) {
+                this.trendChart.update();
+            }
+            return;
+        }
+
+        const ctx = document.getElementById('trend-chart').getContext('2d');
+        this.trendChart = new Chart(ctx, {
+            type: 'bar',
+            data: {
+                labels: months,
+                datasets: [
+                    { label: 'Income', data: income, backgroundColor: '#1FB8CD' },
+                    { label: 'Expenses', data: expenses, backgroundColor: '#B4413C' },
+                    { label: 'Net', data: net, type: 'line', borderColor: '#5D878F', backgroundColor: '#5D878F', tension: 0.3 }
+                ]
             },
             options: {
                 responsive: true,
@@ -221,8 +574,8 @@ class FinanceTracker {
         container.innerHTML = transactions.map(t => `
             <div class="recent-transaction">
                 <div class="recent-transaction-info">
-                    <div class="recent-transaction-description">${t.description || 'No description'}</div>
-                    <div class="recent-transaction-category">${t.category} • ${this.formatDate(t.date)}</div>
+                    <div class="recent-transaction-description">${this.escapeHtml(t.description || 'No description')}</div>
+                    <div class="recent-transaction-category">${this.escapeHtml(t.category)} • ${this.formatDate(t.date)}</div>
                 </div>
                 <div class="recent-transaction-amount ${t.transaction_type}">
                     ${t.transaction_type === 'income' ? '+' : '-'}${this.formatCurrency(t.amount)}
@@ -250,16 +603,24 @@ class FinanceTracker {
             document.getElementById('trans-date').value = new Date().toISOString().split('T')[0];
         }
         
+        this.hideError('transaction-error');
         wrapper.classList.remove('hidden');
     }
 
+    editTransaction(id) {
+        const transaction = this.transactionIndex.get(id);
+        if (transaction) {
+            this.showTransactionForm(transaction);
+        }
+    }
+
     hideTransactionForm() {
         document.getElementById('transaction-form-wrapper').classList.add('hidden');
         document.getElementById('transaction-form').reset();
         this.editingTransaction = null;
     }
 
-    handleTransactionSubmit(e) {
+    async handleTransactionSubmit(e) {
         e.preventDefault();
         
         const formData = {
@@ -270,60 +631,243 @@ class FinanceTracker {
             description: document.getElementById('trans-description').value
         };
         
-        if (this.editingTransaction) {
-            // Update existing transaction
-            const index = this.transactions.findIndex(t => t.id === this.editingTransaction.id);
-            this.transactions[index] = { ...this.editingTransaction, ...formData };
-        } else {
-            // Add new transaction
-            const newTransaction = {
-                id: Math.max(...this.transactions.map(t => t.id), 0) + 1,
-                user_id: this.currentUser.id,
-                ...formData,
-                created_at: new Date().toISOString()
-            };
-            this.transactions.push(newTransaction);
+        try {
+            if (this.editingTransaction) {
+                // Update existing transaction
+                const updated = await this.request(`/api/transactions/${this.editingTransaction.id}`, {
+                    method: 'PUT',
+                    body: JSON.stringify(formData)
+                });
+                if (this.transactionFilters.q) {
+                    // Search results keep their ranked position
+                    this.replaceTransaction(this.normalizeTransaction(updated));
+                } else {
+                    this.removeTransaction(this.editingTransaction.id);
+                    this.insertTransaction(this.normalizeTransaction(updated));
+                }
+            } else {
+                // Add new transaction; created_at is needed to place it in the list
+                const created = await this.request('/api/transactions?return=full', {
+                    method: 'POST',
+                    body: JSON.stringify(formData)
+                });
+                this.insertTransaction(this.normalizeTransaction(created));
+            }
+        } catch (error) {
+            this.showError('transaction-error', error.message);
+            return;
         }
         
         this.hideTransactionForm();
-        this.updateTransactionsList();
+        this.renderTransactionsList();
+        this.syncLocalData();
         
         if (this.currentPage === 'dashboard') {
             this.updateDashboard();
         }
     }
 
+    handleFilterChange() {
+        const filters = {
+            q: document.getElementById('filter-search').value.trim(),
+            type: document.getElementById('filter-type').value,
+            category: document.getElementById('filter-category').value,
+            from: document.getElementById('filter-from').value,
+            to: document.getElementById('filter-to').value
+        };
+
+        const active = Object.fromEntries(Object.entries(filters).filter(([, value]) => value));
+        if (JSON.stringify(active) === JSON.stringify(this.transactionFilters)) return;
+
+        this.transactionFilters = active;
+        const { q, ...exportFilters } = active;
+        document.getElementById('export-transactions').href =
+            `/api/transactions/export?${new URLSearchParams({ format: 'csv', ...exportFilters })}`;
+        this.updateTransactionsList();
+    }
+
+    // Start the list over from the first page, e.g. after a write or a filter change
     updateTransactionsList() {
-        const transactions = this.getUserTransactions().reverse();
+        this.transactionsGeneration++;
+        this.transactionsRequest = null;
+        this.transactions = [];
+        this.transactionIndex.clear();
+        this.transactionsCursor = null;
+        if (this.transactionList) {
+            this.transactionList.viewport.scrollTop = 0;
+        }
+        return this.loadMoreTransactions();
+    }
+
+    loadMoreTransactions() {
+        if (!this.transactionsRequest) {
+            this.transactionsRequest = this.fetchTransactionsPage()
+                .finally(() => { this.transactionsRequest = null; });
+        }
+        return this.transactionsRequest;
+    }
+
+    async fetchTransactionsPage() {
+        const generation = this.transactionsGeneration;
+        const params = new URLSearchParams({ limit: TRANSACTIONS_PAGE_SIZE, ...this.transactionFilters });
+        if (this.transactionsCursor) {
+            params.set('cursor', this.transactionsCursor);
+        }
+
+        // A search term switches to the ranked search endpoint; pages look the same
+        const endpoint = this.transactionFilters.q ? '/api/transactions/search' : '/api/transactions';
+
+        try {
+            const page = await this.request(`${endpoint}?${params}`);
+
+            // Drop pages that belong to a list that has since been reset
+            if (generation !== this.transactionsGeneration) return;
+
+            for (const t of page.transactions) {
+                const transaction = this.normalizeTransaction(t);
+                this.transactions.push(transaction);
+                this.transactionIndex.set(transaction.id, transaction);
+            }
+            this.transactionsCursor = page.nextCursor;
+            this.renderTransactionsList();
+        } catch (error) {
+            console.error('Load transactions error:', error);
+        }
+    }
+
+    // Server list order: newest date first, then created_at, then id
+    compareTransactions(a, b) {
+        return b.date.localeCompare(a.date) ||
+            String(b.created_at).localeCompare(String(a.created_at)) ||
+            b.id - a.id;
+    }
+
+    matchesTransactionFilters(t) {
+        const { q, type, category, from, to } = this.transactionFilters;
+        // Search results are ranked, so there is no place to patch a row into
+        return !q &&
+            (!type || t.transaction_type === type) &&
+            (!category || t.category === category) &&
+            (!from || t.date >= from) &&
+            (!to || t.date <= to);
+    }
+
+    // Patch one row into the sorted list. Rows that sort past the last loaded
+    // one are left to arrive with a later page.
+    insertTransaction(transaction) {
+        if (!this.matchesTransactionFilters(transaction)) return;
+
+        let low = 0;
+        let high = this.transactions.length;
+        while (low < high) {
+            const middle = (low + high) >> 1;
+            if (this.compareTransactions(this.transactions[middle], transaction) < 0) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+        if (low === this.transactions.length && this.transactionsCursor) return;
+
+        this.transactions.splice(low, 0, transaction);
+        this.transactionIndex.set(transaction.id, transaction);
+    }
+
+    replaceTransaction(transaction) {
+        const existing = this.transactionIndex.get(transaction.id);
+        if (!existing) return;
+
+        this.transactions[this.transactions.indexOf(existing)] = transaction;
+        this.transactionIndex.set(transaction.id, transaction);
+    }
+
+    removeTransaction(id) {
+        const transaction = this.transactionIndex.get(id);
+        if (!transaction) return;
+
+        this.transactionIndex.delete(id);
+        this.transactions.splice(this.transactions.indexOf(transaction), 1);
+    }
+
+    createTransactionRow() {
+        const row = document.createElement('div');
+        row.className = 'transaction-item';
+        row.innerHTML = `
+            <div class="transaction-info">
+                <div class="transaction-amount"></div>
+                <div class="transaction-meta"></div>
+            </div>
+            <div class="transaction-actions">
+                <button class="btn btn--secondary btn--xs" data-action="edit">Edit</button>
+                <button class="btn btn--outline btn--xs" data-action="delete">Delete</button>
+            </div>
+        `;
+        return row;
+    }
+
+    updateTransactionRow(row, t) {
+        if (row.transaction === t) return;
+
+        row.dataset.id = t.id;
+        row.transaction = t;
+        const amount = row.querySelector('.transaction-amount');
+        amount.className = `transaction-amount ${t.transaction_type}`;
+        amount.textContent = `${t.transaction_type === 'income' ? '+' : '-'}${this.formatCurrency(t.amount)}`;
+        row.querySelector('.transaction-meta').textContent =
+            `${t.description || 'No description'} • ${t.category} • ${this.formatDate(t.date)}${t.archived ? ' • Archived' : ''}`;
+        // Archived transactions are read-only on the server
+        row.querySelector('.transaction-actions').classList.toggle('hidden', t.archived);
+    }
+
+    renderTransactionsList() {
         const container = document.getElementById('transactions-list');
-        
-        if (transactions.length === 0) {
+
+        if (!this.transactionList) {
+            this.transactionList = new VirtualList(container, {
+                createRow: () => this.createTransactionRow(),
+                updateRow: (row, t) => this.updateTransactionRow(row, t),
+                // Fetch the next page when the user nears the end of what is loaded
+                onNearEnd: () => {
+                    if (this.transactionsCursor) {
+                        this.loadMoreTransactions();
+                    }
+                }
+            });
+            // One listener for every row's buttons
+            this.transactionList.viewport.addEventListener('click', (e) => {
+                const button = e.target.closest('[data-action]');
+                if (!button) return;
+                const id = Number(button.closest('.transaction-item').dataset.id);
+                if (button.dataset.action === 'edit') {
+                    this.editTransaction(id);
+                } else {
+                    this.deleteTransaction(id);
+                }
+            });
+        }
+
+        if (this.transactions.length === 0 && !this.transactionsCursor) {
             container.innerHTML = '<div class="empty-state"><h4>No transactions yet</h4><p>Add your first transaction to get started</p></div>';
             return;
         }
-        
-        container.innerHTML = transactions.map(t => `
-            <div class="transaction-item">
-                <div class="transaction-info">
-                    <div class="transaction-amount ${t.transaction_type}">
-                        ${t.transaction_type === 'income' ? '+' : '-'}${this.formatCurrency(t.amount)}
-                    </div>
-                    <div class="transaction-meta">
-                        ${t.description || 'No description'} • ${t.category} • ${this.formatDate(t.date)}
-                    </div>
-                </div>
-                <div class="transaction-actions">
-                    <button class="btn btn--secondary btn--xs" onclick="app.showTransactionForm(${JSON.stringify(t).replace(/"/g, '&quot;')})">Edit</button>
-                    <button class="btn btn--outline btn--xs" onclick="app.deleteTransaction(${t.id})">Delete</button>
-                </div>
-            </div>
-        `).join('');
+
+        this.transactionList.mount();
+        this.transactionList.setItems(this.transactions);
     }
 
-    deleteTransaction(id) {
+    async deleteTransaction(id) {
         if (confirm('Are you sure you want to delete this transaction?')) {
-            this.transactions = this.transactions.filter(t => t.id !== id);
-            this.updateTransactionsList();
+            try {
+                await this.request(`/api/transactions/${id}`, { method: 'DELETE' });
+            } catch (error) {
+                console.error('Delete transaction error:', error);
+                alert(`Could not delete the transaction: ${error.message}`);
+                return;
+            }
+
+            this.removeTransaction(id);
+            this.renderTransactionsList();
+            this.syncLocalData();
             
             if (this.currentPage === 'dashboard') {
                 this.updateDashboard();
@@ -331,45 +875,40 @@ class FinanceTracker {
         }
     }
 
-    handleBudgetSubmit(e) {
+    async handleBudgetSubmit(e) {
         e.preventDefault();
         
         const category = document.getElementById('budget-category').value;
         const amount = parseFloat(document.getElementById('budget-amount').value);
         const currentMonth = new Date().toISOString().slice(0, 7);
         
-        const existingBudget = this.budgets.find(b => 
-            b.user_id === this.currentUser.id && 
-            b.category === category && 
-            b.month === currentMonth
-        );
-        
-        if (existingBudget) {
-            existingBudget.amount = amount;
-        } else {
-            const newBudget = {
-                id: Math.max(...this.budgets.map(b => b.id), 0) + 1,
-                user_id: this.currentUser.id,
-                category,
-                amount,
-                month: currentMonth
-            };
-            this.budgets.push(newBudget);
+        try {
+            await this.request('/api/budgets', {
+                method: 'POST',
+                body: JSON.stringify({ category, amount, month: currentMonth })
+            });
+        } catch (error) {
+            console.error('Save budget error:', error);
+            return;
         }
         
         document.getElementById('budget-form').reset();
         this.updateBudgetOverview();
+        this.syncLocalData();
     }
 
-    updateBudgetOverview() {
+    async updateBudgetOverview() {
         const currentMonth = new Date().toISOString().slice(0, 7);
-        const userBudgets = this.budgets.filter(b => 
-            b.user_id === this.currentUser.id && b.month === currentMonth
-        );
-        const userTransactions = this.getUserTransactions();
-        const monthlyExpenses = userTransactions.filter(t => 
-            t.transaction_type === 'expense' && t.date.startsWith(currentMonth)
-        );
+        let userBudgets;
+
+        try {
+            // Spending per budget is computed by the server
+            const overview = await this.request(`/api/budgets/overview?month=${currentMonth}`);
+            userBudgets = overview.budgets;
+        } catch (error) {
+            console.error('Budget overview error:', error);
+            return;
+        }
         
         const container = document.getElementById('budget-overview');
         
@@ -379,19 +918,18 @@ class FinanceTracker {
         }
         
         container.innerHTML = userBudgets.map(budget => {
-            const spent = monthlyExpenses
-                .filter(t => t.category === budget.category)
-                .reduce((sum, t) => sum + t.amount, 0);
+            const budgetAmount = parseFloat(budget.amount);
+            const spent = parseFloat(budget.spent);
             
-            const percentage = budget.amount > 0 ? (spent / budget.amount) * 100 : 0;
+            const percentage = budget.percent_used === null ? 0 : parseFloat(budget.percent_used);
             const isOverBudget = percentage > 100;
             
             return `
                 <div class="budget-item">
                     <div class="budget-info">
-                        <h5>${budget.category}</h5>
+                        <h5>${this.escapeHtml(budget.category)}</h5>
                         <div class="budget-amounts">
-                            Spent: ${this.formatCurrency(spent)} of ${this.formatCurrency(budget.amount)}
+                            Spent: ${this.formatCurrency(spent)} of ${this.formatCurrency(budgetAmount)}
                         </div>
                     </div>
                     <div class="budget-progress">
@@ -408,8 +946,18 @@ class FinanceTracker {
         }).join('');
     }
 
-    getUserTransactions() {
-        return this.transactions.filter(t => t.user_id === this.currentUser.id);
+    // MySQL DECIMAL columns arrive as strings; archived rows are flagged 1
+    normalizeTransaction(transaction) {
+        return { ...transaction, amount: parseFloat(transaction.amount), archived: Boolean(transaction.archived) };
+    }
+
+    escapeHtml(value) {
+        return String(value)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#39;');
     }
 
     formatCurrency(amount) {
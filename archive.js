@@ -0,0 +1,236 @@
+const mysql = require('mysql2/promise');
+require('dotenv').config();
+
+// Cold storage for closed years. `node archive.js run` moves live transactions
+// dated in years that have closed into transactions_archive, so the hot table
+// and its indexes only hold recent history. Each moved row is added to a
+// per-user, per-year summary in transaction_archive_years. The dashboard and
+// trends are unaffected: they read monthly_category_totals, which keeps the
+// archived rows' contribution. Archived rows are read-only, and search does not
+// cover them (the archive has no FULLTEXT index).
+
+// Same visible columns, in the same order, as transactions so reads can
+// UNION ALL the two tables with SELECT *. Only the index that ranged reads use
+// is kept, and rows are compressed since they are rarely read.
+const createArchiveTable = `
+    CREATE TABLE IF NOT EXISTS transactions_archive (
+        id INT PRIMARY KEY,
+        user_id INT NOT NULL,
+        amount DECIMAL(10,2) NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        description VARCHAR(255),
+        transaction_type ENUM('income', 'expense') NOT NULL,
+        date DATE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+        deleted_at TIMESTAMP NULL DEFAULT NULL,
+        change_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        INDEX idx_transactions_archive_user_date (user_id, date, created_at),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) ROW_FORMAT=COMPRESSED
+`;
+
+const createArchiveSummaryTable = `
+    CREATE TABLE IF NOT EXISTS transaction_archive_years (
+        user_id INT NOT NULL,
+        year SMALLINT NOT NULL,
+        income DECIMAL(14,2) NOT NULL DEFAULT 0,
+        expenses DECIMAL(14,2) NOT NULL DEFAULT 0,
+        transaction_count INT NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, year),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+`;
+
+const ARCHIVE_COLUMNS = ['id', 'user_id', 'amount', 'category', 'description', 'transaction_type',
+    'date', 'created_at', 'updated_at', 'deleted_at', 'change_version'];
+const ARCHIVE_LOCK = 'finance_tracker_archive';
+const DEFAULT_BATCH_SIZE = 1000;
+
+// The current year and ARCHIVE_HOT_YEARS - 1 before it stay in the hot table
+const ARCHIVE_HOT_YEARS = parseInt(process.env.ARCHIVE_HOT_YEARS, 10) || 2;
+
+// Move one batch of rows (already known to be archivable) in one transaction.
+// Users' rows are locked first, the same order the write routes use, and their
+// data_version is bumped so cached transaction lists revalidate. Moved rows take
+// that version as their change_version, which puts them in the archive's
+// /api/sync stream. Rows that were deleted or re-dated in the meantime are
+// skipped by the locking read.
+async function archiveBatch(connection, candidates, before) {
+    const userIds = [...new Set(candidates.map(row => row.user_id))].sort((a, b) => a - b);
+
+    await connection.beginTransaction();
+    try {
+        await connection.query('UPDATE users SET data_version = data_version + 1 WHERE id IN (?)', [userIds]);
+        const [rows] = await connection.query(`
+            SELECT id, user_id, YEAR(date) AS year, transaction_type, amount
+            FROM transactions
+            WHERE id IN (?) AND date < ? AND deleted_at IS NULL
+            FOR UPDATE
+        `, [candidates.map(row => row.id), before]);
+
+        if (rows.length > 0) {
+            const ids = rows.map(row => row.id);
+            const archived = ARCHIVE_COLUMNS.map(column =>
+                column === 'change_version' ? 'users.data_version' : `transactions.${column}`);
+            await connection.query(`
+                INSERT INTO transactions_archive (${ARCHIVE_COLUMNS.join(', ')})
+                SELECT ${archived.join(', ')}
+                FROM transactions JOIN users ON users.id = transactions.user_id
+                WHERE transactions.id IN (?)
+            `, [ids]);
+
+            const years = new Map();
+            for (const row of rows) {
+                const key = `${row.user_id}|${row.year}`;
+                const summary = years.get(key) || [row.user_id, row.year, 0, 0, 0];
+                // Sum in integer cents to avoid floating point drift
+                summary[row.transaction_type === 'income' ? 2 : 3] += Math.round(Number(row.amount) * 100);
+                summary[4] += 1;
+                years.set(key, summary);
+            }
+            await connection.query(`
+                INSERT INTO transaction_archive_years (user_id, year, income, expenses, transaction_count)
+                VALUES ?
+                ON DUPLICATE KEY UPDATE
+                    income = income + VALUES(income),
+                    expenses = expenses + VALUES(expenses),
+                    transaction_count = transaction_count + VALUES(transaction_count)
+            `, [[...years.values()].map(([user, year, income, expenses, count]) =>
+                [user, year, (income / 100).toFixed(2), (expenses / 100).toFixed(2), count])]);
+
+            await connection.query('DELETE FROM transactions WHERE id IN (?)', [ids]);
+        }
+
+        await connection.commit();
+        return rows.length;
+    } catch (error) {
+        await connection.rollback();
+        throw error;
+    }
+}
+
+// Archive every live transaction dated in `throughYear` or earlier. Candidates
+// are found by walking the primary key with plain (non-locking) reads, so the
+// scan never blocks writers; only the rows being moved are locked. Soft-deleted
+// rows stay behind for the tombstone purge. Returns the number of rows moved.
+async function archiveTransactions(connection, throughYear, { batchSize = DEFAULT_BATCH_SIZE } = {}) {
+    const before = `${throughYear + 1}-01-01`;
+    let lastId = 0;
+    let moved = 0;
+
+    for (;;) {
+        const [candidates] = await connection.execute(`
+            SELECT id, user_id FROM transactions
+            WHERE id > ? AND date < ? AND deleted_at IS NULL
+            ORDER BY id
+            LIMIT ${batchSize}
+        `, [lastId, before]);
+        if (candidates.length === 0) {
+            return moved;
+        }
+        moved += await archiveBatch(connection, candidates, before);
+        lastId = candidates[candidates.length - 1].id;
+    }
+}
+
+// Compare transaction_archive_years with the archived rows and return every
+// summary that drifted
+async function verifyArchive(connection) {
+    const [expectedRows] = await connection.execute(`
+        SELECT user_id, YEAR(date) AS year,
+               SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) AS income,
+               SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END) AS expenses,
+               COUNT(*) AS transaction_count
+        FROM transactions_archive
+        GROUP BY user_id, YEAR(date)
+    `);
+    const [actualRows] = await connection.execute(
+        'SELECT user_id, year, income, expenses, transaction_count FROM transaction_archive_years'
+    );
+
+    const key = row => `${row.user_id}|${row.year}`;
+    const actual = new Map(actualRows.map(row => [key(row), row]));
+    const drift = [];
+
+    for (const row of expectedRows) {
+        const stored = actual.get(key(row));
+        actual.delete(key(row));
+        if (!stored || ['income', 'expenses', 'transaction_count'].some(column => Number(stored[column]) !== Number(row[column]))) {
+            drift.push({ ...row, stored: stored || null });
+        }
+    }
+    // Summaries with no archived rows behind them
+    for (const row of actual.values()) {
+        drift.push({ user_id: row.user_id, year: row.year, income: '0.00', expenses: '0.00', transaction_count: 0, stored: row });
+    }
+
+    return drift;
+}
+
+// Command line: node archive.js <run|verify> [throughYear]
+async function main() {
+    const [command, yearArg] = process.argv.slice(2);
+    const throughYear = yearArg === undefined
+        ? new Date().getUTCFullYear() - ARCHIVE_HOT_YEARS
+        : parseInt(yearArg, 10);
+
+    if (!['run', 'verify'].includes(command) || Number.isNaN(throughYear)) {
+        console.error('Usage: node archive.js <run|verify> [throughYear]');
+        process.exit(1);
+    }
+    if (command === 'run' && throughYear >= new Date().getUTCFullYear()) {
+        console.error('Only closed years can be archived');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        await connection.query(createArchiveTable);
+        await connection.query(createArchiveSummaryTable);
+        if (command === 'run') {
+            // One archiver at a time; a second one would only contend for the same rows
+            const [[lock]] = await connection.execute('SELECT GET_LOCK(?, 0) AS acquired', [ARCHIVE_LOCK]);
+            if (lock.acquired !== 1) {
+                throw new Error('Another archive run is in progress');
+            }
+            const moved = await archiveTransactions(connection, throughYear);
+            console.log(`Archived ${moved} transactions dated ${throughYear} or earlier`);
+        } else {
+            const drift = await verifyArchive(connection);
+            drift.forEach(row => {
+                const stored = row.stored
+                    ? `${row.stored.income}/${row.stored.expenses} (${row.stored.transaction_count})`
+                    : 'nothing';
+                console.log(`Drift: user ${row.user_id} ${row.year}: expected ` +
+                    `${row.income}/${row.expenses} (${row.transaction_count}), stored ${stored}`);
+            });
+            console.log(drift.length === 0 ? 'transaction_archive_years is consistent' : `${drift.length} drifted rows`);
+            process.exitCode = drift.length === 0 ? 0 : 2;
+        }
+    } catch (error) {
+        console.error('Archive error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    createArchiveTable,
+    createArchiveSummaryTable,
+    archiveTransactions,
+    verifyArchive
+};
\ No newline at end of file
@@ -0,0 +1,204 @@
+const { Worker, isMainThread, parentPort } = require('worker_threads');
+const bcrypt = require('bcrypt');
+
+// Password hashing runs on a small dedicated set of worker threads using
+// bcrypt's synchronous API. bcrypt's async API would borrow libuv threadpool
+// threads (4 by default) that fs, dns and crypto calls from every other route
+// also need, so a burst of logins could stall unrelated requests.
+
+if (!isMainThread) {
+    parentPort.on('message', ({ id, op, password, hash, rounds }) => {
+        try {
+            const result = op === 'hash'
+                ? bcrypt.hashSync(password, rounds)
+                : bcrypt.compareSync(password, hash);
+            parentPort.postMessage({ id, result });
+        } catch (error) {
+            parentPort.postMessage({ id, error: error.message });
+        }
+    });
+}
+
+class HashQueueFullError extends Error {
+    constructor() {
+        super('Password hashing queue is full');
+        this.code = 'HASH_QUEUE_FULL';
+    }
+}
+
+class HashPool {
+    constructor({ size = 2, maxQueue = 100 } = {}) {
+        this.size = size;
+        this.maxQueue = maxQueue;
+        this.workers = [];
+        this.idle = [];
+        this.queue = [];
+        this.pending = new Map();
+        this.nextId = 1;
+        this.completed = 0;
+        this.rejected = 0;
+    }
+
+    hash(password, rounds) {
+        return this.run({ op: 'hash', password, rounds });
+    }
+
+    compare(password, hash) {
+        return this.run({ op: 'compare', password, hash });
+    }
+
+    run(task) {
+        if (this.queue.length >= this.maxQueue) {
+            this.rejected++;
+            return Promise.reject(new HashQueueFullError());
+        }
+
+        return new Promise((resolve, reject) => {
+            this.queue.push({ ...task, id: this.nextId++, resolve, reject });
+            this.dispatch();
+        });
+    }
+
+    dispatch() {
+        while (this.queue.length > 0) {
+            const worker = this.idle.pop() || this.spawn();
+            if (!worker) {
+                return;
+            }
+            const { resolve, reject, ...task } = this.queue.shift();
+            this.pending.set(task.id, { worker, resolve, reject });
+            worker.ref();
+            worker.postMessage(task);
+        }
+    }
+
+    // Workers start lazily, up to `size`
+    spawn() {
+        if (this.workers.length >= this.size) {
+            return null;
+        }
+
+        const worker = new Worker(__filename);
+        worker.on('message', ({ id, result, error }) => {
+            const task = this.pending.get(id);
+            this.pending.delete(id);
+            this.completed++;
+            this.idle.push(worker);
+            // Idle hashing threads must not keep the process alive
+            worker.unref();
+            if (error) {
+                task.reject(new Error(error));
+            } else {
+                task.resolve(result);
+            }
+            this.dispatch();
+        });
+        worker.on('error', (error) => this.replace(worker, error));
+        this.workers.push(worker);
+        return worker;
+    }
+
+    // Fail whatever the crashed worker was running and let a new one take its place
+    replace(worker, error) {
+        this.workers = this.workers.filter(w => w !== worker);
+        this.idle = this.idle.filter(w => w !== worker);
+        for (const [id, task] of this.pending) {
+            if (task.worker === worker) {
+                this.pending.delete(id);
+                task.reject(error);
+            }
+        }
+        this.dispatch();
+    }
+
+    stats() {
+        return {
+            workers: this.workers.length,
+            active: this.pending.size,
+            queued: this.queue.length,
+            completed: this.completed,
+            rejected: this.rejected
+        };
+    }
+}
+
+// Cost factor encoded in a bcrypt hash ($2b$<rounds>$...)
+function getRounds(hash) {
+    return parseInt(String(hash).split('$')[2], 10);
+}
+
+// Fixed-window counters of failed logins, keyed by username and by client IP.
+// Requests over the limit are refused before any hashing work. The counters
+// live in MySQL so every cluster worker and server enforces the same limits;
+// kept per process, N workers would allow N times as many attempts.
+const createLoginFailuresTable = `
+    CREATE TABLE IF NOT EXISTS login_failures (
+        throttle_key VARCHAR(120) COLLATE utf8mb4_bin NOT NULL,
+        failures INT UNSIGNED NOT NULL,
+        reset_at BIGINT NOT NULL,
+        PRIMARY KEY (throttle_key),
+        INDEX idx_login_failures_reset (reset_at)
+    )
+`;
+
+class LoginThrottle {
+    constructor(db, { windowMs = 15 * 60 * 1000, maxPerUsername = 5, maxPerIp = 50 } = {}) {
+        this.db = db;
+        this.windowMs = windowMs;
+        this.limits = { user: maxPerUsername, ip: maxPerIp };
+    }
+
+    // Usernames are cut to fit the key column; IPs always fit
+    keys(username, ip) {
+        return [['user', `user:${String(username).slice(0, 100)}`], ['ip', `ip:${ip}`]];
+    }
+
+    // Milliseconds until the caller may try again, or 0 if allowed now
+    async retryAfter(username, ip) {
+        const now = Date.now();
+        const keys = this.keys(username, ip);
+        const [rows] = await this.db.execute(
+            'SELECT throttle_key, failures, reset_at FROM login_failures WHERE throttle_key IN (?, ?) AND reset_at > ?',
+            [keys[0][1], keys[1][1], now]
+        );
+        let wait = 0;
+        for (const [kind, key] of keys) {
+            const entry = rows.find(row => row.throttle_key === key);
+            if (entry && entry.failures >= this.limits[kind]) {
+                wait = Math.max(wait, Number(entry.reset_at) - now);
+            }
+        }
+        return wait;
+    }
+
+    // One upsert for both counters; an expired window starts over at 1
+    async recordFailure(username, ip) {
+        const now = Date.now();
+        const resetAt = now + this.windowMs;
+        const [[, userKey], [, ipKey]] = this.keys(username, ip);
+        await this.db.execute(`
+            INSERT INTO login_failures (throttle_key, failures, reset_at)
+            VALUES (?, 1, ?), (?, 1, ?)
+            ON DUPLICATE KEY UPDATE
+                failures = IF(reset_at <= ?, 1, failures + 1),
+                reset_at = IF(reset_at <= ?, VALUES(reset_at), reset_at)
+        `, [userKey, resetAt, ipKey, resetAt, now, now]);
+    }
+
+    async recordSuccess(username) {
+        await this.db.execute('DELETE FROM login_failures WHERE throttle_key = ?', [this.keys(username, '')[0][1]]);
+    }
+
+    // Drop expired windows; safe to run from several processes at once
+    async prune() {
+        await this.db.execute('DELETE FROM login_failures WHERE reset_at <= ?', [Date.now()]);
+    }
+}
+
+module.exports = {
+    HashPool,
+    HashQueueFullError,
+    LoginThrottle,
+    createLoginFailuresTable,
+    getRounds
+};
\ No newline at end of file
@@ -0,0 +1,579 @@
+# Benchmark harness for the generated Node.js backend
+#
+#   python benchmark.py load --users 200 --transactions 2000
+#   python benchmark.py run --start-server --concurrency 32 --duration 60
+#   python benchmark.py compare bench-results/baseline.json bench-results/latest.json
+#
+# `load` bulk-loads a synthetic dataset into the database configured in .env
+# (through the mysql command line client and LOAD DATA LOCAL INFILE). `run`
+# drives a weighted mix of requests against the server and writes p50/p95/p99
+# latency and throughput per endpoint to a JSON file that later runs can be
+# compared against. Only the Python standard library is used.
+
+import argparse
+import csv
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+APP_DIR = Path(__file__).resolve().parent
+USERNAME_PREFIX = 'bench_user_'
+MANIFEST = 'bench-data/manifest.json'
+
+# Expense categories: (name, relative frequency, median amount, spread).
+# Amounts are log-normal, so most purchases are small with a long tail.
+EXPENSE_CATEGORIES = [
+    ('Food', 35, 18.0, 0.6),
+    ('Transportation', 15, 12.0, 0.7),
+    ('Shopping', 15, 40.0, 0.9),
+    ('Entertainment', 12, 25.0, 0.8),
+    ('Healthcare', 5, 60.0, 1.0),
+    ('Other', 10, 20.0, 1.0),
+]
+# Spending happens more on weekends for these
+WEEKEND_HEAVY = {'Food', 'Entertainment', 'Shopping'}
+DESCRIPTIONS = {
+    'Food': ['Groceries', 'Lunch', 'Coffee', 'Dinner out', 'Takeaway'],
+    'Transportation': ['Fuel', 'Bus pass', 'Taxi', 'Parking', 'Train ticket'],
+    'Shopping': ['Clothes', 'Electronics', 'Books', 'Home goods'],
+    'Entertainment': ['Cinema', 'Concert', 'Streaming', 'Games'],
+    'Healthcare': ['Pharmacy', 'Doctor visit', 'Dentist'],
+    'Other': ['Gift', 'Donation', 'Miscellaneous'],
+}
+BUDGET_CATEGORIES = ['Food', 'Transportation', 'Housing', 'Entertainment', 'Shopping', 'Utilities']
+
+DEFAULT_MIX = 'login=2,list=30,dashboard=25,budgets=15,write=28'
+
+
+def load_env():
+    """Database settings from the environment, falling back to the app's .env file."""
+    settings = {}
+    env_file = APP_DIR / '.env'
+    if env_file.exists():
+        for line in env_file.read_text(encoding='utf-8').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                settings[key.strip()] = value.strip()
+    settings.update({key: value for key, value in os.environ.items() if key.startswith(('DB_', 'BCRYPT_'))})
+    return settings
+
+
+def run_mysql(settings, sql, database=True):
+    """Run SQL through the mysql client and return its tab-separated output."""
+    command = [
+        'mysql', '--local-infile=1', '--batch', '--skip-column-names',
+        '-h', settings.get('DB_HOST', 'localhost'),
+        '-u', settings.get('DB_USER', 'root'),
+    ]
+    if database:
+        command.append(settings.get('DB_NAME', 'finance_tracker'))
+    env = dict(os.environ, MYSQL_PWD=settings.get('DB_PASSWORD', ''))
+    result = subprocess.run(command, input=sql, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f'mysql failed: {result.stderr.strip()}')
+    return result.stdout
+
+
+def run_node(args, **kwargs):
+    result = subprocess.run(['node', *args], cwd=APP_DIR, capture_output=True, text=True, **kwargs)
+    if result.returncode != 0:
+        sys.exit(f'node {" ".join(args)} failed: {result.stderr.strip()}')
+    return result.stdout
+
+
+def month_starts(months):
+    """First day of each of the last `months` months, oldest first."""
+    today = date.today()
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def generate_user_transactions(rng, user_id, count, months):
+    """Yield transaction rows for one user: monthly salary, rent and utilities,
+    then day-to-day expenses spread over the whole window."""
+    starts = month_starts(months)
+    first_day, today = starts[0], date.today()
+    span = (today - first_day).days + 1
+    salary = round(rng.lognormvariate(math.log(4000), 0.4), 2)
+    rent = round(salary * rng.uniform(0.25, 0.35), 2)
+
+    def row(day, transaction_type, category, amount, description):
+        created = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randrange(86400))
+        return [user_id, f'{amount:.2f}', category, description, transaction_type,
+                day.isoformat(), created.strftime('%Y-%m-%d %H:%M:%S')]
+
+    emitted = 0
+    for start in starts:
+        if emitted + 3 > count:
+            break
+        yield row(start, 'income', 'Other', salary, 'Salary')
+        yield row(start, 'expense', 'Housing', rent, 'Rent')
+        yield row(start + timedelta(days=rng.randrange(5, 15)), 'expense', 'Utilities',
+                  round(rng.lognormvariate(math.log(120), 0.3), 2), 'Utilities bill')
+        emitted += 3
+
+    weights = [weight for _, weight, _, _ in EXPENSE_CATEGORIES]
+    while emitted < count:
+        name, _, median, spread = rng.choices(EXPENSE_CATEGORIES, weights)[0]
+        day = first_day + timedelta(days=rng.randrange(span))
+        # Redraw some weekday purchases so weekends end up about 1.5x busier
+        if name in WEEKEND_HEAVY and day.weekday() < 5 and rng.random() < 0.33:
+            day = first_day + timedelta(days=rng.randrange(span))
+        amount = max(0.5, round(rng.lognormvariate(math.log(median), spread), 2))
+        yield row(day, 'expense', name, amount, rng.choice(DESCRIPTIONS[name]))
+        emitted += 1
+
+
+def load(args):
+    settings = load_env()
+    rng = random.Random(args.seed)
+
+    print('Applying migrations...')
+    run_node(['migrations.js', 'up'], env=dict(os.environ, **settings))
+
+    print('Removing the previous benchmark dataset...')
+    # A literal prefix match: in LIKE, each '_' would match any character
+    run_mysql(settings, f"DELETE FROM users WHERE LEFT(username, {len(USERNAME_PREFIX)}) = '{USERNAME_PREFIX}';")
+    first_id = int(run_mysql(settings, 'SELECT COALESCE(MAX(id), 0) + 1 FROM users;').strip())
+
+    # One bcrypt hash, made by the app's own bcrypt, shared by every benchmark user
+    rounds = settings.get('BCRYPT_ROUNDS', '10')
+    password_hash = run_node(['-e', 'require("bcrypt").hash(process.argv[1], +process.argv[2]).then(h => console.log(h))',
+                              args.password, rounds]).strip()
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        files = {name: Path(workdir) / f'{name}.csv' for name in ('users', 'transactions', 'budgets')}
+        with open(files['users'], 'w', newline='') as users_file, \
+                open(files['transactions'], 'w', newline='') as transactions_file, \
+                open(files['budgets'], 'w', newline='') as budgets_file:
+            users = csv.writer(users_file, lineterminator='\n')
+            transactions = csv.writer(transactions_file, lineterminator='\n')
+            budgets = csv.writer(budgets_file, lineterminator='\n')
+            recent_months = [start.strftime('%Y-%m') for start in month_starts(min(args.months, 3))]
+
+            for index in range(args.users):
+                user_id = first_id + index
+                username = f'{USERNAME_PREFIX}{index}'
+                users.writerow([user_id, username, password_hash, f'{username}@example.com'])
+                transactions.writerows(generate_user_transactions(rng, user_id, args.transactions, args.months))
+                for month in recent_months:
+                    for category in BUDGET_CATEGORIES:
+                        budgets.writerow([user_id, category, f'{rng.randrange(100, 1500)}.00', month])
+        print(f'Generated {args.users} users x {args.transactions} transactions '
+              f'in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        options = "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n'"
+        run_mysql(settings, f"""
+            SET unique_checks = 0;
+            LOAD DATA LOCAL INFILE '{files['users'].as_posix()}' INTO TABLE users {options}
+                (id, username, password, email);
+            LOAD DATA LOCAL INFILE '{files['transactions'].as_posix()}' INTO TABLE transactions {options}
+                (user_id, amount, category, description, transaction_type, date, created_at);
+            LOAD DATA LOCAL INFILE '{files['budgets'].as_posix()}' INTO TABLE budgets {options}
+                (user_id, category, amount, month);
+            SET unique_checks = 1;
+        """)
+        print(f'Loaded into MySQL in {time.perf_counter() - started:.1f}s')
+
+    print('Rebuilding monthly rollups...')
+    run_node(['rollups.js', 'rebuild'], env=dict(os.environ, **settings))
+
+    manifest = {
+        'users': args.users,
+        'transactions_per_user': args.transactions,
+        'months': args.months,
+        'seed': args.seed,
+        'password': args.password,
+        'loaded_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    path = APP_DIR / MANIFEST
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2))
+    print(f'Wrote {path}')
+
+
+class Connection(http.client.HTTPConnection):
+    """Keep-alive connection with Nagle's algorithm off. http.client writes
+    headers and body separately, which otherwise adds ~40ms to every POST."""
+
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class Client:
+    """One simulated user: a keep-alive HTTP connection and a session cookie."""
+
+    def __init__(self, base_url, username, password, rng, manifest, recorder):
+        parsed = urlparse(base_url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.connection = Connection(self.host, self.port, timeout=30)
+        self.cookies = {}
+        self.username, self.password = username, password
+        self.rng = rng
+        self.months = [start.strftime('%Y-%m') for start in month_starts(manifest['months'])]
+        self.recorder = recorder
+        self.created = []
+        # Like the frontend, revalidate GETs with the last ETag and body seen
+        self.validated = {}
+
+    def request(self, label, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        cached = self.validated.get(path) if method == 'GET' else None
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        payload = json.dumps(body) if body is not None else None
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = Connection(self.host, self.port, timeout=30)
+            self.recorder.record(label, time.perf_counter() - started, None)
+            return None, None
+        self.recorder.record(label, time.perf_counter() - started, response.status)
+
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name] = rest.split(';', 1)[0]
+        if cached and response.status == 304:
+            return 200, cached[1]
+        if method == 'GET' and response.status == 200 and response.getheader('ETag'):
+            self.validated[path] = (response.getheader('ETag'), data)
+        return response.status, data
+
+    def json(self, label, method, path, body=None):
+        status, data = self.request(label, method, path, body)
+        if status is None or status >= 400:
+            return None
+        return json.loads(data) if data else None
+
+    def login(self):
+        self.cookies.clear()
+        self.validated.clear()
+        self.json('login', 'POST', '/api/auth/login', {'username': self.username, 'password': self.password})
+
+    def list(self):
+        query = {'limit': 50}
+        if self.rng.random() < 0.3:
+            query['category'] = self.rng.choice([name for name, *_ in EXPENSE_CATEGORIES])
+        page = self.json('list', 'GET', f'/api/transactions?{urlencode(query)}')
+        # Some users scroll a page or two further
+        pages = 0
+        while page and page.get('nextCursor') and pages < 2 and self.rng.random() < 0.5:
+            query['cursor'] = page['nextCursor']
+            page = self.json('list_page', 'GET', f'/api/transactions?{urlencode(query)}')
+            pages += 1
+
+    def dashboard(self):
+        # Stats always describe the current month; browsing history goes
+        # through the trends endpoint, for the year ending at a random month
+        self.json('dashboard', 'GET', '/api/dashboard/stats')
+        if self.rng.random() < 0.3:
+            end = date.fromisoformat(f'{self.rng.choice(self.months)}-01')
+            year, month = divmod(end.year * 12 + end.month - 12, 12)
+            start = date(year, month + 1, 1)
+            query = {'granularity': 'month', 'from': start.isoformat(), 'to': end.isoformat()}
+            self.json('trends', 'GET', f'/api/trends?{urlencode(query)}')
+
+    def budgets(self):
+        month = self.months[-1]
+        roll = self.rng.random()
+        if roll < 0.5:
+            self.json('budget_overview', 'GET', f'/api/budgets/overview?month={month}')
+        elif roll < 0.8:
+            self.json('budgets', 'GET', f'/api/budgets?month={month}')
+        else:
+            self.json('budget_save', 'POST', '/api/budgets', {
+                'category': self.rng.choice(BUDGET_CATEGORIES),
+                'amount': f'{self.rng.randrange(100, 1500)}.00',
+                'month': month,
+            })
+
+    def write(self):
+        roll = self.rng.random()
+        if self.created and roll < 0.25:
+            self.json('delete', 'DELETE', f'/api/transactions/{self.created.pop()}')
+            return
+
+        name, _, median, spread = self.rng.choice(EXPENSE_CATEGORIES)
+        body = {
+            'amount': f'{max(0.5, self.rng.lognormvariate(math.log(median), spread)):.2f}',
+            'category': name,
+            'description': self.rng.choice(DESCRIPTIONS[name]),
+            'transaction_type': 'expense',
+            'date': date.today().isoformat(),
+        }
+        if self.created and roll < 0.5:
+            self.json('update', 'PUT', f'/api/transactions/{self.rng.choice(self.created)}', body)
+        else:
+            created = self.json('create', 'POST', '/api/transactions', body)
+            if created and 'id' in created:
+                self.created.append(created['id'])
+
+    def cleanup(self):
+        for transaction_id in self.created:
+            self.request('cleanup', 'DELETE', f'/api/transactions/{transaction_id}')
+        self.connection.close()
+
+
+class Recorder:
+    """Latency samples per endpoint label, kept only after the warmup ends."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.recording = False
+
+    def record(self, label, elapsed, status):
+        if not self.recording or label == 'cleanup':
+            return
+        with self.lock:
+            self.samples.setdefault(label, []).append(elapsed)
+            if status is None or status >= 400:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, errors, seconds):
+    endpoints = {}
+    for label, values in sorted(samples.items()):
+        values.sort()
+        endpoints[label] = {
+            'requests': len(values),
+            'errors': errors.get(label, 0),
+            'throughput_rps': round(len(values) / seconds, 2),
+            'mean_ms': round(1000 * sum(values) / len(values), 2),
+            'p50_ms': round(1000 * percentile(values, 0.50), 2),
+            'p95_ms': round(1000 * percentile(values, 0.95), 2),
+            'p99_ms': round(1000 * percentile(values, 0.99), 2),
+            'max_ms': round(1000 * values[-1], 2),
+        }
+    every = sorted(value for values in samples.values() for value in values)
+    total = {
+        'requests': len(every),
+        'errors': sum(errors.values()),
+        'throughput_rps': round(len(every) / seconds, 2),
+    }
+    if every:
+        total.update({
+            'p50_ms': round(1000 * percentile(every, 0.50), 2),
+            'p95_ms': round(1000 * percentile(every, 0.95), 2),
+            'p99_ms': round(1000 * percentile(every, 0.99), 2),
+        })
+    return endpoints, total
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('login', 'list', 'dashboard', 'budgets', 'write'):
+            sys.exit(f'Unknown mix entry: {name}')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def wait_for_server(base_url, process, timeout=60):
+    parsed = urlparse(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit('Server exited during startup')
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=2)
+            connection.request('GET', '/api/transactions')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.25)
+    sys.exit('Server did not start in time')
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    manifest_path = APP_DIR / MANIFEST
+    if not manifest_path.exists():
+        sys.exit('No dataset found: run `python benchmark.py load` first')
+    manifest = json.loads(manifest_path.read_text())
+    mix = parse_mix(args.mix)
+
+    server = None
+    base_url = args.url
+    if args.start_server:
+        base_url = f'http://127.0.0.1:{args.port}'
+        server = subprocess.Popen(['node', 'server.js'], cwd=APP_DIR, env=dict(os.environ, PORT=str(args.port)),
+                                  stdout=subprocess.DEVNULL)
+        wait_for_server(base_url, server)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    rng = random.Random(args.seed)
+    clients = [
+        Client(base_url, f'{USERNAME_PREFIX}{rng.randrange(manifest["users"])}', manifest['password'],
+               random.Random(rng.random()), manifest, recorder)
+        for _ in range(args.concurrency)
+    ]
+    actions, weights = list(mix), list(mix.values())
+
+    def drive(client):
+        client.login()
+        while not stop.is_set():
+            action = client.rng.choices(actions, weights)[0]
+            getattr(client, action)()
+
+    try:
+        threads = [threading.Thread(target=drive, args=(client,), daemon=True) for client in clients]
+        for thread in threads:
+            thread.start()
+        print(f'Warming up for {args.warmup}s...')
+        time.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        print(f'Measuring for {args.duration}s with {args.concurrency} clients...')
+        time.sleep(args.duration)
+        recorder.recording = False
+        measured = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for client in clients:
+            client.cleanup()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    endpoints, total = summarize(recorder.samples, recorder.errors, measured)
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'config': {
+            'url': base_url,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': mix,
+            'seed': args.seed,
+            'dataset': {key: manifest[key] for key in ('users', 'transactions_per_user', 'months')},
+            'server_env': {key: os.environ[key] for key in ('SESSION_STORE', 'CLUSTER_WORKERS', 'CACHE_ENABLED')
+                           if key in os.environ},
+        },
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+    print_table(endpoints, total)
+    output = Path(args.output or APP_DIR / 'bench-results' / f'{datetime.now():%Y%m%d-%H%M%S}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f'\nSaved {output}')
+
+    if args.baseline:
+        compare_results(json.loads(Path(args.baseline).read_text()), results)
+
+
+def print_table(endpoints, total):
+    print(f'\n{"endpoint":<14}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for label, stats in endpoints.items():
+        print(f'{label:<14}{stats["requests"]:>10}{stats["errors"]:>8}{stats["throughput_rps"]:>10}'
+              f'{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}{stats["p99_ms"]:>10}')
+    print(f'{"total":<14}{total["requests"]:>10}{total["errors"]:>8}{total["throughput_rps"]:>10}'
+          f'{total.get("p50_ms", "-"):>10}{total.get("p95_ms", "-"):>10}{total.get("p99_ms", "-"):>10}')
+
+
+def compare_results(baseline, current):
+    """Print throughput and p50/p99 changes per endpoint; negative latency deltas are improvements."""
+    def change(old, new):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+    print(f'\nCompared with {baseline.get("commit") or "baseline"} ({baseline.get("created_at")}):')
+    print(f'{"endpoint":<14}{"req/s":>18}{"p50 ms":>22}{"p99 ms":>22}')
+    rows = [(label, baseline['endpoints'].get(label), stats) for label, stats in current['endpoints'].items()]
+    rows.append(('total', baseline['total'], current['total']))
+    for label, old, new in rows:
+        if not old:
+            print(f'{label:<14}  (not in baseline)')
+            continue
+        cells = [f'{new[key]} ({change(old[key], new[key])})' if key in new and key in old else '-'
+                 for key in ('throughput_rps', 'p50_ms', 'p99_ms')]
+        print(f'{label:<14}{cells[0]:>18}{cells[1]:>22}{cells[2]:>22}')
+
+
+def compare(args):
+    compare_results(json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the personal finance tracker backend')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = commands.add_parser('load', help='generate and bulk-load a synthetic dataset')
+    load_parser.add_argument('--users', type=int, default=100)
+    load_parser.add_argument('--transactions', type=int, default=1000, help='transactions per user')
+    load_parser.add_argument('--months', type=int, default=24, help='months of history')
+    load_parser.add_argument('--seed', type=int, default=42)
+    load_parser.add_argument('--password', default='bench-password')
+    load_parser.set_defaults(handler=load)
+
+    run_parser = commands.add_parser('run', help='drive load against the server and record latencies')
+    run_parser.add_argument('--url', default='http://127.0.0.1:3000')
+    run_parser.add_argument('--start-server', action='store_true', help='start `node server.js` for the run')
+    run_parser.add_argument('--port', type=int, default=3100, help='port for --start-server')
+    run_parser.add_argument('--concurrency', type=int, default=16)
+    run_parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before measuring')
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help=f'weighted actions (default {DEFAULT_MIX})')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', help='results file (default bench-results/<timestamp>.json)')
+    run_parser.add_argument('--baseline', help='results file to compare against')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
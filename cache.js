@@ -0,0 +1,88 @@
+// Per-user response cache for read endpoints whose data only changes when
+// that user writes (dashboard stats, budgets).
+//
+// Entries are keyed by user, the user's data_version and a scope such as
+// `dashboard:2024-12`. Every write bumps users.data_version in the database,
+// so a read that sees the new version (conditionalRead fetches it for the
+// ETag) can never find an entry computed before the write, in this process
+// or any other. Older entries are simply never looked up again and age out of
+// the backend.
+//
+// A backend stores opaque JSON-serializable values and must implement:
+//   get(key)                -> value or undefined
+//   set(key, value, ttlMs)
+// All methods may return promises, so a shared store such as Redis can be used
+// when several Node processes serve the same users.
+
+class MemoryCacheBackend {
+    constructor({ maxEntries = 5000 } = {}) {
+        this.maxEntries = maxEntries;
+        this.entries = new Map();
+    }
+
+    get(key) {
+        const entry = this.entries.get(key);
+        if (!entry) {
+            return undefined;
+        }
+        if (entry.expiresAt <= Date.now()) {
+            this.entries.delete(key);
+            return undefined;
+        }
+
+        // Map keeps insertion order, so re-inserting marks the entry most recently used
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        return entry.value;
+    }
+
+    set(key, value, ttlMs) {
+        this.entries.delete(key);
+        this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+}
+
+class ResponseCache {
+    constructor(backend, { ttlMs = 60000, enabled = true } = {}) {
+        this.backend = backend;
+        this.ttlMs = ttlMs;
+        this.enabled = enabled;
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    // Return the cached value for (userId, dataVersion, scope), computing and
+    // storing it on a miss. Pass the data_version read on the same connection
+    // pool as `compute` uses, so a lagging replica stores its result under the
+    // version it actually reflects.
+    async wrap(userId, dataVersion, scope, compute) {
+        if (!this.enabled) {
+            return { value: await compute(), hit: false };
+        }
+
+        const key = `resp:${userId}:${dataVersion}:${scope}`;
+        const cached = await this.backend.get(key);
+        if (cached !== undefined) {
+            this.hits++;
+            return { value: cached, hit: true };
+        }
+
+        this.misses++;
+        const value = await compute();
+        await this.backend.set(key, value, this.ttlMs);
+        return { value, hit: false };
+    }
+
+    stats() {
+        return { hits: this.hits, misses: this.misses };
+    }
+}
+
+module.exports = {
+    MemoryCacheBackend,
+    ResponseCache
+};
\ No newline at end of file
@@ -0,0 +1,139 @@
+// Streaming parsers for bank statement uploads. Each reader consumes a text
+// stream chunk by chunk and yields { row, transaction } objects without ever
+// holding the whole file in memory; `transaction` uses the same field names
+// as the POST /api/transactions body so it can be validated the same way.
+
+const CSV_COLUMN_ALIASES = {
+    type: 'transaction_type'
+};
+
+// RFC 4180 CSV: quoted fields may contain commas, newlines and "" escapes
+async function* parseCsvRecords(stream) {
+    let field = '';
+    let record = [];
+    let inQuotes = false;
+    let quoteSeen = false;
+
+    for await (const chunk of stream) {
+        for (let i = 0; i < chunk.length; i++) {
+            const char = chunk[i];
+
+            if (inQuotes) {
+                if (quoteSeen) {
+                    quoteSeen = false;
+                    if (char === '"') {
+                        field += '"';
+                        continue;
+                    }
+                    inQuotes = false;
+                } else if (char === '"') {
+                    quoteSeen = true;
+                    continue;
+                } else {
+                    field += char;
+                    continue;
+                }
+            }
+
+            if (char === '"' && field === '') {
+                inQuotes = true;
+            } else if (char === ',') {
+                record.push(field);
+                field = '';
+            } else if (char === '\n') {
+                record.push(field);
+                if (record.length > 1 || record[0] !== '') {
+                    yield record;
+                }
+                field = '';
+                record = [];
+            } else if (char !== '\r') {
+                field += char;
+            }
+        }
+    }
+
+    if (field !== '' || record.length > 0) {
+        record.push(field);
+        yield record;
+    }
+}
+
+async function* readCsvTransactions(stream) {
+    let columns = null;
+    let row = 0;
+
+    for await (const record of parseCsvRecords(stream)) {
+        if (!columns) {
+            // Spreadsheet exports often start with a UTF-8 byte order mark
+            record[0] = record[0].replace(/^\uFEFF/, '');
+            columns = record.map(name => {
+                const column = name.trim().toLowerCase();
+                return CSV_COLUMN_ALIASES[column] || column;
+            });
+            continue;
+        }
+
+        row++;
+        const transaction = {};
+        columns.forEach((column, index) => {
+            transaction[column] = (record[index] || '').trim();
+        });
+        yield { row, transaction };
+    }
+}
+
+function ofxTag(block, tag) {
+    const match = block.match(new RegExp(`<${tag}>([^<\\r\\n]*)`, 'i'));
+    return match ? match[1].trim() : '';
+}
+
+// OFX 1.x (SGML) and 2.x (XML) statements: one <STMTTRN> block per transaction.
+// OFX carries no category, so every row gets `defaultCategory`.
+async function* readOfxTransactions(stream, { defaultCategory = 'Other' } = {}) {
+    let buffer = '';
+    let row = 0;
+
+    for await (const chunk of stream) {
+        buffer += chunk;
+
+        let start = buffer.search(/<STMTTRN>/i);
+        while (start !== -1) {
+            const end = buffer.slice(start).search(/<\/STMTTRN>/i);
+            if (end === -1) {
+                break;
+            }
+
+            const block = buffer.slice(start, start + end);
+            buffer = buffer.slice(start + end + '</STMTTRN>'.length);
+            start = buffer.search(/<STMTTRN>/i);
+
+            row++;
+            const amount = Number(ofxTag(block, 'TRNAMT'));
+            const posted = ofxTag(block, 'DTPOSTED');
+            yield {
+                row,
+                transaction: {
+                    amount: Number.isFinite(amount) ? Math.abs(amount).toFixed(2) : '',
+                    transaction_type: amount < 0 ? 'expense' : 'income',
+                    category: defaultCategory,
+                    description: ofxTag(block, 'NAME') || ofxTag(block, 'MEMO'),
+                    date: /^\d{8}/.test(posted) ? `${posted.slice(0, 4)}-${posted.slice(4, 6)}-${posted.slice(6, 8)}` : ''
+                }
+            };
+        }
+
+        // Keep only what could still be the beginning of an unfinished block
+        if (start === -1) {
+            buffer = buffer.slice(-'<STMTTRN>'.length);
+        } else {
+            buffer = buffer.slice(start);
+        }
+    }
+}
+
+module.exports = {
+    parseCsvRecords,
+    readCsvTransactions,
+    readOfxTransactions
+};
\ No newline at end of file
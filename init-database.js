@@ -1,4 +1,6 @@
 const mysql = require('mysql2/promise');
+const bcrypt = require('bcrypt');
+const { LATEST_SCHEMA_VERSION, migrate } = require('./migrations');
 require('dotenv').config();
 
 async function initializeDatabase() {
@@ -16,61 +18,17 @@ async function initializeDatabase() {
         console.log(`✅ Database '${dbName}' created successfully`);
 
         // Use the database
-        await connection.execute(`USE ${dbName}`);
+        await connection.query(`USE ${dbName}`);
 
-        // Create users table
-        await connection.execute(`
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                email VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        `);
-        console.log('✅ Users table created');
-
-        // Create transactions table
-        await connection.execute(`
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                description VARCHAR(255),
-                transaction_type ENUM('income', 'expense') NOT NULL,
-                date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-        console.log('✅ Transactions table created');
-
-        // Create budgets table
-        await connection.execute(`
-            CREATE TABLE IF NOT EXISTS budgets (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                month CHAR(7) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_user_category_month (user_id, category, month),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-        console.log('✅ Budgets table created');
-
-        // Create sessions table for express-mysql-session
-        await connection.execute(`
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id VARCHAR(128) COLLATE utf8mb4_bin NOT NULL,
-                expires INT(11) UNSIGNED NOT NULL,
-                data MEDIUMTEXT COLLATE utf8mb4_bin,
-                PRIMARY KEY (session_id)
-            )
-        `);
-        console.log('✅ Sessions table created');
+        // Create tables, indexes and the default admin user
+        const rounds = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+        const applied = await migrate(connection, {
+            hashPassword: password => bcrypt.hash(password, rounds),
+            allowBlocking: true
+        });
+        console.log(applied.length === 0
+            ? '✅ Schema already up to date'
+            : `✅ Applied ${applied.length} migrations (schema version ${LATEST_SCHEMA_VERSION})`);
 
         await connection.end();
         console.log('🎉 Database initialization completed successfully!');
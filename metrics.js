@@ -0,0 +1,314 @@
+const { monitorEventLoopDelay } = require('perf_hooks');
+
+// In-process metrics rendered in the Prometheus text exposition format.
+// Counters and histograms are updated as things happen; gauges are read from a
+// callback at scrape time. In cluster mode every worker keeps its own
+// registry, so each scrape describes the worker that answered it.
+
+const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+function formatLabels(names, values) {
+    if (names.length === 0) {
+        return '';
+    }
+    const pairs = names.map((name, index) =>
+        `${name}="${String(values[index]).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n')}"`);
+    return `{${pairs.join(',')}}`;
+}
+
+function seconds(start) {
+    return Number(process.hrtime.bigint() - start) / 1e9;
+}
+
+class Counter {
+    constructor(name, help, labelNames = []) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.values = new Map();
+    }
+
+    inc(labels = {}, amount = 1) {
+        const key = JSON.stringify(this.labelNames.map(name => labels[name]));
+        this.values.set(key, (this.values.get(key) || 0) + amount);
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+        for (const [key, value] of this.values) {
+            lines.push(`${this.name}${formatLabels(this.labelNames, JSON.parse(key))} ${value}`);
+        }
+        return lines;
+    }
+}
+
+class Histogram {
+    constructor(name, help, labelNames = [], buckets = DEFAULT_BUCKETS) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.buckets = buckets;
+        this.series = new Map();
+    }
+
+    observe(labels, value) {
+        const key = JSON.stringify(this.labelNames.map(name => labels[name]));
+        let series = this.series.get(key);
+        if (!series) {
+            series = { counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 };
+            this.series.set(key, series);
+        }
+        // Counts are per bucket here and made cumulative when rendered
+        const index = this.buckets.findIndex(bound => value <= bound);
+        if (index !== -1) {
+            series.counts[index]++;
+        }
+        series.sum += value;
+        series.count++;
+    }
+
+    // Time a promise-returning function, recording failures as well
+    async time(labels, fn) {
+        const start = process.hrtime.bigint();
+        try {
+            return await fn();
+        } finally {
+            this.observe(labels, seconds(start));
+        }
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+        const names = [...this.labelNames, 'le'];
+        for (const [key, series] of this.series) {
+            const values = JSON.parse(key);
+            let cumulative = 0;
+            this.buckets.forEach((bound, index) => {
+                cumulative += series.counts[index];
+                lines.push(`${this.name}_bucket${formatLabels(names, [...values, bound])} ${cumulative}`);
+            });
+            lines.push(`${this.name}_bucket${formatLabels(names, [...values, '+Inf'])} ${series.count}`);
+            lines.push(`${this.name}_sum${formatLabels(this.labelNames, values)} ${series.sum}`);
+            lines.push(`${this.name}_count${formatLabels(this.labelNames, values)} ${series.count}`);
+        }
+        return lines;
+    }
+}
+
+// `collect()` returns a number, or an array of [labels, value] pairs
+class Gauge {
+    constructor(name, help, labelNames, collect) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.collect = collect;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} gauge`];
+        const collected = this.collect();
+        const samples = Array.isArray(collected) ? collected : [[{}, collected]];
+        for (const [labels, value] of samples) {
+            lines.push(`${this.name}${formatLabels(this.labelNames, this.labelNames.map(name => labels[name]))} ${value}`);
+        }
+        return lines;
+    }
+}
+
+class MetricsRegistry {
+    constructor() {
+        this.metrics = [];
+    }
+
+    counter(name, help, labelNames) {
+        return this.register(new Counter(name, help, labelNames));
+    }
+
+    histogram(name, help, labelNames, buckets) {
+        return this.register(new Histogram(name, help, labelNames, buckets));
+    }
+
+    gauge(name, help, labelNames, collect) {
+        return this.register(new Gauge(name, help, labelNames, collect));
+    }
+
+    register(metric) {
+        this.metrics.push(metric);
+        return metric;
+    }
+
+    render() {
+        return this.metrics.flatMap(metric => metric.render()).join('\n') + '\n';
+    }
+}
+
+// Per-route request latency, plus the time spent in res.json() so slow
+// serialization can be told apart from slow queries
+function requestMetrics(registry) {
+    const duration = registry.histogram('http_request_duration_seconds',
+        'HTTP request latency by route', ['method', 'route', 'status']);
+    const serialize = registry.histogram('http_response_serialize_seconds',
+        'Time spent serializing JSON responses', ['route'],
+        [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25]);
+
+    // Label by route pattern (/api/transactions/:id), never by raw URL
+    const routeOf = req => (req.route ? `${req.baseUrl}${req.route.path}` : 'unmatched');
+
+    return (req, res, next) => {
+        const start = process.hrtime.bigint();
+
+        const json = res.json;
+        res.json = function (body) {
+            const serializeStart = process.hrtime.bigint();
+            const result = json.call(this, body);
+            serialize.observe({ route: routeOf(req) }, seconds(serializeStart));
+            return result;
+        };
+
+        res.on('finish', () => {
+            duration.observe({ method: req.method, route: routeOf(req), status: res.statusCode }, seconds(start));
+        });
+        next();
+    };
+}
+
+// Name a statement by an explicit leading /* name */ comment, or else by its
+// verb and first table, e.g. "select transactions" (also for a UNION whose
+// first branch is parenthesized)
+function queryName(sql) {
+    const text = typeof sql === 'string' ? sql : sql.sql;
+    const comment = text.match(/^\s*\/\*\s*([\w:.-]+)\s*\*\//);
+    if (comment) {
+        return comment[1];
+    }
+    const verb = (text.match(/^[\s(]*(\w+)/) || [, 'unknown'])[1].toLowerCase();
+    const table = text.match(/\b(?:from|into|update|table)\s+(?:if\s+(?:not\s+)?exists\s+)?`?(\w+)/i);
+    return table ? `${verb} ${table[1]}` : verb;
+}
+
+function rowCount(result) {
+    const [rows] = result;
+    return Array.isArray(rows) ? rows.length : (rows && rows.affectedRows) || 0;
+}
+
+// Metric families shared by every instrumented pool, labelled by pool name
+const poolFamilies = new WeakMap();
+
+function poolMetrics(registry) {
+    let families = poolFamilies.get(registry);
+    if (families) {
+        return families;
+    }
+
+    // mysql2 keeps these counts on the underlying callback pool
+    const pools = new Map();
+    const byPool = collect => [...pools].flatMap(([name, core]) => collect(name, core));
+    families = {
+        pools,
+        duration: registry.histogram('db_query_duration_seconds',
+            'Database query latency by statement', ['pool', 'query']),
+        rows: registry.counter('db_query_rows_total',
+            'Rows returned or affected by statement', ['pool', 'query']),
+        errors: registry.counter('db_query_errors_total',
+            'Failed database queries by statement', ['pool', 'query']),
+        queueWait: registry.histogram('db_pool_queue_wait_seconds',
+            'Time spent waiting for a pool connection, including timeouts', ['pool'],
+            [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10])
+    };
+    registry.gauge('db_pool_connections', 'Pool connections by state', ['pool', 'state'], () =>
+        byPool((name, core) => {
+            const all = core._allConnections.length;
+            const idle = core._freeConnections.length;
+            return [[{ pool: name, state: 'active' }, all - idle], [{ pool: name, state: 'idle' }, idle]];
+        }));
+    registry.gauge('db_pool_queued_requests', 'Requests waiting for a pool connection', ['pool'], () =>
+        byPool((name, core) => [[{ pool: name }, core._connectionQueue.length]]));
+    registry.gauge('db_pool_connection_limit', 'Maximum pool size', ['pool'], () =>
+        byPool((name, core) => [[{ pool: name }, core.config.connectionLimit]]));
+
+    poolFamilies.set(registry, families);
+    return families;
+}
+
+// Time every execute()/query() on a mysql2 promise pool, including the
+// connections it hands out, and the wait for each connection. Statements
+// slower than `slowQueryMs` are logged. Metrics are labelled with `name`, so
+// several pools can share a registry.
+function instrumentPool(pool, registry, { name = 'default', slowQueryMs = 200 } = {}) {
+    const { pools, duration, rows, errors, queueWait } = poolMetrics(registry);
+    const instrumented = Symbol('instrumented');
+
+    const wrap = (target) => {
+        if (target[instrumented]) {
+            return target;
+        }
+        for (const method of ['execute', 'query']) {
+            const original = target[method];
+            target[method] = async function (sql, ...args) {
+                const labels = { pool: name, query: queryName(sql) };
+                const start = process.hrtime.bigint();
+                try {
+                    const result = await original.call(this, sql, ...args);
+                    rows.inc(labels, rowCount(result));
+                    return result;
+                } catch (error) {
+                    errors.inc(labels);
+                    throw error;
+                } finally {
+                    const elapsed = seconds(start);
+                    duration.observe(labels, elapsed);
+                    if (elapsed * 1000 >= slowQueryMs) {
+                        const text = (typeof sql === 'string' ? sql : sql.sql).replace(/\s+/g, ' ').trim();
+                        console.warn(`Slow query (${Math.round(elapsed * 1000)}ms) ${labels.query} on ${name}: ${text.slice(0, 500)}`);
+                    }
+                }
+            };
+        }
+        target[instrumented] = true;
+        return target;
+    };
+
+    wrap(pool);
+    const getConnection = pool.getConnection;
+    pool.getConnection = async function (...args) {
+        return wrap(await getConnection.apply(this, args));
+    };
+
+    // execute() and query() acquire their connections through the callback
+    // pool's getConnection, so timing it there covers every caller
+    const core = pool.pool;
+    const acquire = core.getConnection;
+    core.getConnection = function (callback) {
+        const start = process.hrtime.bigint();
+        return acquire.call(this, (error, connection) => {
+            queueWait.observe({ pool: name }, seconds(start));
+            callback(error, connection);
+        });
+    };
+    pools.set(name, core);
+
+    return pool;
+}
+
+// Event loop delay percentiles over the interval since the previous scrape
+function monitorEventLoop(registry) {
+    const histogram = monitorEventLoopDelay({ resolution: 10 });
+    histogram.enable();
+
+    registry.gauge('nodejs_eventloop_lag_seconds', 'Event loop delay since the last scrape', ['quantile'], () => {
+        const samples = [0.5, 0.9, 0.99].map(quantile =>
+            [{ quantile }, histogram.count ? histogram.percentile(quantile * 100) / 1e9 : 0]);
+        samples.push([{ quantile: 1 }, histogram.count ? histogram.max / 1e9 : 0]);
+        histogram.reset();
+        return samples;
+    });
+    return histogram;
+}
+
+module.exports = {
+    MetricsRegistry,
+    requestMetrics,
+    instrumentPool,
+    monitorEventLoop,
+    queryName
+};
\ No newline at end of file
@@ -0,0 +1,367 @@
+const mysql = require('mysql2/promise');
+const { createRollupTable } = require('./rollups');
+const { createArchiveTable, createArchiveSummaryTable } = require('./archive');
+const { createLoginFailuresTable } = require('./auth');
+require('dotenv').config();
+
+// Versioned schema changes. Each migration runs once, in order, and is
+// recorded in schema_migrations, so a server start on an up-to-date database
+// only has to read the current version. Migrations are append-only: never edit
+// one that has shipped, add a new one instead.
+//
+// `up(connection, context)` receives a dedicated connection and
+// { hashPassword(password) -> Promise<hash>, allowBlocking } for seeding users.
+// A migration that locks a table against writes while it runs sets
+// `blocksWrites: true`; migrate() only applies those when the caller passes
+// `allowBlocking` (the `npm run migrate` command does, server startup does not).
+
+const createMigrationsTable = `
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+`;
+
+const MIGRATION_LOCK = 'finance_tracker_schema_migrations';
+const MIGRATION_LOCK_TIMEOUT_SECONDS = 60;
+
+async function indexExists(connection, table, name) {
+    const [existing] = await connection.execute(`
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ?
+        LIMIT 1
+    `, [table, name]);
+    return existing.length > 0;
+}
+
+// Add an index unless it already exists. ALGORITHM=INPLACE, LOCK=NONE keeps
+// the table readable and writable while the index builds, so this is safe to
+// run against a busy production table.
+async function addIndexOnline(connection, table, name, columns) {
+    if (!(await indexExists(connection, table, name))) {
+        await connection.query(`ALTER TABLE ${table} ADD INDEX ${name} ${columns}, ALGORITHM=INPLACE, LOCK=NONE`);
+        console.log(`Added index ${name} on ${table}`);
+    }
+}
+
+// Add a column unless it already exists. Without an ALGORITHM clause MySQL 8
+// picks INSTANT (a metadata-only change) and 5.7 an in-place rebuild that
+// still allows concurrent writes.
+async function addColumn(connection, table, name, definition) {
+    const [existing] = await connection.execute(`
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ?
+        LIMIT 1
+    `, [table, name]);
+    if (existing.length === 0) {
+        await connection.query(`ALTER TABLE ${table} ADD COLUMN ${name} ${definition}`);
+        console.log(`Added column ${name} on ${table}`);
+    }
+}
+
+const migrations = [
+    {
+        version: 1,
+        name: 'create_core_tables',
+        // IF NOT EXISTS lets databases created before migrations adopt this baseline
+        async up(connection) {
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS users (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    username VARCHAR(50) UNIQUE NOT NULL,
+                    password VARCHAR(255) NOT NULL,
+                    email VARCHAR(100),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            `);
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    description VARCHAR(255),
+                    transaction_type ENUM('income', 'expense') NOT NULL,
+                    date DATE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            `);
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS budgets (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    month CHAR(7) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY unique_user_category_month (user_id, category, month),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            `);
+        }
+    },
+    {
+        version: 2,
+        name: 'add_transaction_indexes',
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_date',
+                '(user_id, date, transaction_type, category, amount)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_date_created',
+                '(user_id, date, created_at)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_category_date',
+                '(user_id, category, date, created_at)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_type_date',
+                '(user_id, transaction_type, date, created_at)');
+        }
+    },
+    {
+        version: 3,
+        name: 'create_monthly_category_totals',
+        // The backfill is one INSERT ... SELECT over all of transactions, which
+        // holds shared locks on every row it reads until it commits. It cannot
+        // be split into batches: writes landing between batches would either
+        // miss the rollup or be counted twice.
+        blocksWrites: true,
+        async up(connection) {
+            await connection.query(createRollupTable);
+            // Populate it on databases that already have transactions
+            const [[state]] = await connection.execute(`
+                SELECT
+                    EXISTS(SELECT 1 FROM monthly_category_totals) AS has_rollups,
+                    EXISTS(SELECT 1 FROM transactions) AS has_transactions
+            `);
+            if (!state.has_rollups && state.has_transactions) {
+                const [result] = await connection.query(`
+                    INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+                    SELECT user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category, SUM(amount), COUNT(*)
+                    FROM transactions
+                    GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+                `);
+                console.log(`Backfilled monthly_category_totals (${result.affectedRows} rows)`);
+            }
+        }
+    },
+    {
+        version: 4,
+        name: 'create_sessions_table',
+        // Same layout express-mysql-session would create
+        async up(connection) {
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id VARCHAR(128) COLLATE utf8mb4_bin NOT NULL,
+                    expires INT(11) UNSIGNED NOT NULL,
+                    data MEDIUMTEXT COLLATE utf8mb4_bin,
+                    PRIMARY KEY (session_id)
+                )
+            `);
+        }
+    },
+    {
+        version: 5,
+        name: 'seed_admin_user',
+        async up(connection, { hashPassword }) {
+            const [admins] = await connection.execute('SELECT id FROM users WHERE username = ?', ['admin']);
+            if (admins.length === 0) {
+                const hashedPassword = await hashPassword('password123');
+                await connection.execute(`
+                    INSERT IGNORE INTO users (username, password, email)
+                    VALUES (?, ?, ?)
+                `, ['admin', hashedPassword, 'admin@example.com']);
+            }
+        }
+    },
+    {
+        version: 6,
+        name: 'add_users_data_version',
+        // Bumped by every write a user makes; read endpoints derive their ETags from it
+        async up(connection) {
+            await addColumn(connection, 'users', 'data_version', 'BIGINT UNSIGNED NOT NULL DEFAULT 0');
+        }
+    },
+    {
+        version: 7,
+        name: 'add_sync_columns',
+        // change_version is the users.data_version of the write that last touched
+        // a row; deleted_at turns deletes into tombstones that /api/sync can report
+        async up(connection) {
+            for (const table of ['transactions', 'budgets']) {
+                await addColumn(connection, table, 'updated_at',
+                    'TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)');
+                await addColumn(connection, table, 'deleted_at', 'TIMESTAMP NULL DEFAULT NULL');
+                await addColumn(connection, table, 'change_version', 'BIGINT UNSIGNED NOT NULL DEFAULT 0');
+                await addIndexOnline(connection, table, `idx_${table}_user_change`, '(user_id, change_version)');
+                await addIndexOnline(connection, table, `idx_${table}_deleted`, '(deleted_at)');
+            }
+        }
+    },
+    {
+        version: 8,
+        name: 'add_transaction_trend_index',
+        // Covers weekly trend aggregation: live rows of one user over a date range
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_live_date',
+                '(user_id, deleted_at, date, transaction_type, category, amount)');
+        }
+    },
+    {
+        version: 9,
+        name: 'add_transaction_search',
+        // search_text leads with a usr<id> token that every search requires.
+        // This does not narrow the index lookup: in boolean mode each `+` term
+        // reads its whole posting list and the lists are intersected, so the
+        // token's list grows with the user's rows and a common word's list with
+        // everyone's. The search route therefore keeps short prefixes out of
+        // MATCH. INVISIBLE keeps the column out of SELECT *. Both steps
+        // block writes to transactions while they run (a stored generated
+        // column copies the table; the first FULLTEXT index allows reads only).
+        blocksWrites: true,
+        async up(connection) {
+            await addColumn(connection, 'transactions', 'search_text',
+                "VARCHAR(330) GENERATED ALWAYS AS (CONCAT('usr', user_id, ' ', category, ' ', COALESCE(description, ''))) STORED INVISIBLE");
+            if (!(await indexExists(connection, 'transactions', 'ft_transactions_search'))) {
+                await connection.query(
+                    'ALTER TABLE transactions ADD FULLTEXT INDEX ft_transactions_search (search_text), ALGORITHM=INPLACE, LOCK=SHARED'
+                );
+                console.log('Added index ft_transactions_search on transactions');
+            }
+        }
+    },
+    {
+        version: 10,
+        name: 'create_transaction_archive',
+        // Filled by `node archive.js run`; see archive.js
+        async up(connection) {
+            await connection.query(createArchiveTable);
+            await connection.query(createArchiveSummaryTable);
+        }
+    },
+    {
+        version: 11,
+        name: 'add_archive_sync_index',
+        // /api/sync walks each user's archived rows by change_version
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions_archive', 'idx_transactions_archive_user_change',
+                '(user_id, change_version)');
+        }
+    },
+    {
+        version: 12,
+        name: 'create_login_failures',
+        // Failed-login counters shared by every worker; see LoginThrottle in auth.js
+        async up(connection) {
+            await connection.query(createLoginFailuresTable);
+        }
+    }
+];
+
+const LATEST_SCHEMA_VERSION = migrations[migrations.length - 1].version;
+
+// Highest applied version, or 0 on a database that has never been migrated.
+// MAX() over the primary key is answered from the index.
+async function getSchemaVersion(connection) {
+    try {
+        const [[row]] = await connection.execute('SELECT MAX(version) AS version FROM schema_migrations');
+        return row.version || 0;
+    } catch (error) {
+        if (error.code === 'ER_NO_SUCH_TABLE') {
+            return 0;
+        }
+        throw error;
+    }
+}
+
+// Apply every pending migration. A named lock serializes concurrent runners
+// (for example several instances starting during a deploy); whoever waits
+// re-reads the version afterwards and finds nothing left to do. Nothing is
+// applied if a pending migration blocks writes and `context.allowBlocking` is
+// not set.
+async function migrate(connection, context) {
+    const [[lock]] = await connection.execute('SELECT GET_LOCK(?, ?) AS acquired',
+        [MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT_SECONDS]);
+    if (lock.acquired !== 1) {
+        throw new Error('Timed out waiting for another process to finish migrating');
+    }
+
+    try {
+        await connection.query(createMigrationsTable);
+        const current = await getSchemaVersion(connection);
+        const blocking = migrations.filter(migration => migration.version > current && migration.blocksWrites);
+        if (blocking.length > 0 && !context.allowBlocking) {
+            throw new Error(`Migration ${blocking.map(migration => `${migration.version} ${migration.name}`).join(', ')} ` +
+                'blocks writes while it runs; apply it with npm run migrate');
+        }
+        const applied = [];
+
+        for (const migration of migrations) {
+            if (migration.version <= current) {
+                continue;
+            }
+            // MySQL commits DDL implicitly, so each migration is recorded as soon as it completes
+            await migration.up(connection, context);
+            await connection.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                [migration.version, migration.name]);
+            console.log(`Applied migration ${migration.version} ${migration.name}`);
+            applied.push(migration.version);
+        }
+
+        return applied;
+    } finally {
+        await connection.execute('SELECT RELEASE_LOCK(?)', [MIGRATION_LOCK]);
+    }
+}
+
+// Command line: node migrations.js <up|status>
+async function main() {
+    const [command] = process.argv.slice(2);
+
+    if (!['up', 'status'].includes(command)) {
+        console.error('Usage: node migrations.js <up|status>');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        if (command === 'up') {
+            const bcrypt = require('bcrypt');
+            const rounds = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+            const applied = await migrate(connection, {
+                hashPassword: password => bcrypt.hash(password, rounds),
+                allowBlocking: true
+            });
+            console.log(applied.length === 0 ? 'Schema is up to date' : `Applied ${applied.length} migrations`);
+        } else {
+            const version = await getSchemaVersion(connection);
+            console.log(`Schema version ${version}, latest ${LATEST_SCHEMA_VERSION}`);
+            migrations.filter(migration => migration.version > version).forEach(migration => {
+                console.log(`Pending: ${migration.version} ${migration.name}${migration.blocksWrites ? ' (blocks writes)' : ''}`);
+            });
+        }
+    } catch (error) {
+        console.error('Migration error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    migrations,
+    LATEST_SCHEMA_VERSION,
+    addIndexOnline,
+    addColumn,
+    getSchemaVersion,
+    migrate
+};
\ No newline at end of file
@@ -0,0 +1,116 @@
+const mysql = require('mysql2/promise');
+
+// Separate MySQL pools for writes and reads. Writes (and logins) go to the
+// primary; the read pool serves list, search, export, sync and dashboard
+// reads and may point at a replica. Each pool fails requests that wait longer
+// than its queue timeout for a connection instead of queueing them forever.
+
+const RECENT_WRITE_COOKIE = 'finance_tracker_wrote';
+
+class PoolQueueTimeoutError extends Error {
+    constructor(name, timeoutMs) {
+        super(`Timed out after ${timeoutMs}ms waiting for a ${name} pool connection`);
+        this.name = 'PoolQueueTimeoutError';
+        this.code = 'POOL_QUEUE_TIMEOUT';
+    }
+}
+
+// A mysql2 promise pool whose connection requests give up after `queueTimeoutMs`
+// (0 waits indefinitely). execute() and query() acquire connections through
+// the same method, so the timeout covers them too. A connection that arrives
+// after its request gave up goes straight back to the pool.
+function createPool(config, { name, queueTimeoutMs = 0 }) {
+    const pool = mysql.createPool(config);
+    pool.name = name;
+    if (queueTimeoutMs <= 0) {
+        return pool;
+    }
+
+    const core = pool.pool;
+    const getConnection = core.getConnection;
+    core.getConnection = function (callback) {
+        let timedOut = false;
+        const timer = setTimeout(() => {
+            timedOut = true;
+            callback(new PoolQueueTimeoutError(name, queueTimeoutMs));
+        }, queueTimeoutMs);
+        return getConnection.call(this, (error, connection) => {
+            if (timedOut) {
+                if (connection) {
+                    connection.release();
+                }
+                return;
+            }
+            clearTimeout(timer);
+            callback(error, connection);
+        });
+    };
+    return pool;
+}
+
+// Read-your-writes for a replica. A mutation marks the client with a cookie
+// that lives `windowMs` (chosen to exceed the replica's usual lag), and that
+// client's reads go to the primary until it expires. The cookie works across
+// cluster workers but only covers the browser that wrote, so the user's last
+// write time is also kept in process: their other devices and tabs read from
+// the primary too while they hit this worker. Workers do not share that map.
+class ReadRouter {
+    constructor(readPool, writePool, { windowMs = 0 } = {}) {
+        this.readPool = readPool;
+        this.writePool = writePool;
+        this.windowMs = windowMs;
+        this.pattern = new RegExp(`(?:^|;\\s*)${RECENT_WRITE_COOKIE}=1(?:;|$)`);
+        // userId -> time the window ends, oldest first
+        this.recentWriters = new Map();
+    }
+
+    // Middleware: mark every authenticated mutation. The cookie is set before
+    // the route runs, so it goes out with the response even on errors.
+    markWrites() {
+        return (req, res, next) => {
+            if (this.windowMs > 0 && !['GET', 'HEAD', 'OPTIONS'].includes(req.method) && req.session && req.session.userId) {
+                res.cookie(RECENT_WRITE_COOKIE, '1', { maxAge: this.windowMs, httpOnly: true, sameSite: 'lax' });
+                this.recordWrite(req.session.userId);
+            }
+            next();
+        };
+    }
+
+    // Every window has the same length, so re-inserting keeps the map ordered
+    // by expiry and expired users can be dropped from the front
+    recordWrite(userId) {
+        const now = Date.now();
+        for (const [user, until] of this.recentWriters) {
+            if (until > now) {
+                break;
+            }
+            this.recentWriters.delete(user);
+        }
+        this.recentWriters.delete(userId);
+        this.recentWriters.set(userId, now + this.windowMs);
+    }
+
+    // The pool a read made for `req` should use. The choice is kept on the
+    // request, so the data_version behind its ETag and cache key comes from
+    // the same server as the body even if the window ends in between.
+    poolFor(req) {
+        if (!req.readPool) {
+            req.readPool = this.windowMs > 0 && this.wroteRecently(req) ? this.writePool : this.readPool;
+        }
+        return req.readPool;
+    }
+
+    wroteRecently(req) {
+        if (this.pattern.test(req.headers.cookie || '')) {
+            return true;
+        }
+        const until = req.session && this.recentWriters.get(req.session.userId);
+        return until > Date.now();
+    }
+}
+
+module.exports = {
+    createPool,
+    PoolQueueTimeoutError,
+    ReadRouter
+};
\ No newline at end of file
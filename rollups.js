@@ -0,0 +1,182 @@
+const mysql = require('mysql2/promise');
+const { createArchiveTable } = require('./archive');
+require('dotenv').config();
+
+// monthly_category_totals holds one row per (user, month, type, category) so
+// the dashboard never has to aggregate raw transactions. Every transaction
+// write applies its delta here inside the same database transaction.
+
+const createRollupTable = `
+    CREATE TABLE IF NOT EXISTS monthly_category_totals (
+        user_id INT NOT NULL,
+        month CHAR(7) NOT NULL,
+        transaction_type ENUM('income', 'expense') NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        transaction_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, month, transaction_type, category),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+`;
+
+// Add (sign = 1) or remove (sign = -1) the contribution of a set of
+// transactions, folded into one multi-row upsert
+async function applyRollupDeltas(connection, userId, transactions, sign) {
+    const groups = new Map();
+    for (const transaction of transactions) {
+        const month = transaction.date.slice(0, 7);
+        const key = JSON.stringify([month, transaction.transaction_type, transaction.category]);
+        const group = groups.get(key) || [userId, month, transaction.transaction_type, transaction.category, 0, 0];
+        // Sum in integer cents to avoid floating point drift
+        group[4] += Math.round(Number(transaction.amount) * 100);
+        group[5] += 1;
+        groups.set(key, group);
+    }
+    if (groups.size === 0) {
+        return;
+    }
+
+    const rows = [...groups.values()].map(([user, month, type, category, cents, count]) =>
+        [user, month, type, category, (sign * cents / 100).toFixed(2), sign * count]);
+
+    await connection.query(`
+        INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+        VALUES ?
+        ON DUPLICATE KEY UPDATE
+            total = total + VALUES(total),
+            transaction_count = transaction_count + VALUES(transaction_count)
+    `, [rows]);
+}
+
+// Add (sign = 1) or remove (sign = -1) one transaction's contribution
+async function applyRollupDelta(connection, userId, transaction, sign) {
+    await applyRollupDeltas(connection, userId, [transaction], sign);
+}
+
+// Live (not soft-deleted) transactions plus archived ones, for every user or
+// just one. Archived years keep their rollup rows, so both count.
+function transactionSource(userId) {
+    const live = userId === null ? 'WHERE deleted_at IS NULL' : 'WHERE deleted_at IS NULL AND user_id = ?';
+    const archived = userId === null ? '' : 'WHERE user_id = ?';
+    return `(
+        SELECT user_id, date, transaction_type, category, amount FROM transactions ${live}
+        UNION ALL
+        SELECT user_id, date, transaction_type, category, amount FROM transactions_archive ${archived}
+    ) AS source`;
+}
+
+// Recompute the rollup from raw and archived transactions, for every user or just one
+async function rebuildRollups(connection, userId = null) {
+    const where = userId === null ? '' : 'WHERE user_id = ?';
+    const params = userId === null ? [] : [userId];
+    const sourceParams = userId === null ? [] : [userId, userId];
+
+    await connection.beginTransaction();
+    try {
+        await connection.execute(`DELETE FROM monthly_category_totals ${where}`, params);
+        const [result] = await connection.execute(`
+            INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+            SELECT user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category, SUM(amount), COUNT(*)
+            FROM ${transactionSource(userId)}
+            GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+        `, sourceParams);
+        await connection.commit();
+        return result.affectedRows;
+    } catch (error) {
+        await connection.rollback();
+        throw error;
+    }
+}
+
+// Compare the rollup with raw and archived transactions and return every row that drifted
+async function verifyRollups(connection, userId = null) {
+    const where = userId === null ? '' : 'WHERE user_id = ?';
+    const params = userId === null ? [] : [userId];
+    const sourceParams = userId === null ? [] : [userId, userId];
+
+    const [expectedRows] = await connection.execute(`
+        SELECT user_id, DATE_FORMAT(date, '%Y-%m') AS month, transaction_type, category,
+               SUM(amount) AS total, COUNT(*) AS transaction_count
+        FROM ${transactionSource(userId)}
+        GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+    `, sourceParams);
+    const [actualRows] = await connection.execute(`
+        SELECT user_id, month, transaction_type, category, total, transaction_count
+        FROM monthly_category_totals
+        ${where}
+    `, params);
+
+    const key = row => [row.user_id, row.month, row.transaction_type, row.category].join('|');
+    const actual = new Map(actualRows.map(row => [key(row), row]));
+    const drift = [];
+
+    for (const row of expectedRows) {
+        const stored = actual.get(key(row));
+        actual.delete(key(row));
+        if (!stored || Number(stored.total) !== Number(row.total) ||
+            Number(stored.transaction_count) !== Number(row.transaction_count)) {
+            drift.push({ ...row, stored_total: stored ? stored.total : null });
+        }
+    }
+    // Leftover rollup rows must have been emptied out by deletes
+    for (const row of actual.values()) {
+        if (Number(row.transaction_count) !== 0 || Number(row.total) !== 0) {
+            drift.push({ ...row, total: '0.00', stored_total: row.total });
+        }
+    }
+
+    return drift;
+}
+
+// Command line: node rollups.js <verify|rebuild> [userId]
+async function main() {
+    const [command, userArg] = process.argv.slice(2);
+    const userId = userArg === undefined ? null : parseInt(userArg, 10);
+
+    if (!['verify', 'rebuild'].includes(command) || Number.isNaN(userId)) {
+        console.error('Usage: node rollups.js <verify|rebuild> [userId]');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        await connection.query(createRollupTable);
+        await connection.query(createArchiveTable);
+        if (command === 'rebuild') {
+            const rows = await rebuildRollups(connection, userId);
+            console.log(`Rebuilt monthly_category_totals (${rows} rows)`);
+        } else {
+            const drift = await verifyRollups(connection, userId);
+            drift.forEach(row => {
+                console.log(`Drift: user ${row.user_id} ${row.month} ${row.transaction_type}/${row.category}: ` +
+                    `expected ${row.total}, stored ${row.stored_total}`);
+            });
+            console.log(drift.length === 0 ? 'monthly_category_totals is consistent' : `${drift.length} drifted rows`);
+            process.exitCode = drift.length === 0 ? 0 : 2;
+        }
+    } catch (error) {
+        console.error('Rollup error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    createRollupTable,
+    applyRollupDelta,
+    applyRollupDeltas,
+    rebuildRollups,
+    verifyRollups
+};
\ No newline at end of file
@@ -4,49 +4,203 @@ import os
 # Create directory structure
 backend_structure = {
     'server.js': '''const express = require('express');
-const mysql = require('mysql2/promise');
-const bcrypt = require('bcrypt');
 const session = require('express-session');
 const MySQLStore = require('express-mysql-session')(session);
 const cors = require('cors');
 const path = require('path');
+const os = require('os');
+const cluster = require('cluster');
+const { once } = require('events');
+const zlib = require('zlib');
+const { pipeline, Transform } = require('stream');
+const { applyRollupDelta, applyRollupDeltas } = require('./rollups');
+const { LATEST_SCHEMA_VERSION, getSchemaVersion, migrate } = require('./migrations');
+const { readCsvTransactions, readOfxTransactions } = require('./importer');
+const { MemoryCacheBackend, ResponseCache } = require('./cache');
+const { HashPool, LoginThrottle, getRounds } = require('./auth');
+const { createCookieSession, CachedSessionStore } = require('./sessions');
+const { MetricsRegistry, requestMetrics, instrumentPool, monitorEventLoop } = require('./metrics');
+const { createPool, ReadRouter } = require('./pools');
 require('dotenv').config();
 
 const app = express();
 const PORT = process.env.PORT || 3000;
 
+// Session backend: 'mysql' (default) stores sessions in the sessions table,
+// 'cached' puts a short-TTL read-through cache in front of that table, and
+// 'cookie' keeps the whole session in an encrypted cookie with no store at all.
+const SESSION_STORE = process.env.SESSION_STORE || 'mysql';
+
+// Cluster mode: CLUSTER_WORKERS > 1 (or 'auto' for one per CPU) makes this
+// process a primary that initializes the database once and forks the workers
+const CLUSTER_WORKERS = process.env.CLUSTER_WORKERS === 'auto'
+    ? os.cpus().length
+    : Math.max(1, parseInt(process.env.CLUSTER_WORKERS, 10) || 1);
+const WORKER_SHUTDOWN_TIMEOUT_MS = 30000;
+
+// Reads that can tolerate replication lag (lists, search, export, sync,
+// dashboard and trends) use a separate read pool, so long aggregate reads
+// cannot take every connection from logins and writes. DB_READ_HOST points
+// it at a replica; otherwise both pools connect to DB_HOST.
+const DB_READ_HOST = process.env.DB_READ_HOST || '';
+
+// Each worker opens its own pools, so in cluster mode DB_CONNECTION_BUDGET
+// (keep it below MySQL's max_connections) is divided between the workers.
+// Without a replica the read pool's share comes out of the same budget.
+function getPoolSizes() {
+    if (CLUSTER_WORKERS === 1) {
+        return {
+            write: parseInt(process.env.DB_WRITE_CONNECTIONS, 10) || 10,
+            read: parseInt(process.env.DB_READ_CONNECTIONS, 10) || 10,
+            session: 10
+        };
+    }
+
+    const budget = parseInt(process.env.DB_CONNECTION_BUDGET, 10) || 100;
+    const perWorker = Math.max(3, Math.floor(budget / CLUSTER_WORKERS));
+    const sessionConnections = SESSION_STORE === 'cookie' ? 0 : Math.max(1, Math.floor(perWorker / 5));
+    const primary = perWorker - sessionConnections;
+    if (DB_READ_HOST) {
+        return { write: primary, read: primary, session: sessionConnections };
+    }
+    const write = Math.max(1, Math.floor(primary / 2));
+    return { write, read: primary - write, session: sessionConnections };
+}
+const poolSizes = getPoolSizes();
+
 // Database configuration
 const dbConfig = {
     host: process.env.DB_HOST || 'localhost',
     user: process.env.DB_USER || 'root',
     password: process.env.DB_PASSWORD || '',
     database: process.env.DB_NAME || 'finance_tracker',
-    connectionLimit: 10,
-    acquireTimeout: 60000,
+    // Keep DATE/TIMESTAMP values as the strings MySQL returns so they
+    // round-trip exactly through pagination cursors
+    dateStrings: true,
     timeout: 60000
 };
 
-// Create MySQL connection pool
-const pool = mysql.createPool(dbConfig);
+// Requests that wait longer than the queue timeout for a connection fail
+// rather than piling up behind a saturated pool
+const pool = createPool({ ...dbConfig, connectionLimit: poolSizes.write }, {
+    name: 'write',
+    queueTimeoutMs: parseInt(process.env.DB_WRITE_QUEUE_TIMEOUT_MS, 10) || 5000
+});
+const readPool = createPool({ ...dbConfig, host: DB_READ_HOST || dbConfig.host, connectionLimit: poolSizes.read }, {
+    name: 'read',
+    queueTimeoutMs: parseInt(process.env.DB_READ_QUEUE_TIMEOUT_MS, 10) || 10000
+});
 
-// Session store
-const sessionStore = new MySQLStore({
-    ...dbConfig,
-    clearExpired: true,
-    checkExpirationInterval: 900000,
-    expiration: 86400000,
-    createDatabaseTable: true,
-    schema: {
-        tableName: 'sessions',
-        columnNames: {
-            session_id: 'session_id',
-            expires: 'expires',
-            data: 'data'
-        }
+// With a replica, a client's reads go to the primary for READ_YOUR_WRITES_MS
+// after each of its writes, until the replica has caught up
+const readRouter = new ReadRouter(readPool, pool, {
+    windowMs: DB_READ_HOST ? parseInt(process.env.READ_YOUR_WRITES_MS, 10) || 5000 : 0
+});
+
+// Metrics served at /metrics: request and query latency, pool usage and
+// event loop lag. Queries slower than SLOW_QUERY_MS are also logged.
+const metrics = new MetricsRegistry();
+const slowQueryMs = parseInt(process.env.SLOW_QUERY_MS, 10) || 200;
+instrumentPool(pool, metrics, { name: 'write', slowQueryMs });
+instrumentPool(readPool, metrics, { name: 'read', slowQueryMs });
+monitorEventLoop(metrics);
+
+// Per-user cache for dashboard and budget reads, keyed by the user's data_version
+const responseCache = new ResponseCache(
+    new MemoryCacheBackend({ maxEntries: parseInt(process.env.CACHE_MAX_ENTRIES, 10) || 5000 }),
+    {
+        ttlMs: parseInt(process.env.CACHE_TTL_MS, 10) || 60000,
+        enabled: process.env.CACHE_ENABLED !== 'false'
     }
+);
+
+// Password hashing on dedicated worker threads, and failed-login throttling
+const BCRYPT_ROUNDS = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+const MIGRATE_ON_START = process.env.MIGRATE_ON_START !== 'false';
+const hashPool = new HashPool({
+    size: parseInt(process.env.HASH_WORKERS, 10) || 2,
+    maxQueue: parseInt(process.env.HASH_MAX_QUEUE, 10) || 100
+});
+const loginThrottle = new LoginThrottle(pool, {
+    maxPerUsername: parseInt(process.env.LOGIN_MAX_FAILURES_PER_USER, 10) || 5,
+    maxPerIp: parseInt(process.env.LOGIN_MAX_FAILURES_PER_IP, 10) || 50
+});
+
+// Hash timings include the wait for a free hashing thread
+const hashDuration = metrics.histogram('password_hash_duration_seconds',
+    'bcrypt hash and compare latency, including queueing', ['op']);
+for (const op of ['hash', 'compare']) {
+    const run = hashPool[op].bind(hashPool);
+    hashPool[op] = (...args) => hashDuration.time({ op }, () => run(...args));
+}
+metrics.gauge('password_hash_pool', 'Password hashing pool state', ['state'], () => {
+    const { workers, active, queued } = hashPool.stats();
+    return [[{ state: 'workers' }, workers], [{ state: 'active' }, active], [{ state: 'queued' }, queued]];
+});
+metrics.gauge('response_cache_lookups', 'Response cache lookups since start', ['result'], () => {
+    const { hits, misses } = responseCache.stats();
+    return [[{ result: 'hit' }, hits], [{ result: 'miss' }, misses]];
 });
 
+// Session configuration. SESSION_SECRET may list several comma-separated
+// secrets, newest first.
+const SESSION_MAX_AGE = 86400000; // 24 hours
+const sessionSecrets = (process.env.SESSION_SECRET || 'your-secret-key-change-this')
+    .split(',')
+    .map(secret => secret.trim())
+    .filter(Boolean);
+let sessionStore = null;
+
+function createSessionMiddleware() {
+    if (SESSION_STORE === 'cookie') {
+        return createCookieSession({
+            name: 'finance_tracker_session',
+            secrets: sessionSecrets,
+            maxAge: SESSION_MAX_AGE,
+            secure: process.env.NODE_ENV === 'production'
+        });
+    }
+
+    sessionStore = new MySQLStore({
+        ...dbConfig,
+        connectionLimit: poolSizes.session,
+        clearExpired: true,
+        checkExpirationInterval: 900000,
+        expiration: SESSION_MAX_AGE,
+        // The sessions table is created by a migration
+        createDatabaseTable: false,
+        schema: {
+            tableName: 'sessions',
+            columnNames: {
+                session_id: 'session_id',
+                expires: 'expires',
+                data: 'data'
+            }
+        }
+    });
+    if (SESSION_STORE === 'cached') {
+        sessionStore = new CachedSessionStore(sessionStore, {
+            ttlMs: parseInt(process.env.SESSION_CACHE_TTL_MS, 10) || 5000
+        });
+    }
+
+    return session({
+        key: 'finance_tracker_session',
+        secret: sessionSecrets,
+        store: sessionStore,
+        resave: false,
+        saveUninitialized: false,
+        cookie: {
+            maxAge: SESSION_MAX_AGE,
+            httpOnly: true,
+            secure: process.env.NODE_ENV === 'production'
+        }
+    });
+}
+
 // Middleware
+app.use(requestMetrics(metrics));
+
 app.use(cors({
     origin: process.env.FRONTEND_URL || 'http://localhost:3000',
     credentials: true
@@ -57,18 +211,8 @@ app.use(express.urlencoded({ extended: true }));
 app.use(express.static(path.join(__dirname, 'public')));
 
 // Session configuration
-app.use(session({
-    key: 'finance_tracker_session',
-    secret: process.env.SESSION_SECRET || 'your-secret-key-change-this',
-    store: sessionStore,
-    resave: false,
-    saveUninitialized: false,
-    cookie: {
-        maxAge: 86400000, // 24 hours
-        httpOnly: true,
-        secure: process.env.NODE_ENV === 'production'
-    }
-}));
+app.use(createSessionMiddleware());
+app.use(readRouter.markWrites());
 
 // Authentication middleware
 const authenticateUser = (req, res, next) => {
@@ -79,59 +223,295 @@ const authenticateUser = (req, res, next) => {
     }
 };
 
-// Initialize database tables
-async function initializeDatabase() {
+// Conditional GETs. users.data_version changes on every write a user makes, so
+// it identifies the state of all their data. The ETag also carries the app
+// version (response formats may change between releases) and today's date
+// (routes default to the current month).
+const APP_VERSION = require('./package.json').version;
+
+const conditionalRead = async (req, res, next) => {
     try {
-        // Create users table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                email VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        `);
-
-        // Create transactions table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                description VARCHAR(255),
-                transaction_type ENUM('income', 'expense') NOT NULL,
-                date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-
-        // Create budgets table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS budgets (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                month CHAR(7) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_user_category_month (user_id, category, month),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-
-        // Create default admin user if not exists
-        const hashedPassword = await bcrypt.hash('password123', 10);
-        await pool.execute(`
-            INSERT IGNORE INTO users (username, password, email) 
-            VALUES (?, ?, ?)
-        `, ['admin', hashedPassword, 'admin@example.com']);
+        const [[user]] = await readRouter.poolFor(req).execute(
+            '/* data_version */ SELECT data_version FROM users WHERE id = ?',
+            [req.session.userId]
+        );
+        const today = new Date().toISOString().slice(0, 10);
+        // The same version keys the route's response cache entries
+        req.dataVersion = user ? user.data_version : 0;
+        res.set('ETag', `"${APP_VERSION}-${req.session.userId}-${req.dataVersion}-${today}"`);
+        // Browsers must revalidate on every use, never serve a stored copy blindly
+        res.set('Cache-Control', 'private, no-cache');
 
-        console.log('Database initialized successfully');
+        // Answer before any of the route's own queries run
+        if (req.fresh) {
+            return res.status(304).end();
+        }
+        next();
     } catch (error) {
-        console.error('Database initialization error:', error);
+        next(error);
+    }
+};
+
+// Take the user's next data version. Every write transaction calls this
+// first: the row lock on users serializes a user's writes (and always being
+// taken first keeps lock order consistent), so versions commit in order and
+// rows stamped with them as change_version can be synced by version.
+async function nextDataVersion(connection, userId) {
+    const [result] = await connection.execute(
+        'UPDATE users SET data_version = LAST_INSERT_ID(data_version + 1) WHERE id = ?',
+        [userId]
+    );
+    return result.insertId;
+}
+
+const DATE_PATTERN = /^\\d{4}-\\d{2}-\\d{2}$/;
+// What DECIMAL(10,2) holds without rounding or overflowing
+const AMOUNT_PATTERN = /^\\d{1,8}(\\.\\d{1,2})?$/;
+const MONTH_PATTERN = /^\\d{4}-\\d{2}$/;
+const TRANSACTION_TYPES = ['income', 'expense'];
+const DEFAULT_PAGE_SIZE = 50;
+const MAX_PAGE_SIZE = 200;
+const IMPORT_BATCH_SIZE = 1000;
+const MAX_IMPORT_ERRORS = 100; // row errors listed per response line
+const MAX_BATCH_OPERATIONS = 1000;
+const EXPORT_COLUMNS = ['id', 'date', 'transaction_type', 'category', 'amount', 'description', 'created_at'];
+const DEFAULT_SEARCH_LIMIT = 10;
+const MAX_SEARCH_LIMIT = 50;
+const MAX_SEARCH_OFFSET = 1000;
+const MAX_SEARCH_TERMS = 8;
+// Shorter prefixes are not sent to the FULLTEXT index (innodb_ft_min_token_size
+// defaults to 3), because they expand to most of its vocabulary
+const MIN_FULLTEXT_TERM_LENGTH = 3;
+const TREND_GRANULARITIES = { month: 10, week: 5 }; // maximum range in years
+const SYNC_PAGE_SIZE = 1000;
+const SYNC_TABLES = ['transactions', 'budgets'];
+const SYNC_ARCHIVE = 'transactions_archive'; // synced as part of `transactions`
+const TOMBSTONE_RETENTION_DAYS = parseInt(process.env.TOMBSTONE_RETENTION_DAYS, 10) || 30;
+const TOMBSTONE_PURGE_INTERVAL_MS = 60 * 60 * 1000;
+const TOMBSTONE_PURGE_BATCH_SIZE = 5000;
+const TOMBSTONE_PURGE_LOCK = 'finance_tracker_tombstone_purge';
+
+// Translate the list filters (type, category, from, to, min_amount, max_amount)
+// into WHERE clauses. Returns { error } when a filter value is invalid.
+function buildTransactionFilters(query, userId) {
+    const clauses = ['user_id = ?', 'deleted_at IS NULL'];
+    const params = [userId];
+    const { type, category, from, to, min_amount, max_amount } = query;
+
+    if (type) {
+        if (!TRANSACTION_TYPES.includes(type)) {
+            return { error: 'type must be income or expense' };
+        }
+        clauses.push('transaction_type = ?');
+        params.push(type);
+    }
+    if (category) {
+        clauses.push('category = ?');
+        params.push(category);
+    }
+    for (const [value, clause, name] of [[from, 'date >= ?', 'from'], [to, 'date <= ?', 'to']]) {
+        if (value) {
+            if (!DATE_PATTERN.test(value)) {
+                return { error: `${name} must be a YYYY-MM-DD date` };
+            }
+            clauses.push(clause);
+            params.push(value);
+        }
+    }
+    for (const [value, clause, name] of [[min_amount, 'amount >= ?', 'min_amount'], [max_amount, 'amount <= ?', 'max_amount']]) {
+        if (value !== undefined && value !== '') {
+            if (!Number.isFinite(Number(value))) {
+                return { error: `${name} must be a number` };
+            }
+            clauses.push(clause);
+            params.push(String(Number(value)));
+        }
+    }
+
+    return { clauses, params };
+}
+
+// Tables a read starting at `from` (or unbounded, without it) has to cover.
+// Closed years may have been moved to transactions_archive (see archive.js);
+// it is only queried when this user has archived years and the range is open
+// or reaches back into one of them.
+async function transactionTables(db, userId, from) {
+    const [[archived]] = await db.execute(
+        '/* archived_through */ SELECT MAX(year) AS year FROM transaction_archive_years WHERE user_id = ?',
+        [userId]
+    );
+    return archived.year !== null && (!from || Number(from.slice(0, 4)) <= archived.year)
+        ? ['transactions', 'transactions_archive']
+        : ['transactions'];
+}
+
+// Run `select(table)` over each table and merge the results with UNION ALL.
+// `tail` (ORDER BY / LIMIT) applies inside every branch, so each can stop
+// early, and again to the merged rows.
+function acrossTables(tables, select, params, tail = '') {
+    if (tables.length === 1) {
+        return { sql: `${select(tables[0])} ${tail}`, params };
+    }
+    return {
+        sql: `${tables.map(table => `(${select(table)} ${tail})`).join(' UNION ALL ')} ${tail}`,
+        params: tables.flatMap(() => params)
+    };
+}
+
+// Amounts are stored as DECIMAL(10,2) and summed into the rollup in cents, so
+// anything MySQL would round or reject must be refused before the write
+function isValidAmount(amount) {
+    return AMOUNT_PATTERN.test(String(amount)) && Number(amount) > 0;
+}
+
+// Shared validation for the transaction write routes. Returns an error message or null.
+function validateTransaction({ amount, category, description, transaction_type, date }) {
+    if (!amount || !category || !transaction_type || !date) {
+        return 'Missing required fields';
+    }
+    if (!isValidAmount(amount)) {
+        return 'amount must be a positive number below 100000000 with at most 2 decimals';
+    }
+    if (!TRANSACTION_TYPES.includes(transaction_type)) {
+        return 'transaction_type must be income or expense';
+    }
+    if (!DATE_PATTERN.test(date)) {
+        return 'date must be a YYYY-MM-DD date';
+    }
+    if (String(category).length > 50 || String(description || '').length > 255) {
+        return 'category or description is too long';
+    }
+    return null;
+}
+
+// Build a write route's response from the values just written, formatted the
+// way mysql2 returns them, instead of reading the row back
+function transactionResponse(row, { amount, category, description, transaction_type, date }) {
+    return {
+        ...row,
+        amount: Number(amount).toFixed(2),
+        category,
+        description: description || '',
+        transaction_type,
+        date
+    };
+}
+
+// Run `work` with a pooled connection inside a database transaction
+async function withTransaction(work) {
+    const connection = await pool.getConnection();
+    try {
+        await connection.beginTransaction();
+        const result = await work(connection);
+        await connection.commit();
+        return result;
+    } catch (error) {
+        await connection.rollback();
+        throw error;
+    } finally {
+        connection.release();
+    }
+}
+
+function toCsvLine(values) {
+    return values.map(value => {
+        const text = value === null || value === undefined ? '' : String(value);
+        return /[",\\r\\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+    }).join(',') + '\\n';
+}
+
+// Pagination cursors are the (date, created_at, id) of the last row of a page
+function encodeCursor(row) {
+    return Buffer.from(JSON.stringify([row.date, row.created_at, row.id])).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+    try {
+        const values = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+        if (Array.isArray(values) && values.length === 3 && DATE_PATTERN.test(values[0]) &&
+            typeof values[1] === 'string' && Number.isInteger(values[2])) {
+            return values;
+        }
+    } catch (error) {
+        // Fall through to the invalid cursor result
+    }
+    return null;
+}
+
+// Sync cursors hold, per table, the (change_version, id) of the last row sent,
+// plus when the cursor was issued so ones older than the tombstone retention
+// can be refused
+function encodeSyncCursor(positions, issuedAt) {
+    return Buffer.from(JSON.stringify({ ...positions, at: issuedAt })).toString('base64url');
+}
+
+function decodeSyncCursor(cursor) {
+    try {
+        const value = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+        const isPosition = position => Array.isArray(position) && position.length === 2 &&
+            position.every(Number.isInteger);
+        if (value && SYNC_TABLES.every(table => isPosition(value[table])) && Number.isInteger(value.at)) {
+            // Cursors issued before archived rows were synced start that stream over
+            if (!isPosition(value[SYNC_ARCHIVE])) {
+                value[SYNC_ARCHIVE] = [0, 0];
+            }
+            return value;
+        }
+    } catch (error) {
+        // Fall through to the invalid cursor result
+    }
+    return null;
+}
+
+// Hard-delete tombstones past the retention period, in small batches so no
+// single statement holds locks for long. Every worker (and every server)
+// schedules this; a named lock lets only one of them run it at a time, and
+// the others skip that round.
+async function purgeTombstones() {
+    const connection = await pool.getConnection();
+    try {
+        const [[lock]] = await connection.execute('SELECT GET_LOCK(?, 0) AS acquired', [TOMBSTONE_PURGE_LOCK]);
+        if (lock.acquired !== 1) {
+            return;
+        }
+        try {
+            for (const table of SYNC_TABLES) {
+                let purged;
+                do {
+                    [{ affectedRows: purged }] = await connection.execute(
+                        `DELETE FROM ${table} WHERE deleted_at < NOW() - INTERVAL ? DAY LIMIT ${TOMBSTONE_PURGE_BATCH_SIZE}`,
+                        [TOMBSTONE_RETENTION_DAYS]
+                    );
+                } while (purged === TOMBSTONE_PURGE_BATCH_SIZE);
+            }
+        } finally {
+            await connection.execute('SELECT RELEASE_LOCK(?)', [TOMBSTONE_PURGE_LOCK]);
+        }
+    } finally {
+        connection.release();
+    }
+}
+
+// Schema changes live in migrations.js. On an up-to-date database startup is a
+// single read of schema_migrations; pending migrations are applied here unless
+// MIGRATE_ON_START=false, in which case `npm run migrate` must be run first
+// (for example as a deploy step). Migrations that block writes are never
+// applied at startup, so those always need `npm run migrate`.
+async function initializeDatabase() {
+    const version = await getSchemaVersion(pool);
+    if (version >= LATEST_SCHEMA_VERSION) {
+        return;
+    }
+    if (!MIGRATE_ON_START) {
+        throw new Error(`Database schema is at version ${version}, expected ${LATEST_SCHEMA_VERSION}; run npm run migrate`);
+    }
+
+    const connection = await pool.getConnection();
+    try {
+        await migrate(connection, { hashPassword: password => hashPool.hash(password, BCRYPT_ROUNDS) });
+        console.log('Database initialized successfully');
+    } finally {
+        connection.release();
     }
 }
 
@@ -146,22 +526,40 @@ app.post('/api/auth/login', async (req, res) => {
             return res.status(400).json({ error: 'Username and password are required' });
         }
 
+        // Refuse throttled callers before looking up the user or hashing
+        const retryAfter = await loginThrottle.retryAfter(username, req.ip);
+        if (retryAfter > 0) {
+            res.set('Retry-After', String(Math.ceil(retryAfter / 1000)));
+            return res.status(429).json({ error: 'Too many failed login attempts' });
+        }
+
         const [users] = await pool.execute(
             'SELECT * FROM users WHERE username = ?',
             [username]
         );
 
         if (users.length === 0) {
+            await loginThrottle.recordFailure(username, req.ip);
             return res.status(401).json({ error: 'Invalid credentials' });
         }
 
         const user = users[0];
-        const isValidPassword = await bcrypt.compare(password, user.password);
+        const isValidPassword = await hashPool.compare(password, user.password);
 
         if (!isValidPassword) {
+            await loginThrottle.recordFailure(username, req.ip);
             return res.status(401).json({ error: 'Invalid credentials' });
         }
 
+        await loginThrottle.recordSuccess(username);
+
+        // Upgrade hashes made with a different cost factor while the plaintext is at hand
+        if (getRounds(user.password) !== BCRYPT_ROUNDS) {
+            hashPool.hash(password, BCRYPT_ROUNDS)
+                .then(hash => pool.execute('UPDATE users SET password = ? WHERE id = ?', [hash, user.id]))
+                .catch(error => console.error('Password rehash error:', error));
+        }
+
         req.session.userId = user.id;
         req.session.username = user.username;
 
@@ -174,6 +572,10 @@ app.post('/api/auth/login', async (req, res) => {
             }
         });
     } catch (error) {
+        if (error.code === 'HASH_QUEUE_FULL') {
+            res.set('Retry-After', '1');
+            return res.status(503).json({ error: 'Server busy, please retry' });
+        }
         console.error('Login error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
@@ -189,66 +591,533 @@ app.post('/api/auth/logout', (req, res) => {
 });
 
 // Transaction routes
-app.get('/api/transactions', authenticateUser, async (req, res) => {
+app.get('/api/transactions', authenticateUser, conditionalRead, async (req, res) => {
     try {
-        const [transactions] = await pool.execute(
-            'SELECT * FROM transactions WHERE user_id = ? ORDER BY date DESC, created_at DESC',
-            [req.session.userId]
-        );
+        const limit = req.query.limit === undefined ? DEFAULT_PAGE_SIZE : parseInt(req.query.limit, 10);
+        if (!Number.isInteger(limit) || limit < 1 || limit > MAX_PAGE_SIZE) {
+            return res.status(400).json({ error: `limit must be between 1 and ${MAX_PAGE_SIZE}` });
+        }
+
+        const filters = buildTransactionFilters(req.query, req.session.userId);
+        if (filters.error) {
+            return res.status(400).json({ error: filters.error });
+        }
+        const { clauses, params } = filters;
+
+        // Keyset pagination: continue strictly after the last row of the previous page
+        if (req.query.cursor) {
+            const cursor = decodeCursor(req.query.cursor);
+            if (!cursor) {
+                return res.status(400).json({ error: 'Invalid cursor' });
+            }
+            const [date, createdAt, id] = cursor;
+            clauses.push('(date < ? OR (date = ? AND (created_at < ? OR (created_at = ? AND id < ?))))');
+            params.push(date, date, createdAt, createdAt, id);
+        }
 
-        res.json(transactions);
+        // Fetch one extra row to learn whether another page exists
+        const db = readRouter.poolFor(req);
+        const tables = await transactionTables(db, req.session.userId, req.query.from);
+        // Archived rows are flagged so clients can offer them read-only
+        const query = acrossTables(tables,
+            table => `SELECT *, ${table === 'transactions_archive' ? 1 : 0} AS archived FROM ${table} WHERE ${clauses.join(' AND ')}`,
+            params,
+            `ORDER BY date DESC, created_at DESC, id DESC LIMIT ${limit + 1}`);
+        const [rows] = await db.execute(query.sql, query.params);
+
+        const transactions = rows.slice(0, limit);
+        const nextCursor = rows.length > limit ? encodeCursor(transactions[transactions.length - 1]) : null;
+
+        res.json({ transactions, nextCursor });
     } catch (error) {
         console.error('Get transactions error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Export: rows are streamed from a dedicated connection through a formatter
+// (and gzip when the client accepts it) straight into the response, so memory
+// use does not depend on the size of the export. pipeline() propagates
+// backpressure from the socket back to the MySQL result stream.
+app.get('/api/transactions/export', authenticateUser, async (req, res) => {
+    const format = req.query.format || 'csv';
+    if (!['csv', 'ndjson'].includes(format)) {
+        return res.status(400).json({ error: 'format must be csv or ndjson' });
+    }
+
+    const filters = buildTransactionFilters(req.query, req.session.userId);
+    if (filters.error) {
+        return res.status(400).json({ error: filters.error });
+    }
+
+    let connection;
+    let query;
+    try {
+        const db = readRouter.poolFor(req);
+        const tables = await transactionTables(db, req.session.userId, req.query.from);
+        query = acrossTables(tables,
+            table => `SELECT ${EXPORT_COLUMNS.join(', ')} FROM ${table} WHERE ${filters.clauses.join(' AND ')}`,
+            filters.params,
+            'ORDER BY date DESC, created_at DESC, id DESC');
+        connection = await db.getConnection();
+    } catch (error) {
+        console.error('Export transactions error:', error);
+        return res.status(500).json({ error: 'Internal server error' });
+    }
+
+    const gzip = req.acceptsEncodings('gzip') === 'gzip';
+    res.set({
+        'Content-Type': format === 'csv' ? 'text/csv; charset=utf-8' : 'application/x-ndjson',
+        'Content-Disposition': `attachment; filename="transactions.${format}"`
+    });
+    if (gzip) {
+        res.set('Content-Encoding', 'gzip');
+    }
+
+    const rows = connection.connection.query(query.sql, query.params).stream({ highWaterMark: 500 });
+
+    let headerWritten = false;
+    const formatter = new Transform({
+        writableObjectMode: true,
+        transform(row, encoding, callback) {
+            if (format === 'ndjson') {
+                return callback(null, JSON.stringify(row) + '\\n');
+            }
+            const line = toCsvLine(EXPORT_COLUMNS.map(column => row[column]));
+            if (!headerWritten) {
+                headerWritten = true;
+                return callback(null, toCsvLine(EXPORT_COLUMNS) + line);
+            }
+            callback(null, line);
+        },
+        flush(callback) {
+            // An empty CSV export still gets its header row
+            callback(null, format === 'csv' && !headerWritten ? toCsvLine(EXPORT_COLUMNS) : undefined);
+        }
+    });
+
+    const stages = gzip ? [rows, formatter, zlib.createGzip(), res] : [rows, formatter, res];
+    pipeline(...stages, (error) => {
+        if (error) {
+            // The result set may not have been fully read, so the connection cannot be reused
+            console.error('Export transactions error:', error);
+            connection.destroy();
+        } else {
+            connection.release();
+        }
+    });
+});
+
+// Ranked search over descriptions and categories. Every word of `q` must
+// match as a prefix ("ama" finds "Amazon"). The FULLTEXT index is not scoped
+// per user: boolean mode reads each `+` term's posting list across all users
+// (a `term*` prefix first expands to every matching word) and intersects them,
+// with the required usr<id> token only removing other users' rows. So only
+// words of at least MIN_FULLTEXT_TERM_LENGTH go to MATCH. Shorter ones, typed
+// early in a typeahead, are matched as word prefixes with LIKE on rows the
+// other terms already narrowed down. A query with no long word skips the
+// FULLTEXT index altogether and walks this user's live rows by date, newest
+// first, with relevance 0. Accepts the list's type, category, from and to
+// filters; pages with an opaque offset cursor. Only the hot table is searched:
+// transactions_archive has no FULLTEXT index, so archived years never match.
+app.get('/api/transactions/search', authenticateUser, conditionalRead, async (req, res) => {
+    try {
+        const terms = (String(req.query.q || '').toLowerCase().match(/[\\p{L}\\p{N}]+/gu) || [])
+            .slice(0, MAX_SEARCH_TERMS);
+        if (terms.length === 0) {
+            return res.status(400).json({ error: 'q must contain at least one word' });
+        }
+        const limit = req.query.limit === undefined ? DEFAULT_SEARCH_LIMIT : parseInt(req.query.limit, 10);
+        if (!Number.isInteger(limit) || limit < 1 || limit > MAX_SEARCH_LIMIT) {
+            return res.status(400).json({ error: `limit must be between 1 and ${MAX_SEARCH_LIMIT}` });
+        }
+        const offset = req.query.cursor
+            ? parseInt(Buffer.from(String(req.query.cursor), 'base64url').toString('utf8'), 10)
+            : 0;
+        if (!Number.isInteger(offset) || offset < 0 || offset > MAX_SEARCH_OFFSET) {
+            return res.status(400).json({ error: 'Invalid cursor' });
+        }
+
+        const filters = buildTransactionFilters(req.query, req.session.userId);
+        if (filters.error) {
+            return res.status(400).json({ error: filters.error });
+        }
+        const longTerms = terms.filter(term => term.length >= MIN_FULLTEXT_TERM_LENGTH);
+        // Terms are letters and digits only, so they need no LIKE escaping
+        const shortTerms = terms.filter(term => term.length < MIN_FULLTEXT_TERM_LENGTH);
+        const clauses = [...filters.clauses, ...shortTerms.map(() => "search_text LIKE CONCAT('% ', ?, '%')")];
+        const params = [...filters.params, ...shortTerms];
+
+        let rows;
+        if (longTerms.length > 0) {
+            const match = [`+usr${req.session.userId}`, ...longTerms.map(term => `+${term}*`)].join(' ');
+            [rows] = await readRouter.poolFor(req).execute(`
+                /* transaction_search */
+                SELECT *, MATCH(search_text) AGAINST (? IN BOOLEAN MODE) AS relevance
+                FROM transactions
+                WHERE MATCH(search_text) AGAINST (? IN BOOLEAN MODE) AND ${clauses.join(' AND ')}
+                ORDER BY relevance DESC, date DESC, id DESC
+                LIMIT ${limit + 1} OFFSET ${offset}
+            `, [match, match, ...params]);
+        } else {
+            [rows] = await readRouter.poolFor(req).execute(`
+                /* transaction_search_prefix */
+                SELECT *, 0 AS relevance
+                FROM transactions
+                WHERE ${clauses.join(' AND ')}
+                ORDER BY date DESC, id DESC
+                LIMIT ${limit + 1} OFFSET ${offset}
+            `, params);
+        }
+
+        const transactions = rows.slice(0, limit);
+        const nextOffset = offset + limit;
+        const nextCursor = rows.length > limit && nextOffset <= MAX_SEARCH_OFFSET
+            ? Buffer.from(String(nextOffset)).toString('base64url')
+            : null;
+
+        res.json({ transactions, nextCursor });
+    } catch (error) {
+        console.error('Search transactions error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 app.post('/api/transactions', authenticateUser, async (req, res) => {
     try {
         const { amount, category, description, transaction_type, date } = req.body;
 
-        if (!amount || !category || !transaction_type || !date) {
-            return res.status(400).json({ error: 'Missing required fields' });
+        const validationError = validateTransaction(req.body);
+        if (validationError) {
+            return res.status(400).json({ error: validationError });
         }
 
-        const [result] = await pool.execute(`
-            INSERT INTO transactions (user_id, amount, category, description, transaction_type, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        `, [req.session.userId, amount, category, description || '', transaction_type, date]);
+        const newTransaction = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [result] = await connection.execute(`
+                INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            `, [req.session.userId, amount, category, description || '', transaction_type, date, version]);
 
-        const [newTransaction] = await pool.execute(
-            'SELECT * FROM transactions WHERE id = ?',
-            [result.insertId]
-        );
+            await applyRollupDelta(connection, req.session.userId, { amount, category, transaction_type, date }, 1);
+
+            // Only ?return=full pays for a read-back, to pick up DB-generated columns
+            if (req.query.return === 'full') {
+                const [rows] = await connection.execute('SELECT * FROM transactions WHERE id = ?', [result.insertId]);
+                return rows[0];
+            }
+            return transactionResponse({ id: result.insertId, user_id: req.session.userId }, req.body);
+        });
 
-        res.status(201).json(newTransaction[0]);
+        res.status(201).json(newTransaction);
     } catch (error) {
         console.error('Add transaction error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Bulk import: the request body is a raw CSV or OFX file, parsed as it streams in.
+// Valid rows are written IMPORT_BATCH_SIZE at a time, each batch in its own
+// database transaction. The response is NDJSON: one progress line per committed
+// batch (with the row errors seen since the previous line), then a summary line.
+app.post('/api/transactions/import', authenticateUser, async (req, res) => {
+    const userId = req.session.userId;
+    const format = req.query.format || (req.is('application/x-ofx', 'application/ofx') ? 'ofx' : 'csv');
+
+    if (!['csv', 'ofx'].includes(format)) {
+        return res.status(400).json({ error: 'format must be csv or ofx' });
+    }
+
+    req.setEncoding('utf8');
+    const records = format === 'ofx'
+        ? readOfxTransactions(req, { defaultCategory: req.query.category || 'Other' })
+        : readCsvTransactions(req);
+
+    const summary = { rows: 0, imported: 0, failed: 0 };
+    let errors = [];
+    let batch = [];
+
+    const writeLine = (line) => res.write(JSON.stringify(line) + '\\n');
+
+    const flush = async () => {
+        const rows = batch;
+        batch = [];
+        await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, userId);
+            await connection.query(`
+                INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                VALUES ?
+            `, [rows.map(t => [userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version])]);
+            await applyRollupDeltas(connection, userId, rows, 1);
+        });
+        summary.imported += rows.length;
+        writeLine({ progress: summary, errors });
+        errors = [];
+    };
+
+    res.status(200).type('application/x-ndjson');
+
+    try {
+        for await (const { row, transaction } of records) {
+            summary.rows++;
+            const validationError = validateTransaction(transaction);
+            if (validationError) {
+                summary.failed++;
+                // A file of nothing but bad rows never flushes, so the list is capped
+                if (errors.length < MAX_IMPORT_ERRORS) {
+                    errors.push({ row, error: validationError });
+                }
+                continue;
+            }
+
+            batch.push(transaction);
+            if (batch.length >= IMPORT_BATCH_SIZE) {
+                await flush();
+            }
+        }
+        if (batch.length > 0) {
+            await flush();
+        }
+
+        writeLine({ done: true, ...summary, errors });
+    } catch (error) {
+        console.error('Import transactions error:', error);
+        writeLine({ done: false, error: 'Import aborted; earlier batches were committed', ...summary, errors });
+    }
+    res.end();
+});
+
+// Batch mutations: { operations: [{ op: 'create', data }, { op: 'update', id, data },
+// { op: 'delete', id }], atomic }. All operations run in one database transaction
+// using one multi-row statement per kind. With atomic (the default) any failing
+// item rolls back the whole batch; with atomic: false the failing items are
+// skipped and the rest are applied. Every item gets its own status in `results`.
+app.post('/api/transactions/batch', authenticateUser, async (req, res) => {
+    const userId = req.session.userId;
+    const { operations, atomic = true } = req.body;
+
+    if (!Array.isArray(operations) || operations.length === 0 || operations.length > MAX_BATCH_OPERATIONS) {
+        return res.status(400).json({ error: `operations must be an array of 1 to ${MAX_BATCH_OPERATIONS} items` });
+    }
+    if (typeof atomic !== 'boolean') {
+        return res.status(400).json({ error: 'atomic must be true or false' });
+    }
+
+    // Validate every item up front
+    const results = operations.map((operation, index) => ({ index, op: operation && operation.op }));
+    const creates = [];
+    const changes = [];
+    const targetIds = new Set();
+
+    operations.forEach((operation, index) => {
+        const result = results[index];
+        if (!operation || !['create', 'update', 'delete'].includes(operation.op)) {
+            Object.assign(result, { status: 400, error: 'op must be create, update or delete' });
+            return;
+        }
+        if (operation.op !== 'delete') {
+            const validationError = validateTransaction(operation.data || {});
+            if (validationError) {
+                Object.assign(result, { status: 400, error: validationError });
+                return;
+            }
+        }
+        if (operation.op === 'create') {
+            creates.push(index);
+            return;
+        }
+
+        const id = Number(operation.id);
+        if (!Number.isInteger(id) || id < 1) {
+            Object.assign(result, { status: 400, error: 'id must be a positive integer' });
+        } else if (targetIds.has(id)) {
+            Object.assign(result, { status: 400, error: 'id appears more than once in the batch' });
+        } else {
+            targetIds.add(id);
+            result.id = id;
+            changes.push(index);
+        }
+    });
+
+    const hasInvalid = () => results.some(result => result.status >= 400);
+    const rejectBatch = () => {
+        results.filter(result => !result.status).forEach(result => {
+            Object.assign(result, { status: 409, error: 'Not applied because another operation failed' });
+        });
+        res.status(400).json({ applied: false, results });
+    };
+    if (atomic && hasInvalid()) {
+        return rejectBatch();
+    }
+    // Every item failed validation: no transaction, and no data_version bump
+    if (creates.length === 0 && changes.length === 0) {
+        return res.status(400).json({ applied: false, results });
+    }
+
+    try {
+        await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, userId);
+
+            // Lock every row being updated or deleted; their old values leave the rollup
+            const existing = new Map();
+            if (changes.length > 0) {
+                const [rows] = await connection.query(
+                    'SELECT * FROM transactions WHERE user_id = ? AND id IN (?) AND deleted_at IS NULL FOR UPDATE',
+                    [userId, changes.map(index => results[index].id)]
+                );
+                rows.forEach(row => existing.set(row.id, row));
+            }
+
+            const updates = [];
+            const deletes = [];
+            changes.forEach(index => {
+                if (!existing.has(results[index].id)) {
+                    Object.assign(results[index], { status: 404, error: 'Transaction not found' });
+                } else if (operations[index].op === 'update') {
+                    updates.push(index);
+                } else {
+                    deletes.push(index);
+                }
+            });
+
+            if (atomic && hasInvalid()) {
+                throw Object.assign(new Error('Batch rejected'), { batchRejected: true });
+            }
+            // Nothing left to write (every update or delete target was missing):
+            // roll back so the data_version bump does not invalidate anything
+            if (creates.length === 0 && updates.length === 0 && deletes.length === 0) {
+                throw Object.assign(new Error('Nothing to apply'), { nothingApplied: true });
+            }
+
+            if (creates.length > 0) {
+                await connection.query(`
+                    INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                    VALUES ?
+                `, [creates.map(index => {
+                    const t = operations[index].data;
+                    return [userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version];
+                })]);
+
+                // Read the new ids back rather than assuming insertId + offset, which
+                // fails when auto_increment_increment > 1. Nothing else of this
+                // user's carries this version yet, and ids ascend in VALUES order.
+                const [inserted] = await connection.execute(
+                    'SELECT id FROM transactions WHERE user_id = ? AND change_version = ? ORDER BY id',
+                    [userId, version]
+                );
+                creates.forEach((index, offset) => {
+                    const id = inserted[offset].id;
+                    Object.assign(results[index], {
+                        status: 201,
+                        id,
+                        transaction: transactionResponse({ id, user_id: userId }, operations[index].data)
+                    });
+                });
+            }
+
+            if (updates.length > 0) {
+                // Every target row exists and is locked, so this upsert always takes the UPDATE path
+                await connection.query(`
+                    INSERT INTO transactions (id, user_id, amount, category, description, transaction_type, date, change_version)
+                    VALUES ?
+                    ON DUPLICATE KEY UPDATE
+                        amount = VALUES(amount),
+                        category = VALUES(category),
+                        description = VALUES(description),
+                        transaction_type = VALUES(transaction_type),
+                        date = VALUES(date),
+                        change_version = VALUES(change_version)
+                `, [updates.map(index => {
+                    const t = operations[index].data;
+                    return [results[index].id, userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version];
+                })]);
+
+                updates.forEach(index => {
+                    Object.assign(results[index], {
+                        status: 200,
+                        transaction: transactionResponse(existing.get(results[index].id), operations[index].data)
+                    });
+                });
+            }
+
+            if (deletes.length > 0) {
+                // Soft delete: the tombstones are what /api/sync reports
+                await connection.query(
+                    'UPDATE transactions SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE user_id = ? AND id IN (?)',
+                    [version, userId, deletes.map(index => results[index].id)]
+                );
+                deletes.forEach(index => { results[index].status = 200; });
+            }
+
+            const changedRows = [...updates, ...deletes].map(index => existing.get(results[index].id));
+            await applyRollupDeltas(connection, userId, changedRows, -1);
+            await applyRollupDeltas(connection, userId, [...creates, ...updates].map(index => operations[index].data), 1);
+        });
+
+        res.json({ applied: true, results });
+    } catch (error) {
+        if (error.batchRejected) {
+            return rejectBatch();
+        }
+        if (error.nothingApplied) {
+            return res.status(400).json({ applied: false, results });
+        }
+        console.error('Batch transactions error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Answer a write to a transaction the hot table does not have: 409 when it
+// was moved to the archive, which is read-only, otherwise 404
+async function sendMissingTransaction(res, userId, id) {
+    const [archived] = await pool.execute(
+        'SELECT 1 FROM transactions_archive WHERE id = ? AND user_id = ?',
+        [id, userId]
+    );
+    return archived.length > 0
+        ? res.status(409).json({ error: 'Archived transactions are read-only' })
+        : res.status(404).json({ error: 'Transaction not found' });
+}
+
 app.put('/api/transactions/:id', authenticateUser, async (req, res) => {
     try {
         const { id } = req.params;
         const { amount, category, description, transaction_type, date } = req.body;
 
-        const [result] = await pool.execute(`
-            UPDATE transactions 
-            SET amount = ?, category = ?, description = ?, transaction_type = ?, date = ?
-            WHERE id = ? AND user_id = ?
-        `, [amount, category, description || '', transaction_type, date, id, req.session.userId]);
-
-        if (result.affectedRows === 0) {
-            return res.status(404).json({ error: 'Transaction not found' });
+        const validationError = validateTransaction(req.body);
+        if (validationError) {
+            return res.status(400).json({ error: validationError });
         }
 
-        const [updatedTransaction] = await pool.execute(
-            'SELECT * FROM transactions WHERE id = ?',
-            [id]
-        );
+        const updatedTransaction = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
 
-        res.json(updatedTransaction[0]);
+            // Lock the current row so its old values can be taken out of the rollup;
+            // the same read supplies the columns the response needs
+            const [existing] = await connection.execute(
+                'SELECT * FROM transactions WHERE id = ? AND user_id = ? AND deleted_at IS NULL FOR UPDATE',
+                [id, req.session.userId]
+            );
+            if (existing.length === 0) {
+                return null;
+            }
+
+            await connection.execute(`
+                UPDATE transactions 
+                SET amount = ?, category = ?, description = ?, transaction_type = ?, date = ?, change_version = ?
+                WHERE id = ? AND user_id = ?
+            `, [amount, category, description || '', transaction_type, date, version, id, req.session.userId]);
+
+            await applyRollupDelta(connection, req.session.userId, existing[0], -1);
+            await applyRollupDelta(connection, req.session.userId, { amount, category, transaction_type, date }, 1);
+            return transactionResponse(existing[0], req.body);
+        });
+
+        if (!updatedTransaction) {
+            return sendMissingTransaction(res, req.session.userId, id);
+        }
+
+        res.json(updatedTransaction);
     } catch (error) {
         console.error('Update transaction error:', error);
         res.status(500).json({ error: 'Internal server error' });
@@ -259,13 +1128,28 @@ app.delete('/api/transactions/:id', authenticateUser, async (req, res) => {
     try {
         const { id } = req.params;
 
-        const [result] = await pool.execute(
-            'DELETE FROM transactions WHERE id = ? AND user_id = ?',
-            [id, req.session.userId]
-        );
+        const deleted = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [existing] = await connection.execute(
+                'SELECT amount, category, transaction_type, date FROM transactions WHERE id = ? AND user_id = ? AND deleted_at IS NULL FOR UPDATE',
+                [id, req.session.userId]
+            );
+            if (existing.length === 0) {
+                return false;
+            }
+
+            // Keep a tombstone so clients learn about the delete through /api/sync
+            await connection.execute(
+                'UPDATE transactions SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE id = ? AND user_id = ?',
+                [version, id, req.session.userId]
+            );
+
+            await applyRollupDelta(connection, req.session.userId, existing[0], -1);
+            return true;
+        });
 
-        if (result.affectedRows === 0) {
-            return res.status(404).json({ error: 'Transaction not found' });
+        if (!deleted) {
+            return sendMissingTransaction(res, req.session.userId, id);
         }
 
         res.json({ success: true });
@@ -276,16 +1160,20 @@ app.delete('/api/transactions/:id', authenticateUser, async (req, res) => {
 });
 
 // Budget routes
-app.get('/api/budgets', authenticateUser, async (req, res) => {
+app.get('/api/budgets', authenticateUser, conditionalRead, async (req, res) => {
     try {
         const { month } = req.query;
         const currentMonth = month || new Date().toISOString().slice(0, 7);
 
-        const [budgets] = await pool.execute(
-            'SELECT * FROM budgets WHERE user_id = ? AND month = ?',
-            [req.session.userId, currentMonth]
-        );
+        const { value: budgets, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `budgets:${currentMonth}`, async () => {
+            const [rows] = await readRouter.poolFor(req).execute(
+                'SELECT * FROM budgets WHERE user_id = ? AND month = ? AND deleted_at IS NULL',
+                [req.session.userId, currentMonth]
+            );
+            return rows;
+        });
 
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
         res.json(budgets);
     } catch (error) {
         console.error('Get budgets error:', error);
@@ -293,86 +1181,449 @@ app.get('/api/budgets', authenticateUser, async (req, res) => {
     }
 });
 
-app.post('/api/budgets', authenticateUser, async (req, res) => {
+// Budgets for a month with their actual spending. Each budget joins to its
+// rollup row by primary key, so nothing is aggregated per request.
+app.get('/api/budgets/overview', authenticateUser, conditionalRead, async (req, res) => {
     try {
-        const { category, amount, month } = req.body;
+        const month = req.query.month || new Date().toISOString().slice(0, 7);
+        if (!MONTH_PATTERN.test(month)) {
+            return res.status(400).json({ error: 'month must be YYYY-MM' });
+        }
+
+        const { value: overview, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `budget-overview:${month}`, async () => {
+            const [budgets] = await readRouter.poolFor(req).execute(`
+                /* budget_overview */
+                SELECT
+                    b.id,
+                    b.category,
+                    b.amount,
+                    COALESCE(t.total, 0) AS spent,
+                    b.amount - COALESCE(t.total, 0) AS remaining,
+                    ROUND(COALESCE(t.total, 0) / NULLIF(b.amount, 0) * 100, 1) AS percent_used
+                FROM budgets b
+                LEFT JOIN monthly_category_totals t
+                    ON t.user_id = b.user_id
+                    AND t.month = b.month
+                    AND t.transaction_type = 'expense'
+                    AND t.category = b.category
+                WHERE b.user_id = ? AND b.month = ? AND b.deleted_at IS NULL
+                ORDER BY b.category
+            `, [req.session.userId, month]);
+
+            // Sum in integer cents, formatted like the DECIMAL columns
+            const cents = value => Math.round(Number(value) * 100);
+            const budgeted = budgets.reduce((sum, budget) => sum + cents(budget.amount), 0);
+            const spent = budgets.reduce((sum, budget) => sum + cents(budget.spent), 0);
+
+            return {
+                month,
+                budgets,
+                totals: {
+                    budgeted: (budgeted / 100).toFixed(2),
+                    spent: (spent / 100).toFixed(2),
+                    remaining: ((budgeted - spent) / 100).toFixed(2)
+                }
+            };
+        });
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(overview);
+    } catch (error) {
+        console.error('Get budget overview error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+app.post('/api/budgets', authenticateUser, async (req, res) => {
+    try {
+        const { category, amount, month } = req.body;
         const budgetMonth = month || new Date().toISOString().slice(0, 7);
 
         if (!category || !amount) {
             return res.status(400).json({ error: 'Category and amount are required' });
         }
+        if (!isValidAmount(amount)) {
+            return res.status(400).json({ error: 'amount must be a positive number below 100000000 with at most 2 decimals' });
+        }
 
-        await pool.execute(`
-            INSERT INTO budgets (user_id, category, amount, month)
-            VALUES (?, ?, ?, ?)
-            ON DUPLICATE KEY UPDATE amount = VALUES(amount)
-        `, [req.session.userId, category, amount, budgetMonth]);
+        // LAST_INSERT_ID(id) makes insertId report the existing row on update;
+        // saving over a deleted budget brings it back
+        const result = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [upsert] = await connection.execute(`
+                INSERT INTO budgets (user_id, category, amount, month, change_version)
+                VALUES (?, ?, ?, ?, ?)
+                ON DUPLICATE KEY UPDATE
+                    amount = VALUES(amount),
+                    change_version = VALUES(change_version),
+                    deleted_at = NULL,
+                    id = LAST_INSERT_ID(id)
+            `, [req.session.userId, category, amount, budgetMonth, version]);
+            return upsert;
+        });
 
-        const [budgets] = await pool.execute(
-            'SELECT * FROM budgets WHERE user_id = ? AND month = ?',
-            [req.session.userId, budgetMonth]
-        );
+        // ?return=full keeps the old response: every budget for the month
+        if (req.query.return === 'full') {
+            const [budgets] = await pool.execute(
+                'SELECT * FROM budgets WHERE user_id = ? AND month = ? AND deleted_at IS NULL',
+                [req.session.userId, budgetMonth]
+            );
+            return res.json(budgets);
+        }
 
-        res.json(budgets);
+        res.json({
+            id: result.insertId,
+            user_id: req.session.userId,
+            category,
+            amount: Number(amount).toFixed(2),
+            month: budgetMonth
+        });
     } catch (error) {
         console.error('Save budget error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+app.delete('/api/budgets/:id', authenticateUser, async (req, res) => {
+    try {
+        const deleted = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [result] = await connection.execute(
+                'UPDATE budgets SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+                [version, req.params.id, req.session.userId]
+            );
+            return result.affectedRows > 0;
+        });
+
+        if (!deleted) {
+            return res.status(404).json({ error: 'Budget not found' });
+        }
+
+        res.json({ success: true });
+    } catch (error) {
+        console.error('Delete budget error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Delta sync for offline clients. Without a cursor the response starts a full
+// load; with one it returns every transaction and budget written since,
+// tombstones (rows with deleted_at set) included. Rows come in
+// (change_version, id) order, and because a user's writes take their versions
+// one at a time under the users row lock, a row that changes after a page was
+// read reappears with a higher version on a later page: following nextCursor
+// until hasMore is false never misses a change. A cursor older than
+// TOMBSTONE_RETENTION_DAYS might have missed purged deletes, so the client is
+// told to reset and reload instead.
+app.get('/api/sync', authenticateUser, async (req, res) => {
+    try {
+        const issuedAt = Date.now();
+        let cursor = null;
+        if (req.query.since) {
+            cursor = decodeSyncCursor(req.query.since);
+            if (!cursor) {
+                return res.status(400).json({ error: 'Invalid cursor' });
+            }
+            if (cursor.at < issuedAt - TOMBSTONE_RETENTION_DAYS * 86400000) {
+                cursor = null;
+            }
+        }
+
+        const db = readRouter.poolFor(req);
+        const response = { reset: cursor === null, hasMore: false };
+        const positions = {};
+        // Archived rows are read-only and reach the client as transactions.
+        // Archiving stamps each moved row with a new change_version, so it shows
+        // up in this stream even for clients that synced it from the hot table.
+        for (const table of [...SYNC_TABLES, SYNC_ARCHIVE]) {
+            const [version, id] = cursor ? cursor[table] : [0, 0];
+            const [rows] = await db.execute(`
+                /* sync_${table} */
+                SELECT * FROM ${table}
+                WHERE user_id = ? AND (change_version > ? OR (change_version = ? AND id > ?))
+                ORDER BY change_version, id
+                LIMIT ${SYNC_PAGE_SIZE + 1}
+            `, [req.session.userId, version, version, id]);
+
+            const page = rows.slice(0, SYNC_PAGE_SIZE);
+            response.hasMore = response.hasMore || rows.length > SYNC_PAGE_SIZE;
+            const last = page[page.length - 1];
+            positions[table] = last ? [Number(last.change_version), last.id] : [version, id];
+            if (table === SYNC_ARCHIVE) {
+                page.forEach(row => { row.archived = 1; });
+                response.transactions.push(...page);
+            } else {
+                response[table] = page;
+            }
+        }
+
+        response.nextCursor = encodeSyncCursor(positions, issuedAt);
+        res.set('Cache-Control', 'no-store');
+        res.json(response);
+    } catch (error) {
+        console.error('Sync error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 // Dashboard statistics
-app.get('/api/dashboard/stats', authenticateUser, async (req, res) => {
+async function getDashboardStats(db, userId, month) {
+    // Monthly totals per type and category come straight from the rollup
+    const [monthlyStats] = await db.execute(`
+        /* dashboard_month_totals */
+        SELECT 
+            transaction_type,
+            category,
+            total
+        FROM monthly_category_totals 
+        WHERE user_id = ? AND month = ? AND transaction_count > 0
+    `, [userId, month]);
+
+    // Get current balance from at most a few hundred rollup rows
+    const [balanceResult] = await db.execute(`
+        /* dashboard_balance */
+        SELECT 
+            COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN total ELSE -total END), 0) as balance
+        FROM monthly_category_totals 
+        WHERE user_id = ?
+    `, [userId]);
+
+    let income = 0;
+    let expenses = 0;
+    const categoryStats = [];
+    monthlyStats.forEach(stat => {
+        if (stat.transaction_type === 'income') {
+            income += parseFloat(stat.total);
+        } else {
+            expenses += parseFloat(stat.total);
+            categoryStats.push(stat);
+        }
+    });
+    const balance = balanceResult[0]?.balance || 0;
+
+    return {
+        income: Math.round(income * 100) / 100,
+        expenses: Math.round(expenses * 100) / 100,
+        balance: parseFloat(balance),
+        categoryBreakdown: categoryStats.map(stat => ({
+            category: stat.category,
+            amount: parseFloat(stat.total)
+        }))
+    };
+}
+
+app.get('/api/dashboard/stats', authenticateUser, conditionalRead, async (req, res) => {
     try {
         const currentMonth = new Date().toISOString().slice(0, 7);
 
-        // Get monthly income and expenses
-        const [monthlyStats] = await pool.execute(`
-            SELECT 
+        const { value: stats, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `dashboard:${currentMonth}`,
+            () => getDashboardStats(readRouter.poolFor(req), req.session.userId, currentMonth));
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(stats);
+    } catch (error) {
+        console.error('Get dashboard stats error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Period labels from `from` to `to` inclusive: YYYY-MM months, or the
+// YYYY-MM-DD Monday starting each week
+function trendPeriods(granularity, from, to) {
+    const periods = [];
+    const cursor = new Date(`${from}T00:00:00Z`);
+    const end = new Date(`${to}T00:00:00Z`);
+    if (granularity === 'month') {
+        cursor.setUTCDate(1);
+        while (cursor <= end) {
+            periods.push(cursor.toISOString().slice(0, 7));
+            cursor.setUTCMonth(cursor.getUTCMonth() + 1);
+        }
+    } else {
+        cursor.setUTCDate(cursor.getUTCDate() - (cursor.getUTCDay() + 6) % 7);
+        while (cursor <= end) {
+            periods.push(cursor.toISOString().slice(0, 10));
+            cursor.setUTCDate(cursor.getUTCDate() + 7);
+        }
+    }
+    return periods;
+}
+
+// Income, expenses, net and running balance per month or week. Monthly series
+// come from the rollup; weekly ones aggregate raw rows through the covering
+// idx_transactions_user_live_date index. Cumulative figures are window sums
+// over the grouped periods, offset by the balance before the range.
+async function getTrends(db, userId, { granularity, from, to, category, byCategory }) {
+    const signed = "CASE WHEN transaction_type = 'income' THEN total ELSE -total END";
+    const fromMonth = from.slice(0, 7);
+    const categoryClause = category ? 'AND category = ?' : '';
+    const categoryParams = category ? [category] : [];
+
+    // Everything before the range: whole months from the rollup, plus for weeks
+    // the days of the starting month that precede `from`
+    const [[opening]] = await db.execute(`
+        /* trends_opening_balance */
+        SELECT COALESCE(SUM(${signed}), 0) AS balance
+        FROM monthly_category_totals
+        WHERE user_id = ? AND month < ? ${categoryClause}
+    `, [userId, fromMonth, ...categoryParams]);
+    let openingBalance = Number(opening.balance);
+
+    let source;
+    let params;
+    if (granularity === 'month') {
+        source = `
+            SELECT month AS period, transaction_type, category, total
+            FROM monthly_category_totals
+            WHERE user_id = ? AND month BETWEEN ? AND ? ${categoryClause}
+        `;
+        params = [userId, fromMonth, to.slice(0, 7), ...categoryParams];
+    } else {
+        // Raw rows of archived years live in transactions_archive
+        const tables = await transactionTables(db, userId, `${fromMonth}-01`);
+        const days = acrossTables(tables, table => `
+            SELECT CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END AS amount
+            FROM ${table}
+            WHERE user_id = ? AND deleted_at IS NULL AND date >= ? AND date < ? ${categoryClause}
+        `, [userId, `${fromMonth}-01`, from, ...categoryParams]);
+        const [[partial]] = await db.execute(`
+            /* trends_opening_days */
+            SELECT COALESCE(SUM(amount), 0) AS balance FROM (${days.sql}) AS days
+        `, days.params);
+        openingBalance += Number(partial.balance);
+
+        ({ sql: source, params } = acrossTables(tables, table => `
+            SELECT
+                DATE_FORMAT(DATE_SUB(date, INTERVAL WEEKDAY(date) DAY), '%Y-%m-%d') AS period,
+                transaction_type, category, amount AS total
+            FROM ${table}
+            WHERE user_id = ? AND deleted_at IS NULL AND date BETWEEN ? AND ? ${categoryClause}
+        `, [userId, from, to, ...categoryParams]));
+    }
+
+    const [rows] = await db.execute(`
+        /* trends_${granularity} */
+        SELECT
+            period,
+            SUM(CASE WHEN transaction_type = 'income' THEN total ELSE 0 END) AS income,
+            SUM(CASE WHEN transaction_type = 'expense' THEN total ELSE 0 END) AS expenses,
+            SUM(SUM(${signed})) OVER (ORDER BY period) AS cumulative_net
+        FROM (${source}) AS entries
+        GROUP BY period
+        ORDER BY period
+    `, params);
+
+    // Periods without transactions carry the balance forward
+    const byPeriod = new Map(rows.map(row => [row.period, row]));
+    let cumulativeNet = 0;
+    const periods = trendPeriods(granularity, from, to).map(period => {
+        const row = byPeriod.get(period);
+        if (row) {
+            cumulativeNet = Number(row.cumulative_net);
+        }
+        const income = row ? Number(row.income) : 0;
+        const expenses = row ? Number(row.expenses) : 0;
+        return {
+            period,
+            income,
+            expenses,
+            net: Math.round((income - expenses) * 100) / 100,
+            balance: Math.round((openingBalance + cumulativeNet) * 100) / 100
+        };
+    });
+
+    const trends = {
+        granularity,
+        from,
+        to,
+        openingBalance: Math.round(openingBalance * 100) / 100,
+        periods
+    };
+
+    if (byCategory) {
+        const [categoryRows] = await db.execute(`
+            /* trends_${granularity}_categories */
+            SELECT
+                period,
                 transaction_type,
-                SUM(amount) as total
-            FROM transactions 
-            WHERE user_id = ? AND DATE_FORMAT(date, '%Y-%m') = ?
-            GROUP BY transaction_type
-        `, [req.session.userId, currentMonth]);
-
-        // Get category breakdown for expenses
-        const [categoryStats] = await pool.execute(`
-            SELECT 
                 category,
-                SUM(amount) as total
-            FROM transactions 
-            WHERE user_id = ? AND transaction_type = 'expense' AND DATE_FORMAT(date, '%Y-%m') = ?
-            GROUP BY category
-        `, [req.session.userId, currentMonth]);
-
-        // Get current balance
-        const [balanceResult] = await pool.execute(`
-            SELECT 
-                COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0) -
-                COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0) as balance
-            FROM transactions 
-            WHERE user_id = ?
-        `, [req.session.userId]);
-
-        const income = monthlyStats.find(stat => stat.transaction_type === 'income')?.total || 0;
-        const expenses = monthlyStats.find(stat => stat.transaction_type === 'expense')?.total || 0;
-        const balance = balanceResult[0]?.balance || 0;
+                SUM(total) AS total,
+                SUM(SUM(total)) OVER (PARTITION BY transaction_type, category ORDER BY period) AS cumulative
+            FROM (${source}) AS entries
+            GROUP BY period, transaction_type, category
+            HAVING SUM(total) <> 0
+            ORDER BY period, transaction_type, category
+        `, params);
+        trends.categories = categoryRows.map(row => ({
+            period: row.period,
+            transaction_type: row.transaction_type,
+            category: row.category,
+            total: Number(row.total),
+            cumulative: Number(row.cumulative)
+        }));
+    }
 
-        res.json({
-            income: parseFloat(income),
-            expenses: parseFloat(expenses),
-            balance: parseFloat(balance),
-            categoryBreakdown: categoryStats.map(stat => ({
-                category: stat.category,
-                amount: parseFloat(stat.total)
-            }))
-        });
+    return trends;
+}
+
+// Trend series over a date range. Query parameters: granularity (month or
+// week), from and to (YYYY-MM-DD; the default is the 12 months up to today),
+// category, and by=category for a per-category breakdown.
+app.get('/api/trends', authenticateUser, conditionalRead, async (req, res) => {
+    try {
+        const granularity = req.query.granularity || 'month';
+        if (!TREND_GRANULARITIES[granularity]) {
+            return res.status(400).json({ error: 'granularity must be month or week' });
+        }
+
+        const today = new Date();
+        const to = req.query.to || today.toISOString().slice(0, 10);
+        const defaultFrom = new Date(Date.UTC(today.getUTCFullYear(), today.getUTCMonth() - 11, 1));
+        const from = req.query.from || defaultFrom.toISOString().slice(0, 10);
+        if (!DATE_PATTERN.test(from) || !DATE_PATTERN.test(to)) {
+            return res.status(400).json({ error: 'from and to must be YYYY-MM-DD dates' });
+        }
+        if (from > to) {
+            return res.status(400).json({ error: 'from must not be after to' });
+        }
+        const maxYears = TREND_GRANULARITIES[granularity];
+        const limit = new Date(`${from}T00:00:00Z`);
+        limit.setUTCFullYear(limit.getUTCFullYear() + maxYears);
+        if (new Date(`${to}T00:00:00Z`) >= limit) {
+            return res.status(400).json({ error: `${granularity}ly trends cover at most ${maxYears} years` });
+        }
+
+        const options = {
+            granularity,
+            from,
+            to,
+            category: req.query.category || null,
+            byCategory: req.query.by === 'category'
+        };
+        const key = `trends:${JSON.stringify(options)}`;
+        const { value: trends, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, key,
+            () => getTrends(readRouter.poolFor(req), req.session.userId, options));
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(trends);
     } catch (error) {
-        console.error('Get dashboard stats error:', error);
+        console.error('Get trends error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Prometheus scrape endpoint. Set METRICS_TOKEN to require
+// `Authorization: Bearer <token>`; METRICS_ENABLED=false turns it off.
+app.get('/metrics', (req, res) => {
+    if (process.env.METRICS_ENABLED === 'false') {
+        return res.status(404).json({ error: 'Not found' });
+    }
+    if (process.env.METRICS_TOKEN && req.get('Authorization') !== `Bearer ${process.env.METRICS_TOKEN}`) {
+        return res.status(401).json({ error: 'Authentication required' });
+    }
+    res.type('text/plain; version=0.0.4').send(metrics.render());
+});
+
 // Serve frontend files
 app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'public', 'index.html'));
@@ -384,14 +1635,109 @@ app.use((err, req, res, next) => {
     res.status(500).json({ error: 'Something went wrong!' });
 });
 
+// Release every MySQL connection this process holds
+async function closeDatabaseConnections() {
+    await Promise.all([pool.end(), readPool.end()]);
+    if (sessionStore) {
+        await sessionStore.close();
+    }
+}
+
+// Stop a worker gracefully: it stops accepting connections, finishes in-flight
+// requests and exits; it is killed if that takes too long
+function retireWorker(worker) {
+    return new Promise((resolve) => {
+        const timer = setTimeout(() => worker.kill(), WORKER_SHUTDOWN_TIMEOUT_MS);
+        worker.once('exit', () => {
+            clearTimeout(timer);
+            resolve();
+        });
+        worker.disconnect();
+    });
+}
+
+function startCluster() {
+    console.log(`Primary ${process.pid} starting ${CLUSTER_WORKERS} workers ` +
+        `(${poolSizes.write} write + ${poolSizes.read} read + ${poolSizes.session} session connections each)`);
+
+    for (let i = 0; i < CLUSTER_WORKERS; i++) {
+        cluster.fork();
+    }
+
+    // Replace workers that crash; planned exits go through retireWorker
+    cluster.on('exit', (worker, code, signal) => {
+        if (!worker.exitedAfterDisconnect) {
+            console.error(`Worker ${worker.process.pid} died (${signal || code}), starting a replacement`);
+            cluster.fork();
+        }
+    });
+
+    // SIGHUP: rolling restart, one worker at a time. Each old worker is only
+    // retired once its replacement is listening, so capacity never drops to zero.
+    let restarting = false;
+    process.on('SIGHUP', async () => {
+        if (restarting) {
+            return;
+        }
+        restarting = true;
+        console.log('Rolling restart of workers');
+
+        for (const worker of Object.values(cluster.workers)) {
+            const replacement = cluster.fork();
+            const [event] = await Promise.race([
+                once(replacement, 'listening').then(() => ['listening']),
+                once(replacement, 'exit').then(() => ['exit'])
+            ]);
+            if (event === 'exit') {
+                console.error('Replacement worker failed to start, aborting rolling restart');
+                break;
+            }
+            await retireWorker(worker);
+        }
+        restarting = false;
+    });
+
+    process.on('SIGTERM', () => {
+        Object.values(cluster.workers).forEach(worker => retireWorker(worker));
+    });
+}
+
 // Start server
 async function startServer() {
     try {
-        await initializeDatabase();
-        app.listen(PORT, () => {
-            console.log(`Server running on port ${PORT}`);
+        // Workers skip initialization: the primary (or the single process) has done it
+        if (!cluster.isWorker) {
+            await initializeDatabase();
+        }
+
+        if (CLUSTER_WORKERS > 1 && !cluster.isWorker) {
+            await closeDatabaseConnections();
+            startCluster();
+            return;
+        }
+
+        const server = app.listen(PORT, () => {
+            console.log(`Server running on port ${PORT}${cluster.isWorker ? ` (worker ${process.pid})` : ''}`);
             console.log(`Frontend available at http://localhost:${PORT}`);
         });
+
+        const purgeTimer = setInterval(() => {
+            purgeTombstones().catch(error => console.error('Tombstone purge error:', error));
+            loginThrottle.prune().catch(error => console.error('Login throttle prune error:', error));
+        }, TOMBSTONE_PURGE_INTERVAL_MS);
+        purgeTimer.unref();
+
+        if (cluster.isWorker) {
+            // The primary disconnects a worker to retire it; once the listening
+            // socket is closed, drain in-flight requests and exit
+            cluster.worker.on('disconnect', () => {
+                server.close(() => {
+                    closeDatabaseConnections()
+                        .catch(error => console.error('Shutdown error:', error))
+                        .finally(() => process.exit(0));
+                });
+            });
+        }
     } catch (error) {
         console.error('Failed to start server:', error);
         process.exit(1);
@@ -408,7 +1754,14 @@ startServer();''',
   "scripts": {
     "start": "node server.js",
     "dev": "nodemon server.js",
-    "init-db": "node scripts/init-database.js"
+    "init-db": "node scripts/init-database.js",
+    "migrate": "node migrations.js up",
+    "migrate:status": "node migrations.js status",
+    "rollups:verify": "node rollups.js verify",
+    "rollups:rebuild": "node rollups.js rebuild",
+    "archive": "node archive.js run",
+    "archive:verify": "node archive.js verify",
+    "bench:sessions": "node scripts/bench-sessions.js"
   },
   "keywords": ["finance", "tracker", "nodejs", "mysql", "express"],
   "author": "Personal Finance Tracker",
@@ -435,12 +1788,56 @@ DB_HOST=localhost
 DB_USER=root
 DB_PASSWORD=your_password
 DB_NAME=finance_tracker
+# Apply pending schema migrations at startup; set to false to run `npm run migrate` separately
+MIGRATE_ON_START=true
 
 # Session Configuration
+# SESSION_SECRET accepts a comma-separated list, newest first, for rotation
 SESSION_SECRET=your-super-secret-session-key-change-this
+# mysql (sessions table), cached (read-through cache over mysql) or cookie (stateless encrypted cookie)
+SESSION_STORE=mysql
+SESSION_CACHE_TTL_MS=5000
+
+# Response cache for dashboard and budget reads
+CACHE_ENABLED=true
+CACHE_MAX_ENTRIES=5000
+CACHE_TTL_MS=60000
+
+# Deleted rows are kept this long so offline clients can sync the deletes
+TOMBSTONE_RETENTION_DAYS=30
+# Years kept in the transactions table (including the current one) by `npm run archive`
+ARCHIVE_HOT_YEARS=2
+
+# Password hashing and login throttling
+BCRYPT_ROUNDS=10
+HASH_WORKERS=2
+HASH_MAX_QUEUE=100
+# Failed logins per username and per IP in a 15-minute window, counted in MySQL
+# so the limits hold across CLUSTER_WORKERS and servers
+LOGIN_MAX_FAILURES_PER_USER=5
+LOGIN_MAX_FAILURES_PER_IP=50
+
+# Metrics at /metrics (Prometheus text format); METRICS_TOKEN requires a bearer token
+METRICS_ENABLED=true
+METRICS_TOKEN=
+# Log queries slower than this many milliseconds
+SLOW_QUERY_MS=200
 
 # Server Configuration
 PORT=3000
+# Worker processes (a number or auto); DB_CONNECTION_BUDGET is shared by all of them
+CLUSTER_WORKERS=1
+DB_CONNECTION_BUDGET=100
+# Connection pools: writes and logins use DB_HOST; reads use DB_READ_HOST when set (a replica)
+DB_READ_HOST=
+# Pool sizes for a single process (cluster mode splits DB_CONNECTION_BUDGET instead)
+DB_WRITE_CONNECTIONS=10
+DB_READ_CONNECTIONS=10
+# Fail a request after waiting this long for a free connection
+DB_WRITE_QUEUE_TIMEOUT_MS=5000
+DB_READ_QUEUE_TIMEOUT_MS=10000
+# With a replica, a client's reads go to the primary for this long after it writes
+READ_YOUR_WRITES_MS=5000
 NODE_ENV=development
 
 # Frontend URL (for CORS)
@@ -527,7 +1924,8 @@ A full-stack personal finance tracker built with Node.js, Express, and MySQL.
 
 ## Database Schema
 
-The application automatically creates the following tables:
+The schema is managed by versioned migrations in `migrations.js`, which
+create the following tables:
 
 ### Users Table
 ```sql
@@ -536,7 +1934,8 @@ CREATE TABLE users (
     username VARCHAR(50) UNIQUE NOT NULL,
     password VARCHAR(255) NOT NULL,
     email VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_version BIGINT UNSIGNED NOT NULL DEFAULT 0
 );
 ```
 
@@ -551,10 +1950,30 @@ CREATE TABLE transactions (
     transaction_type ENUM('income', 'expense') NOT NULL,
     date DATE NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
+    change_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    search_text VARCHAR(330) GENERATED ALWAYS AS
+        (CONCAT('usr', user_id, ' ', category, ' ', COALESCE(description, ''))) STORED INVISIBLE,
+    INDEX idx_transactions_user_date (user_id, date, transaction_type, category, amount),
+    INDEX idx_transactions_user_date_created (user_id, date, created_at),
+    INDEX idx_transactions_user_category_date (user_id, category, date, created_at),
+    INDEX idx_transactions_user_type_date (user_id, transaction_type, date, created_at),
+    INDEX idx_transactions_user_change (user_id, change_version),
+    INDEX idx_transactions_user_live_date (user_id, deleted_at, date, transaction_type, category, amount),
+    FULLTEXT INDEX ft_transactions_search (search_text),
+    INDEX idx_transactions_deleted (deleted_at),
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 ```
 
+`idx_transactions_user_date` covers per-month range scans
+(`date >= '2024-12-01' AND date < '2025-01-01'`). The other indexes serve the
+paginated transaction list and its type/category filters, which page with a
+`(date, created_at, id)` keyset cursor.
+Existing deployments get any missing index from migration 2, which adds it
+with `ALGORITHM=INPLACE, LOCK=NONE`.
+
 ### Budgets Table
 ```sql
 CREATE TABLE budgets (
@@ -564,11 +1983,131 @@ CREATE TABLE budgets (
     amount DECIMAL(10,2) NOT NULL,
     month CHAR(7) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
+    change_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
     UNIQUE KEY unique_user_category_month (user_id, category, month),
+    INDEX idx_budgets_user_change (user_id, change_version),
+    INDEX idx_budgets_deleted (deleted_at),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+```
+
+Deleting a transaction or budget sets `deleted_at` instead of removing the
+row, and every read filters on `deleted_at IS NULL`. These tombstones let
+offline clients learn about deletes through `/api/sync`; they are purged
+hourly once older than `TOMBSTONE_RETENTION_DAYS` (default 30). In cluster
+mode a MySQL named lock lets only one worker purge at a time.
+`change_version` is the user's `data_version` from the write that last
+touched the row.
+
+### Monthly Category Totals (rollup)
+```sql
+CREATE TABLE monthly_category_totals (
+    user_id INT NOT NULL,
+    month CHAR(7) NOT NULL,
+    transaction_type ENUM('income', 'expense') NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, transaction_type, category),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+```
+
+The dashboard reads only from this table. Transaction create/update/delete
+routes apply their delta to it in the same database transaction, and the
+table is backfilled from `transactions` by the migration that creates it. To
+check it against the raw data or recompute it:
+
+```bash
+npm run rollups:verify            # exits with status 2 if any row drifted
+npm run rollups:rebuild
+node rollups.js rebuild <userId>  # a single user
+```
+
+Both count archived transactions (below) as well as live ones.
+
+### Archive (closed years)
+```sql
+CREATE TABLE transactions_archive (
+    -- the same visible columns as transactions, with the hot table's id
+    INDEX idx_transactions_archive_user_date (user_id, date, created_at),
+    INDEX idx_transactions_archive_user_change (user_id, change_version),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE transaction_archive_years (
+    user_id INT NOT NULL,
+    year SMALLINT NOT NULL,
+    income DECIMAL(14,2) NOT NULL DEFAULT 0,
+    expenses DECIMAL(14,2) NOT NULL DEFAULT 0,
+    transaction_count INT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, year),
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 ```
 
+`npm run archive` moves live transactions dated in closed years out of
+`transactions`, keeping the current year and the `ARCHIVE_HOT_YEARS - 1`
+before it (default 2 in total). Run it from cron, for example once a month.
+Rows move in batches of 1000, each in its own database transaction that
+also adds them to their user's `transaction_archive_years` row. Only the rows
+being moved are locked. Tombstones stay behind for the hourly purge.
+
+```bash
+npm run archive                  # archive every year before the hot ones
+node archive.js run 2021         # archive 2021 and earlier
+npm run archive:verify           # check the yearly summaries against the archive
+```
+
+The dashboard balance and the monthly trends are unchanged by archiving,
+because `monthly_category_totals` keeps every archived month. The
+transaction list, export and weekly trends read `transactions_archive` when
+the user has archived years and `from` is missing or reaches back into one of
+them. `/api/sync` returns archived rows with the user's transactions. Archiving
+gives each moved row a new `change_version`, so synced clients receive it
+again. Search does not cover archived years, because the archive has no
+FULLTEXT index. Use the list or the export to look through them.
+Archived transactions are read-only. The list and `/api/sync` mark them with
+`archived: 1`, and the transactions page shows them without Edit and Delete
+buttons. Updating or deleting one returns 409. A transaction added later with a date
+in an archived year goes to the hot table, and the next run moves it.
+
+MySQL `RANGE` partitioning by year was not used, because InnoDB does not
+allow foreign keys on partitioned tables.
+
+### Migrations
+
+Each applied migration is recorded in `schema_migrations (version, name,
+applied_at)`. On startup the server reads `MAX(version)` from that table.
+That single read is all it does when the schema is current. Pending migrations
+are applied under a MySQL named lock, so concurrent starts cannot race.
+
+```bash
+npm run migrate:status   # current version and pending migrations
+npm run migrate          # apply pending migrations
+```
+
+For production, set `MIGRATE_ON_START=false` and run `npm run migrate` as a
+deploy step. A server then refuses to start against an older schema instead
+of running DDL on a busy database. A newer schema is accepted, so old workers
+keep running during a rolling deploy.
+
+Migrations that block writes while they run are marked `blocksWrites`. These
+are migration 3, which backfills the rollup from all transactions, and
+migration 9. They are never applied at startup, whatever `MIGRATE_ON_START`
+says. The server refuses to start until they have been applied with
+`npm run migrate` (or `npm run init-db` on a new database), which should be
+scheduled for a quiet period.
+
+To change the schema, append a migration to the `migrations` list with the
+next version number. Never edit one that has shipped. Add indexes with
+`addIndexOnline(connection, table, name, columns)`. It skips an index that
+already exists and builds a new one with `ALGORITHM=INPLACE, LOCK=NONE`, so
+the table stays writable.
+
 ## API Endpoints
 
 ### Authentication
@@ -576,18 +2115,206 @@ CREATE TABLE budgets (
 - `POST /api/auth/logout` - User logout
 
 ### Transactions
-- `GET /api/transactions` - Get all user transactions
-- `POST /api/transactions` - Add new transaction
+- `GET /api/transactions` - Get a page of user transactions, newest first
+  - Returns `{ transactions, nextCursor }`; pass `nextCursor` back as `cursor` to fetch the next page
+  - Query parameters: `limit` (1-200, default 50), `cursor`, `type`, `category`, `from`, `to` (YYYY-MM-DD), `min_amount`, `max_amount`
+  - Archived years are included unless `from` is later than all of them (see the archive notes); each row has `archived` (0 or 1)
+- `POST /api/transactions` - Add new transaction; responds with the written values and new `id` (add `?return=full` to also read back DB-generated columns such as `created_at`)
+- `POST /api/transactions/import` - Bulk import a CSV or OFX file (see below)
+- `GET /api/transactions/export` - Stream every matching transaction as CSV or NDJSON (see below)
+- `GET /api/transactions/search?q=...` - Ranked search over descriptions and categories (see below)
 - `PUT /api/transactions/:id` - Update transaction
-- `DELETE /api/transactions/:id` - Delete transaction
+- `POST /api/transactions/batch` - Create, update and delete many transactions in one request (see below)
+- `DELETE /api/transactions/:id` - Delete transaction (soft delete, see the schema notes)
+
+#### Search
+`GET /api/transactions/search?q=amazon` returns `{ transactions, nextCursor }`
+like the list. Results are ordered by relevance, then newest first, and each
+row has a `relevance` score. Every word in `q` must match as a prefix, so
+`q=ama` already finds "Amazon" while typing. `limit` (1-50, default 10) and
+the list's `type`, `category`, `from` and `to` filters apply. Pages follow
+`cursor` for up to 1000 results. Archived years are not searched.
+
+The search uses the FULLTEXT index on `search_text`, a generated column
+holding a `usr<id>` token, the category and the description. Every query
+requires the user's token, which keeps other users' rows out of the results.
+It does not limit what MySQL reads: in boolean mode each required term reads
+its whole posting list and the lists are intersected, so a word that is common
+across all users stays expensive as the table grows. A one- or two-letter
+prefix would expand to most of the index, so only words of three or more
+letters (the default `innodb_ft_min_token_size`) go to the index. Shorter
+words are matched as word prefixes on the rows the longer ones found. A query
+with only short words, such as the first keystrokes in the search box, skips
+the index and scans that user's live transactions newest first. It returns
+`relevance` 0. Archived years are not searchable: `transactions_archive` has
+no FULLTEXT index, so use the list or the export with `from`. Migration 9 creates the
+column and index. Unlike the other migrations it blocks writes to
+`transactions` while it runs, so it must be applied with `npm run migrate`,
+and it needs MySQL 8.0.23+ for `INVISIBLE`.
+The transactions page searches as you type.
+
+#### Bulk import
+
+Send the file itself as the request body. CSV files need a header row with
+`date`, `amount`, `category`, `description` and `type` (or `transaction_type`)
+columns. OFX files are detected from an `application/x-ofx` content type or
+`?format=ofx`; their rows get the category given by `?category=` (default
+`Other`).
+
+```bash
+curl -b cookies.txt -H 'Content-Type: text/csv' \\
+     --data-binary @history.csv http://localhost:3000/api/transactions/import
+```
+
+The upload is parsed as it streams in and every row is validated like
+`POST /api/transactions`. Valid rows are inserted 1000 at a time with
+multi-row `INSERT`s, each batch in its own database transaction. The response
+is newline-delimited JSON: a `progress` line after every committed batch,
+listing the row errors seen since the previous line (at most 100; `failed`
+counts them all), then a final line with `done`, the
+`rows`/`imported`/`failed` counts and any remaining errors. Rows whose amount
+does not fit `DECIMAL(10,2)` are reported as row errors like any other
+invalid value. A leading UTF-8 byte order mark in a CSV file is ignored.
+
+#### Export
+
+`GET /api/transactions/export?format=csv` (or `format=ndjson`) accepts the same
+`type`, `category`, `from`, `to`, `min_amount` and `max_amount` filters as the
+list endpoint. Rows are streamed from MySQL straight into the response with
+backpressure, so server memory stays flat however large the export is. The
+response is gzip-compressed when the client sends `Accept-Encoding: gzip`.
+
+#### Batch mutations
+
+```json
+{
+  "atomic": true,
+  "operations": [
+    { "op": "create", "data": { "amount": 12.5, "category": "Food", "transaction_type": "expense", "date": "2024-12-02" } },
+    { "op": "update", "id": 41, "data": { "amount": 80, "category": "Utilities", "transaction_type": "expense", "date": "2024-12-01" } },
+    { "op": "delete", "id": 42 }
+  ]
+}
+```
+
+Up to 1000 operations run in a single database transaction, with one
+multi-row statement per kind of operation. The response has `applied` and a
+`results` entry per operation, in request order, each with its own `status`.
+Statuses are 201/200 on success and 400/404 on failure. With `atomic: true`
+(the default), any failure rolls back the whole batch. Operations that were
+otherwise fine are then reported as 409. With `atomic: false`, failing
+operations are skipped and the rest are committed. `atomic` must be a JSON
+boolean. When no operation can be applied, the response is 400 with
+`applied: false` and nothing is written.
 
 ### Budgets
 - `GET /api/budgets` - Get user budgets for current/specified month
-- `POST /api/budgets` - Create or update budget
+- `GET /api/budgets/overview?month=YYYY-MM` - Each budget for the month with `spent`, `remaining` and `percent_used`, plus `totals`. Spending comes from the monthly rollup through a primary-key join, so the response costs the same however many transactions there are
+- `POST /api/budgets` - Create or update budget; responds with the saved budget (`?return=full` returns every budget for the month instead)
+- `DELETE /api/budgets/:id` - Delete budget
+
+### Sync
+`GET /api/sync?since=<cursor>` returns every transaction and budget written
+since the cursor, deletes included as rows with `deleted_at` set:
+
+```json
+{ "reset": false, "transactions": [...], "budgets": [...], "hasMore": false, "nextCursor": "..." }
+```
+
+Without `since`, or with a cursor older than `TOMBSTONE_RETENTION_DAYS`,
+`reset` is `true` and the pages that follow are a full load: the client
+should drop its copy first. Keep requesting with `nextCursor` until
+`hasMore` is `false`, then store the last `nextCursor` for next time. Rows
+are ordered by `(change_version, id)` and each user's writes take their
+versions one at a time, so a row changed mid-sync reappears on a later
+page rather than being missed.
+
+The frontend keeps transactions and budgets in IndexedDB. On login it draws
+the dashboard from that copy, then syncs and refreshes from the server. The
+copy is deleted on logout unless the user ticked "Keep my data on this
+device" at login, because anyone using the browser next could read it with
+the developer tools. A kept copy is still cleared when a different user signs
+in.
 
 ### Dashboard
 - `GET /api/dashboard/stats` - Get dashboard statistics
 
+The dashboard's trend chart reads `GET /api/trends?granularity=month` (below).
+
+### Trends
+`GET /api/trends` returns income, expenses, net and running balance per period:
+
+```json
+{
+  "granularity": "month", "from": "2024-01-01", "to": "2024-12-31", "openingBalance": 1520.4,
+  "periods": [{ "period": "2024-01", "income": 3200, "expenses": 2140.5, "net": 1059.5, "balance": 2579.9 }, ...],
+  "categories": [{ "period": "2024-01", "transaction_type": "expense", "category": "Food", "total": 412.3, "cumulative": 412.3 }, ...]
+}
+```
+
+- `granularity`: `month` (default, whole months, up to 10 years) or `week` (weeks start on Monday, up to 5 years)
+- `from`, `to`: YYYY-MM-DD; the default is the 12 months up to today
+- `category`: restrict every figure to one category
+- `by=category`: add the `categories` breakdown with per-category running totals
+
+Monthly series are read from `monthly_category_totals`, so a 10-year range
+touches at most a few thousand rollup rows. Weekly series aggregate
+transactions through the covering `idx_transactions_user_live_date` index.
+`balance` starts from the all-time balance before `from`, and the running
+sums use window functions, so MySQL 8.0 or later is required. Periods
+without transactions are included with zero totals.
+
+### Response Cache
+
+The dashboard, trend and budget reads are served from a per-user LRU cache
+(`cache.js`) and report `X-Cache: HIT` or `MISS`. Entries are keyed by the
+user's `data_version`, which the conditional-request check below has
+already read. Any transaction or budget write bumps it, so a read after a
+write never finds an older entry, whichever process served the write. Size
+and lifetime are set with `CACHE_MAX_ENTRIES` and `CACHE_TTL_MS`;
+`CACHE_ENABLED=false` turns it off. The in-process `MemoryCacheBackend` can
+be swapped for a shared store implementing `get` and `set`, so several Node
+processes can share entries.
+
+### Conditional requests
+Each user row has a `data_version` that every write increments, inside the
+write's own transaction.
+`GET /api/transactions`, `/api/budgets`, `/api/budgets/overview`,
+`/api/transactions/search`, `/api/dashboard/stats` and `/api/trends` return a strong `ETag` built from it, together with
+`Cache-Control: private, no-cache`. The ETag also includes the app version
+and the current date. When `If-None-Match` matches, the server answers `304
+Not Modified` after a single primary-key read and runs none of the route's
+queries. The frontend keeps the last body and ETag for each URL and sends
+them back as validators. Switching tabs without changes costs one small
+request per view.
+
+### Metrics
+`GET /metrics` serves Prometheus text format:
+
+- `http_request_duration_seconds{method,route,status}` - latency per route
+  pattern (e.g. `/api/transactions/:id`)
+- `http_response_serialize_seconds{route}` - time spent in `res.json()`
+- `db_query_duration_seconds{pool,query}`, `db_query_rows_total{pool,query}`
+  and `db_query_errors_total{pool,query}` - every `execute`/`query` on the
+  `read` and `write` pools and their connections. A query is named by a
+  leading `/* name */` comment, or else by its verb and first table
+  (`select transactions`)
+- `db_pool_queue_wait_seconds{pool}` - time each request waited for a
+  connection, including requests that hit the queue timeout
+- `db_pool_connections{pool,state}`, `db_pool_queued_requests{pool}` and
+  `db_pool_connection_limit{pool}` - MySQL pool usage
+- `password_hash_duration_seconds{op}` and `password_hash_pool{state}` -
+  bcrypt latency, including the wait for a hashing thread, and the hashing
+  pool's state
+- `response_cache_lookups{result}` - response cache hits and misses
+- `nodejs_eventloop_lag_seconds{quantile}` - event loop delay since the
+  previous scrape
+
+Queries slower than `SLOW_QUERY_MS` (default 200) are logged with their SQL.
+Set `METRICS_TOKEN` to require `Authorization: Bearer <token>`, or
+`METRICS_ENABLED=false` to disable the endpoint. In cluster mode each worker
+keeps its own metrics, so a scrape reports only the worker that answered it.
+
 ## Default Credentials
 
 The application creates a default admin user:
@@ -596,18 +2323,68 @@ The application creates a default admin user:
 
 ## Security Features
 
-- **Password Hashing**: Uses bcrypt with salt rounds
+- **Password Hashing**: Uses bcrypt with salt rounds, on dedicated worker threads (see below)
+- **Login Throttling**: Repeated failed logins per username and per IP are refused with `429` before any hashing work
 - **Session Management**: Secure session-based authentication
 - **SQL Injection Prevention**: Parameterized queries
 - **CORS Protection**: Configurable cross-origin resource sharing
 - **Input Validation**: Server-side validation for all inputs
 
+### Session backends
+
+`SESSION_STORE` selects how sessions are kept:
+
+- `mysql` (default) - `express-mysql-session`; every authenticated request reads the `sessions` table
+- `cached` - the same table behind an in-process read-through cache (`SESSION_CACHE_TTL_MS`, default 5s); `touch` writes are sent at most once a minute per session
+- `cookie` - no server-side state; the session is AES-256-GCM encrypted into the cookie itself
+
+`SESSION_SECRET` may hold several comma-separated secrets, newest first. New
+cookies use the first one and cookies made with an older one keep working (in
+`cookie` mode they are re-issued with the current secret), so secrets can be
+rotated without logging users out. `authenticateUser` works the same in every
+mode.
+
+Compare the modes against your own database with
+`npm run bench:sessions -- [requests] [concurrency] [path]`. It starts the
+server once per mode and reports requests/sec and p50/p99 latency for an
+authenticated `GET` (default `/api/budgets`).
+
+### Password hashing
+
+bcrypt runs on `HASH_WORKERS` dedicated worker threads (`auth.js`) instead of
+the shared libuv threadpool, so a burst of logins cannot stall file and crypto
+work for other routes. At most `HASH_MAX_QUEUE` hashes may wait; beyond that,
+logins get `503` with `Retry-After`. The queue depth and worker counts are
+available from `hashPool.stats()`. `BCRYPT_ROUNDS` sets the cost factor. A
+user whose stored hash uses a different cost is rehashed on their next
+successful login. The default admin user is only hashed and inserted when it
+does not exist yet.
+
+Failed logins are counted per username (`LOGIN_MAX_FAILURES_PER_USER`, default
+5) and per client IP (`LOGIN_MAX_FAILURES_PER_IP`, default 50) in 15-minute
+windows. The counters live in the `login_failures` table, so the limits hold
+across cluster workers and servers. Expired windows are deleted hourly.
+
 ## Development
 
 ### File Structure
 ```
 personal-finance-tracker/
 ├── server.js              # Main server file
+├── rollups.js             # Monthly rollup maintenance (verify/rebuild)
+├── archive.js             # Moves closed years to transactions_archive
+├── migrations.js          # Versioned schema migrations (schema_migrations)
+├── cache.js               # Per-user response cache
+├── importer.js            # Streaming CSV/OFX parsers for bulk import
+├── auth.js                # Password hashing worker pool and login throttling
+├── sessions.js            # Cookie and cached session backends
+├── metrics.js             # Prometheus metrics, query timing and slow-query log
+├── pools.js               # Read/write pools, queue timeouts and replica routing
+├── benchmark.py           # Load generator and latency report (Python)
+├── analytics.py           # NumPy aggregates and reports over transactions
+├── snapshot.py            # Columnar, memory-mapped transaction snapshots
+├── scripts/
+│   └── bench-sessions.js  # Session backend throughput benchmark
 ├── package.json           # Dependencies and scripts
 ├── .env.example          # Environment variables template
 ├── .env                  # Environment variables (create this)
@@ -618,9 +2395,110 @@ personal-finance-tracker/
     └── app.js            # Frontend JavaScript
 ```
 
+### Benchmarks
+
+`benchmark.py` (Python 3.8+, standard library only) measures the server
+against a synthetic dataset. Every user gets a monthly salary, rent and
+utility bill, and day-to-day expenses with log-normal amounts. Expenses are
+weighted by category and a little towards weekends.
+
+```bash
+# Bulk-load 100 users x 1000 transactions over 24 months (needs the mysql
+# client and local_infile enabled on the server); replaces any previous bench_user_* data
+python benchmark.py load --users 100 --transactions 1000 --months 24
+
+# Start `node server.js` on port 3100 and drive 32 concurrent clients for 60s
+python benchmark.py run --start-server --concurrency 32 --duration 60 \\
+    --output bench-results/baseline.json
+
+# After a change: run again and compare with the baseline
+python benchmark.py run --start-server --concurrency 32 --duration 60 \\
+    --baseline bench-results/baseline.json
+python benchmark.py compare bench-results/baseline.json bench-results/<run>.json
+```
+
+Each client logs in as a random benchmark user over its own keep-alive
+connection. It then picks actions by weight (`--mix`, default
+`login=2,list=30,dashboard=25,budgets=15,write=28`).
+
+- `list` may follow the cursor for a page or two.
+- `budgets` is mostly reads.
+- `write` creates, updates and deletes the client's own transactions. They
+  are removed again at the end, so the dataset stays stable between runs.
+
+Requests during `--warmup` are not recorded. The results JSON holds
+requests, errors, throughput and mean/p50/p95/p99/max latency per endpoint,
+plus the commit and settings of the run. Pass the server's environment
+(`SESSION_STORE`, `CLUSTER_WORKERS`, ...) to `run` and it is recorded too.
+
+### Analytics
+
+`analytics.py` (requires `pip install numpy`) computes reports across all
+users offline, without going through the API:
+
+```bash
+# Every user's live and archived transactions, streamed from the database in .env
+python analytics.py report --mysql --out reports
+
+# A single user's export from GET /api/transactions/export
+python analytics.py report --csv export.csv --user-id 7 --budgets budgets.csv
+
+# Vectorized path against a per-row Python loop, on synthetic data
+python analytics.py bench --rows 10000000
+```
+
+Transactions are read in chunks as integer columns: user, day ordinal,
+amount in cents, category code and income flag. Each chunk is folded into a
+(user, month, type, category) aggregate, so memory follows the number of
+groups, not rows. Export CSVs are parsed by NumPy's `loadtxt` straight into
+typed columns, a chunk per call, and NDJSON exports with one `json.loads` per
+chunk. The `--mysql` stream remains the fastest source. The reports are
+vectorized group-bys over that aggregate, written as CSV:
+
+- `user_monthly`: income, expenses and net per user and month
+- `cohorts`: retention and mean spending by first active month
+- `category_shares`: each category's share of a user's spending
+- `budget_adherence`: spending against every budget
+- `forecast`: next month's expenses from a linear fit over `--window` months
+
+All amounts are in cents. With `--mysql` the query returns only integers,
+so NumPy parses each 32 MB block of output in one call.
+
+### Snapshots
+
+`snapshot.py` (also NumPy) keeps a binary copy of the transactions table
+for reporting and backups, so jobs do not have to re-parse CSV or JSON:
+
+```bash
+python snapshot.py write snapshots/transactions      # full on first run, then appends
+python snapshot.py read snapshots/transactions --user 7 --from 2024-01-01 --to 2024-12-31
+python snapshot.py compact snapshots/transactions    # merge appended segments
+python snapshot.py write snapshots/transactions --full
+```
+
+A snapshot is a `manifest.json` (category dictionary, segment list and
+watermark) plus segments. A segment holds its rows sorted by user, date and
+id. It stores one fixed-width little-endian file per column and an
+`index.bin` with each user's first row and count. Columns are `user_id`,
+`date` (day ordinal), `amount` (cents), `category` and `type` (dictionary
+codes), `id` and `created_at`. Every file has a 32-byte header (magic,
+dtype, row count).
+
+`Snapshot(path).user(user_id, start, end)` memory-maps the columns. It
+returns NumPy views of that user's date range, found by binary search
+without copying. Rows spread over several segments are merged and copied.
+
+Each `write` appends the rows created after the stored `(created_at, id)`
+watermark as a new segment. Rows younger than `--settle-seconds` (default
+60) wait for the next run. Edits and deletes of rows already in the
+snapshot need a `--full` write. Rows are spooled to per-column files as they
+stream in, so a write holds only the sort keys and one column in memory. A
+category created during a write cannot be encoded, so the write stops and
+asks to be re-run instead of storing a wrong code.
+
 ### Adding New Features
 
-1. **Database Changes**: Modify the table creation queries in `server.js`
+1. **Database Changes**: Add a migration to `migrations.js`
 2. **API Endpoints**: Add new routes in the appropriate sections
 3. **Frontend**: Update the HTML, CSS, and JavaScript files in the `public` directory
 
@@ -629,7 +2507,59 @@ personal-finance-tracker/
 1. **Environment Variables**: Set `NODE_ENV=production`
 2. **Database**: Use a production MySQL instance
 3. **Security**: Use strong session secrets and HTTPS
-4. **Process Management**: Use PM2 or similar for process management
+4. **Process Management**: Use PM2 or similar for process management, or the built-in cluster mode below
+
+### Read and write pools
+
+Logins and writes use the write pool on `DB_HOST`. The list, search, export,
+sync, budget, dashboard and trend reads use a separate read pool, so long
+aggregate reads cannot take every connection from writes. Set `DB_READ_HOST`
+to send the read pool to a replica; it uses the same credentials and
+database name. A single process opens `DB_WRITE_CONNECTIONS` and
+`DB_READ_CONNECTIONS` (default 10 each).
+
+A request that waits longer than `DB_WRITE_QUEUE_TIMEOUT_MS` (default 5000)
+or `DB_READ_QUEUE_TIMEOUT_MS` (default 10000) for a connection fails instead
+of queueing indefinitely. `db_pool_queue_wait_seconds{pool}` shows how long
+requests wait.
+
+With a replica, each write marks the client with a short-lived cookie. For
+`READ_YOUR_WRITES_MS` (default 5000) after a write, that client's reads go
+to the primary, so it sees its own changes even if the replica lags. Set the
+window above the replica's usual lag. The process also remembers when each
+user last wrote, so the user's other browsers read from the primary during
+the window too. In cluster mode that record is per worker: another browser
+only sees the write if its requests reach the worker that handled it, or after
+the replica catches up. Response cache entries are keyed on the
+`data_version` read from the same pool as the response, so a lagging replica
+can never be cached under a newer version.
+
+### Cluster mode
+
+Set `CLUSTER_WORKERS` to a number of processes (or `auto` for one per CPU) to
+serve from several cores. The primary process creates the schema once, then
+forks the workers, which share the port. A worker that crashes is replaced
+automatically.
+
+Every worker has its own MySQL pools, so `DB_CONNECTION_BUDGET` (default 100)
+is the total number of connections for all workers together. It is split
+evenly between workers, with a fifth of each share for the session store (none
+in `cookie` mode). The rest is divided between the write and read pools, or
+given to each of them in full when the read pool uses a replica. Keep it
+below MySQL's `max_connections`.
+
+- `kill -HUP <primary pid>` restarts the workers one at a time, for deploys
+  without downtime. Each old worker is only stopped once its replacement is
+  listening.
+- `kill -TERM <primary pid>` stops all workers gracefully. In-flight requests
+  finish, and any worker still busy after 30 seconds is killed.
+
+Per-process state is not shared: the response cache, login throttle and
+`cached` session entries are per worker. The response cache stays correct
+anyway, because its entries are keyed by the user's `data_version` from the
+database. A write handled by one worker makes every worker's older entries
+unreachable. Each worker only warms its own copy, so a shared backend just
+saves memory and misses.
 
 ## Contributing
 
@@ -645,6 +2575,8 @@ MIT License - see LICENSE file for details
 ''',
 
     'scripts/init-database.js': '''const mysql = require('mysql2/promise');
+const bcrypt = require('bcrypt');
+const { migrate } = require('../migrations');
 require('dotenv').config();
 
 async function initializeDatabase() {
@@ -656,9 +2588,16 @@ async function initializeDatabase() {
         });
 
         // Create database if it doesn't exist
-        await connection.execute(`CREATE DATABASE IF NOT EXISTS ${process.env.DB_NAME || 'finance_tracker'}`);
+        const dbName = process.env.DB_NAME || 'finance_tracker';
+        await connection.execute(`CREATE DATABASE IF NOT EXISTS ${dbName}`);
         console.log('Database created successfully');
 
+        // Create the schema by applying every pending migration
+        await connection.query(`USE ${dbName}`);
+        const rounds = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+        await migrate(connection, { hashPassword: password => bcrypt.hash(password, rounds) });
+        console.log('Schema is up to date');
+
         await connection.end();
     } catch (error) {
         console.error('Database initialization error:', error);
@@ -666,7 +2605,1985 @@ async function initializeDatabase() {
     }
 }
 
-initializeDatabase();'''
+initializeDatabase();''',
+
+    'rollups.js': '''const mysql = require('mysql2/promise');
+const { createArchiveTable } = require('./archive');
+require('dotenv').config();
+
+// monthly_category_totals holds one row per (user, month, type, category) so
+// the dashboard never has to aggregate raw transactions. Every transaction
+// write applies its delta here inside the same database transaction.
+
+const createRollupTable = `
+    CREATE TABLE IF NOT EXISTS monthly_category_totals (
+        user_id INT NOT NULL,
+        month CHAR(7) NOT NULL,
+        transaction_type ENUM('income', 'expense') NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        transaction_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, month, transaction_type, category),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+`;
+
+// Add (sign = 1) or remove (sign = -1) the contribution of a set of
+// transactions, folded into one multi-row upsert
+async function applyRollupDeltas(connection, userId, transactions, sign) {
+    const groups = new Map();
+    for (const transaction of transactions) {
+        const month = transaction.date.slice(0, 7);
+        const key = JSON.stringify([month, transaction.transaction_type, transaction.category]);
+        const group = groups.get(key) || [userId, month, transaction.transaction_type, transaction.category, 0, 0];
+        // Sum in integer cents to avoid floating point drift
+        group[4] += Math.round(Number(transaction.amount) * 100);
+        group[5] += 1;
+        groups.set(key, group);
+    }
+    if (groups.size === 0) {
+        return;
+    }
+
+    const rows = [...groups.values()].map(([user, month, type, category, cents, count]) =>
+        [user, month, type, category, (sign * cents / 100).toFixed(2), sign * count]);
+
+    await connection.query(`
+        INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+        VALUES ?
+        ON DUPLICATE KEY UPDATE
+            total = total + VALUES(total),
+            transaction_count = transaction_count + VALUES(transaction_count)
+    `, [rows]);
+}
+
+// Add (sign = 1) or remove (sign = -1) one transaction's contribution
+async function applyRollupDelta(connection, userId, transaction, sign) {
+    await applyRollupDeltas(connection, userId, [transaction], sign);
+}
+
+// Live (not soft-deleted) transactions plus archived ones, for every user or
+// just one. Archived years keep their rollup rows, so both count.
+function transactionSource(userId) {
+    const live = userId === null ? 'WHERE deleted_at IS NULL' : 'WHERE deleted_at IS NULL AND user_id = ?';
+    const archived = userId === null ? '' : 'WHERE user_id = ?';
+    return `(
+        SELECT user_id, date, transaction_type, category, amount FROM transactions ${live}
+        UNION ALL
+        SELECT user_id, date, transaction_type, category, amount FROM transactions_archive ${archived}
+    ) AS source`;
+}
+
+// Recompute the rollup from raw and archived transactions, for every user or just one
+async function rebuildRollups(connection, userId = null) {
+    const where = userId === null ? '' : 'WHERE user_id = ?';
+    const params = userId === null ? [] : [userId];
+    const sourceParams = userId === null ? [] : [userId, userId];
+
+    await connection.beginTransaction();
+    try {
+        await connection.execute(`DELETE FROM monthly_category_totals ${where}`, params);
+        const [result] = await connection.execute(`
+            INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+            SELECT user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category, SUM(amount), COUNT(*)
+            FROM ${transactionSource(userId)}
+            GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+        `, sourceParams);
+        await connection.commit();
+        return result.affectedRows;
+    } catch (error) {
+        await connection.rollback();
+        throw error;
+    }
+}
+
+// Compare the rollup with raw and archived transactions and return every row that drifted
+async function verifyRollups(connection, userId = null) {
+    const where = userId === null ? '' : 'WHERE user_id = ?';
+    const params = userId === null ? [] : [userId];
+    const sourceParams = userId === null ? [] : [userId, userId];
+
+    const [expectedRows] = await connection.execute(`
+        SELECT user_id, DATE_FORMAT(date, '%Y-%m') AS month, transaction_type, category,
+               SUM(amount) AS total, COUNT(*) AS transaction_count
+        FROM ${transactionSource(userId)}
+        GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+    `, sourceParams);
+    const [actualRows] = await connection.execute(`
+        SELECT user_id, month, transaction_type, category, total, transaction_count
+        FROM monthly_category_totals
+        ${where}
+    `, params);
+
+    const key = row => [row.user_id, row.month, row.transaction_type, row.category].join('|');
+    const actual = new Map(actualRows.map(row => [key(row), row]));
+    const drift = [];
+
+    for (const row of expectedRows) {
+        const stored = actual.get(key(row));
+        actual.delete(key(row));
+        if (!stored || Number(stored.total) !== Number(row.total) ||
+            Number(stored.transaction_count) !== Number(row.transaction_count)) {
+            drift.push({ ...row, stored_total: stored ? stored.total : null });
+        }
+    }
+    // Leftover rollup rows must have been emptied out by deletes
+    for (const row of actual.values()) {
+        if (Number(row.transaction_count) !== 0 || Number(row.total) !== 0) {
+            drift.push({ ...row, total: '0.00', stored_total: row.total });
+        }
+    }
+
+    return drift;
+}
+
+// Command line: node rollups.js <verify|rebuild> [userId]
+async function main() {
+    const [command, userArg] = process.argv.slice(2);
+    const userId = userArg === undefined ? null : parseInt(userArg, 10);
+
+    if (!['verify', 'rebuild'].includes(command) || Number.isNaN(userId)) {
+        console.error('Usage: node rollups.js <verify|rebuild> [userId]');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        await connection.query(createRollupTable);
+        await connection.query(createArchiveTable);
+        if (command === 'rebuild') {
+            const rows = await rebuildRollups(connection, userId);
+            console.log(`Rebuilt monthly_category_totals (${rows} rows)`);
+        } else {
+            const drift = await verifyRollups(connection, userId);
+            drift.forEach(row => {
+                console.log(`Drift: user ${row.user_id} ${row.month} ${row.transaction_type}/${row.category}: ` +
+                    `expected ${row.total}, stored ${row.stored_total}`);
+            });
+            console.log(drift.length === 0 ? 'monthly_category_totals is consistent' : `${drift.length} drifted rows`);
+            process.exitCode = drift.length === 0 ? 0 : 2;
+        }
+    } catch (error) {
+        console.error('Rollup error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    createRollupTable,
+    applyRollupDelta,
+    applyRollupDeltas,
+    rebuildRollups,
+    verifyRollups
+};''',
+
+    'cache.js': '''// Per-user response cache for read endpoints whose data only changes when
+// that user writes (dashboard stats, budgets).
+//
+// Entries are keyed by user, the user's data_version and a scope such as
+// `dashboard:2024-12`. Every write bumps users.data_version in the database,
+// so a read that sees the new version (conditionalRead fetches it for the
+// ETag) can never find an entry computed before the write, in this process
+// or any other. Older entries are simply never looked up again and age out of
+// the backend.
+//
+// A backend stores opaque JSON-serializable values and must implement:
+//   get(key)                -> value or undefined
+//   set(key, value, ttlMs)
+// All methods may return promises, so a shared store such as Redis can be used
+// when several Node processes serve the same users.
+
+class MemoryCacheBackend {
+    constructor({ maxEntries = 5000 } = {}) {
+        this.maxEntries = maxEntries;
+        this.entries = new Map();
+    }
+
+    get(key) {
+        const entry = this.entries.get(key);
+        if (!entry) {
+            return undefined;
+        }
+        if (entry.expiresAt <= Date.now()) {
+            this.entries.delete(key);
+            return undefined;
+        }
+
+        // Map keeps insertion order, so re-inserting marks the entry most recently used
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        return entry.value;
+    }
+
+    set(key, value, ttlMs) {
+        this.entries.delete(key);
+        this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+}
+
+class ResponseCache {
+    constructor(backend, { ttlMs = 60000, enabled = true } = {}) {
+        this.backend = backend;
+        this.ttlMs = ttlMs;
+        this.enabled = enabled;
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    // Return the cached value for (userId, dataVersion, scope), computing and
+    // storing it on a miss. Pass the data_version read on the same connection
+    // pool as `compute` uses, so a lagging replica stores its result under the
+    // version it actually reflects.
+    async wrap(userId, dataVersion, scope, compute) {
+        if (!this.enabled) {
+            return { value: await compute(), hit: false };
+        }
+
+        const key = `resp:${userId}:${dataVersion}:${scope}`;
+        const cached = await this.backend.get(key);
+        if (cached !== undefined) {
+            this.hits++;
+            return { value: cached, hit: true };
+        }
+
+        this.misses++;
+        const value = await compute();
+        await this.backend.set(key, value, this.ttlMs);
+        return { value, hit: false };
+    }
+
+    stats() {
+        return { hits: this.hits, misses: this.misses };
+    }
+}
+
+module.exports = {
+    MemoryCacheBackend,
+    ResponseCache
+};''',
+
+    'importer.js': '''// Streaming parsers for bank statement uploads. Each reader consumes a text
+// stream chunk by chunk and yields { row, transaction } objects without ever
+// holding the whole file in memory; `transaction` uses the same field names
+// as the POST /api/transactions body so it can be validated the same way.
+
+const CSV_COLUMN_ALIASES = {
+    type: 'transaction_type'
+};
+
+// RFC 4180 CSV: quoted fields may contain commas, newlines and "" escapes
+async function* parseCsvRecords(stream) {
+    let field = '';
+    let record = [];
+    let inQuotes = false;
+    let quoteSeen = false;
+
+    for await (const chunk of stream) {
+        for (let i = 0; i < chunk.length; i++) {
+            const char = chunk[i];
+
+            if (inQuotes) {
+                if (quoteSeen) {
+                    quoteSeen = false;
+                    if (char === '"') {
+                        field += '"';
+                        continue;
+                    }
+                    inQuotes = false;
+                } else if (char === '"') {
+                    quoteSeen = true;
+                    continue;
+                } else {
+                    field += char;
+                    continue;
+                }
+            }
+
+            if (char === '"' && field === '') {
+                inQuotes = true;
+            } else if (char === ',') {
+                record.push(field);
+                field = '';
+            } else if (char === '\\n') {
+                record.push(field);
+                if (record.length > 1 || record[0] !== '') {
+                    yield record;
+                }
+                field = '';
+                record = [];
+            } else if (char !== '\\r') {
+                field += char;
+            }
+        }
+    }
+
+    if (field !== '' || record.length > 0) {
+        record.push(field);
+        yield record;
+    }
+}
+
+async function* readCsvTransactions(stream) {
+    let columns = null;
+    let row = 0;
+
+    for await (const record of parseCsvRecords(stream)) {
+        if (!columns) {
+            // Spreadsheet exports often start with a UTF-8 byte order mark
+            record[0] = record[0].replace(/^\\uFEFF/, '');
+            columns = record.map(name => {
+                const column = name.trim().toLowerCase();
+                return CSV_COLUMN_ALIASES[column] || column;
+            });
+            continue;
+        }
+
+        row++;
+        const transaction = {};
+        columns.forEach((column, index) => {
+            transaction[column] = (record[index] || '').trim();
+        });
+        yield { row, transaction };
+    }
+}
+
+function ofxTag(block, tag) {
+    const match = block.match(new RegExp(`<${tag}>([^<\\\\r\\\\n]*)`, 'i'));
+    return match ? match[1].trim() : '';
+}
+
+// OFX 1.x (SGML) and 2.x (XML) statements: one <STMTTRN> block per transaction.
+// OFX carries no category, so every row gets `defaultCategory`.
+async function* readOfxTransactions(stream, { defaultCategory = 'Other' } = {}) {
+    let buffer = '';
+    let row = 0;
+
+    for await (const chunk of stream) {
+        buffer += chunk;
+
+        let start = buffer.search(/<STMTTRN>/i);
+        while (start !== -1) {
+            const end = buffer.slice(start).search(/<\\/STMTTRN>/i);
+            if (end === -1) {
+                break;
+            }
+
+            const block = buffer.slice(start, start + end);
+            buffer = buffer.slice(start + end + '</STMTTRN>'.length);
+            start = buffer.search(/<STMTTRN>/i);
+
+            row++;
+            const amount = Number(ofxTag(block, 'TRNAMT'));
+            const posted = ofxTag(block, 'DTPOSTED');
+            yield {
+                row,
+                transaction: {
+                    amount: Number.isFinite(amount) ? Math.abs(amount).toFixed(2) : '',
+                    transaction_type: amount < 0 ? 'expense' : 'income',
+                    category: defaultCategory,
+                    description: ofxTag(block, 'NAME') || ofxTag(block, 'MEMO'),
+                    date: /^\\d{8}/.test(posted) ? `${posted.slice(0, 4)}-${posted.slice(4, 6)}-${posted.slice(6, 8)}` : ''
+                }
+            };
+        }
+
+        // Keep only what could still be the beginning of an unfinished block
+        if (start === -1) {
+            buffer = buffer.slice(-'<STMTTRN>'.length);
+        } else {
+            buffer = buffer.slice(start);
+        }
+    }
+}
+
+module.exports = {
+    parseCsvRecords,
+    readCsvTransactions,
+    readOfxTransactions
+};''',
+
+    'auth.js': '''const { Worker, isMainThread, parentPort } = require('worker_threads');
+const bcrypt = require('bcrypt');
+
+// Password hashing runs on a small dedicated set of worker threads using
+// bcrypt's synchronous API. bcrypt's async API would borrow libuv threadpool
+// threads (4 by default) that fs, dns and crypto calls from every other route
+// also need, so a burst of logins could stall unrelated requests.
+
+if (!isMainThread) {
+    parentPort.on('message', ({ id, op, password, hash, rounds }) => {
+        try {
+            const result = op === 'hash'
+                ? bcrypt.hashSync(password, rounds)
+                : bcrypt.compareSync(password, hash);
+            parentPort.postMessage({ id, result });
+        } catch (error) {
+            parentPort.postMessage({ id, error: error.message });
+        }
+    });
+}
+
+class HashQueueFullError extends Error {
+    constructor() {
+        super('Password hashing queue is full');
+        this.code = 'HASH_QUEUE_FULL';
+    }
+}
+
+class HashPool {
+    constructor({ size = 2, maxQueue = 100 } = {}) {
+        this.size = size;
+        this.maxQueue = maxQueue;
+        this.workers = [];
+        this.idle = [];
+        this.queue = [];
+        this.pending = new Map();
+        this.nextId = 1;
+        this.completed = 0;
+        this.rejected = 0;
+    }
+
+    hash(password, rounds) {
+        return this.run({ op: 'hash', password, rounds });
+    }
+
+    compare(password, hash) {
+        return this.run({ op: 'compare', password, hash });
+    }
+
+    run(task) {
+        if (this.queue.length >= this.maxQueue) {
+            this.rejected++;
+            return Promise.reject(new HashQueueFullError());
+        }
+
+        return new Promise((resolve, reject) => {
+            this.queue.push({ ...task, id: this.nextId++, resolve, reject });
+            this.dispatch();
+        });
+    }
+
+    dispatch() {
+        while (this.queue.length > 0) {
+            const worker = this.idle.pop() || this.spawn();
+            if (!worker) {
+                return;
+            }
+            const { resolve, reject, ...task } = this.queue.shift();
+            this.pending.set(task.id, { worker, resolve, reject });
+            worker.ref();
+            worker.postMessage(task);
+        }
+    }
+
+    // Workers start lazily, up to `size`
+    spawn() {
+        if (this.workers.length >= this.size) {
+            return null;
+        }
+
+        const worker = new Worker(__filename);
+        worker.on('message', ({ id, result, error }) => {
+            const task = this.pending.get(id);
+            this.pending.delete(id);
+            this.completed++;
+            this.idle.push(worker);
+            // Idle hashing threads must not keep the process alive
+            worker.unref();
+            if (error) {
+                task.reject(new Error(error));
+            } else {
+                task.resolve(result);
+            }
+            this.dispatch();
+        });
+        worker.on('error', (error) => this.replace(worker, error));
+        this.workers.push(worker);
+        return worker;
+    }
+
+    // Fail whatever the crashed worker was running and let a new one take its place
+    replace(worker, error) {
+        this.workers = this.workers.filter(w => w !== worker);
+        this.idle = this.idle.filter(w => w !== worker);
+        for (const [id, task] of this.pending) {
+            if (task.worker === worker) {
+                this.pending.delete(id);
+                task.reject(error);
+            }
+        }
+        this.dispatch();
+    }
+
+    stats() {
+        return {
+            workers: this.workers.length,
+            active: this.pending.size,
+            queued: this.queue.length,
+            completed: this.completed,
+            rejected: this.rejected
+        };
+    }
+}
+
+// Cost factor encoded in a bcrypt hash ($2b$<rounds>$...)
+function getRounds(hash) {
+    return parseInt(String(hash).split('$')[2], 10);
+}
+
+// Fixed-window counters of failed logins, keyed by username and by client IP.
+// Requests over the limit are refused before any hashing work. The counters
+// live in MySQL so every cluster worker and server enforces the same limits;
+// kept per process, N workers would allow N times as many attempts.
+const createLoginFailuresTable = `
+    CREATE TABLE IF NOT EXISTS login_failures (
+        throttle_key VARCHAR(120) COLLATE utf8mb4_bin NOT NULL,
+        failures INT UNSIGNED NOT NULL,
+        reset_at BIGINT NOT NULL,
+        PRIMARY KEY (throttle_key),
+        INDEX idx_login_failures_reset (reset_at)
+    )
+`;
+
+class LoginThrottle {
+    constructor(db, { windowMs = 15 * 60 * 1000, maxPerUsername = 5, maxPerIp = 50 } = {}) {
+        this.db = db;
+        this.windowMs = windowMs;
+        this.limits = { user: maxPerUsername, ip: maxPerIp };
+    }
+
+    // Usernames are cut to fit the key column; IPs always fit
+    keys(username, ip) {
+        return [['user', `user:${String(username).slice(0, 100)}`], ['ip', `ip:${ip}`]];
+    }
+
+    // Milliseconds until the caller may try again, or 0 if allowed now
+    async retryAfter(username, ip) {
+        const now = Date.now();
+        const keys = this.keys(username, ip);
+        const [rows] = await this.db.execute(
+            'SELECT throttle_key, failures, reset_at FROM login_failures WHERE throttle_key IN (?, ?) AND reset_at > ?',
+            [keys[0][1], keys[1][1], now]
+        );
+        let wait = 0;
+        for (const [kind, key] of keys) {
+            const entry = rows.find(row => row.throttle_key === key);
+            if (entry && entry.failures >= this.limits[kind]) {
+                wait = Math.max(wait, Number(entry.reset_at) - now);
+            }
+        }
+        return wait;
+    }
+
+    // One upsert for both counters; an expired window starts over at 1
+    async recordFailure(username, ip) {
+        const now = Date.now();
+        const resetAt = now + this.windowMs;
+        const [[, userKey], [, ipKey]] = this.keys(username, ip);
+        await this.db.execute(`
+            INSERT INTO login_failures (throttle_key, failures, reset_at)
+            VALUES (?, 1, ?), (?, 1, ?)
+            ON DUPLICATE KEY UPDATE
+                failures = IF(reset_at <= ?, 1, failures + 1),
+                reset_at = IF(reset_at <= ?, VALUES(reset_at), reset_at)
+        `, [userKey, resetAt, ipKey, resetAt, now, now]);
+    }
+
+    async recordSuccess(username) {
+        await this.db.execute('DELETE FROM login_failures WHERE throttle_key = ?', [this.keys(username, '')[0][1]]);
+    }
+
+    // Drop expired windows; safe to run from several processes at once
+    async prune() {
+        await this.db.execute('DELETE FROM login_failures WHERE reset_at <= ?', [Date.now()]);
+    }
+}
+
+module.exports = {
+    HashPool,
+    HashQueueFullError,
+    LoginThrottle,
+    createLoginFailuresTable,
+    getRounds
+};''',
+
+    'sessions.js': '''const crypto = require('crypto');
+const session = require('express-session');
+
+// Session backends that avoid a MySQL round trip on every authenticated request.
+// Both keep the `req.session` contract the routes rely on: plain properties
+// such as req.session.userId plus req.session.destroy(callback).
+
+// --- Stateless encrypted cookies -------------------------------------------
+//
+// The whole session is AES-256-GCM encrypted into the cookie, which both hides
+// and authenticates it. `secrets` is ordered newest first: cookies are always
+// issued with the first one, and cookies made with an older one are still
+// accepted and transparently re-issued, so secrets can be rotated without
+// logging anyone out.
+
+function deriveKey(secret) {
+    return crypto.createHash('sha256').update(String(secret)).digest();
+}
+
+function sealCookie(payload, key) {
+    const iv = crypto.randomBytes(12);
+    const cipher = crypto.createCipheriv('aes-256-gcm', key, iv);
+    const ciphertext = Buffer.concat([cipher.update(JSON.stringify(payload), 'utf8'), cipher.final()]);
+    return Buffer.concat([iv, cipher.getAuthTag(), ciphertext]).toString('base64url');
+}
+
+// Returns { payload, keyIndex } or null when no key can open the cookie
+function openCookie(value, keys) {
+    const raw = Buffer.from(value, 'base64url');
+    if (raw.length < 29) {
+        return null;
+    }
+
+    for (let keyIndex = 0; keyIndex < keys.length; keyIndex++) {
+        try {
+            const decipher = crypto.createDecipheriv('aes-256-gcm', keys[keyIndex], raw.subarray(0, 12));
+            decipher.setAuthTag(raw.subarray(12, 28));
+            const plaintext = Buffer.concat([decipher.update(raw.subarray(28)), decipher.final()]);
+            return { payload: JSON.parse(plaintext.toString('utf8')), keyIndex };
+        } catch (error) {
+            // Wrong key or tampered cookie: try the next key
+        }
+    }
+    return null;
+}
+
+function readCookie(header, name) {
+    for (const part of (header || '').split(';')) {
+        const index = part.indexOf('=');
+        if (index !== -1 && part.slice(0, index).trim() === name) {
+            try {
+                return decodeURIComponent(part.slice(index + 1).trim());
+            } catch (error) {
+                // Malformed percent-encoding: treat the cookie as absent
+                return null;
+            }
+        }
+    }
+    return null;
+}
+
+function appendSetCookie(res, cookie) {
+    const existing = res.getHeader('Set-Cookie');
+    res.setHeader('Set-Cookie', existing ? [].concat(existing, cookie) : cookie);
+}
+
+function createCookieSession({ name, secrets, maxAge, secure = false }) {
+    const keys = secrets.map(deriveKey);
+    const attributes = `Path=/; HttpOnly; SameSite=Lax${secure ? '; Secure' : ''}`;
+
+    return (req, res, next) => {
+        const cookie = readCookie(req.headers.cookie, name);
+        const opened = cookie ? openCookie(cookie, keys) : null;
+        const valid = opened && opened.payload.exp > Date.now();
+        const data = valid ? opened.payload.data : {};
+        const original = JSON.stringify(data);
+        let destroyed = false;
+
+        req.session = { ...data };
+        Object.defineProperty(req.session, 'destroy', {
+            enumerable: false,
+            value(callback) {
+                destroyed = true;
+                Object.keys(req.session).forEach(key => delete req.session[key]);
+                if (callback) {
+                    callback(null);
+                }
+            }
+        });
+
+        // Decide on the cookie right before the headers go out
+        const writeHead = res.writeHead;
+        res.writeHead = function (...args) {
+            const current = JSON.stringify(req.session);
+            if (destroyed || (cookie && !valid)) {
+                appendSetCookie(res, `${name}=; ${attributes}; Max-Age=0`);
+            } else if (Object.keys(req.session).length > 0 &&
+                (current !== original || (valid && opened.keyIndex > 0))) {
+                // Keep the original expiry when only re-encrypting with the current secret
+                const exp = current === original ? opened.payload.exp : Date.now() + maxAge;
+                const value = sealCookie({ data: req.session, exp }, keys[0]);
+                appendSetCookie(res, `${name}=${value}; ${attributes}; Max-Age=${Math.floor((exp - Date.now()) / 1000)}`);
+            }
+            return writeHead.apply(this, args);
+        };
+
+        next();
+    };
+}
+
+// --- Read-through cache in front of another express-session store -----------
+//
+// Sessions are cached in process for `ttlMs` after being read or written, and
+// touch() (which express-session calls on every unmodified request) is only
+// forwarded once per `touchIntervalMs`. Writes and destroys always go to the
+// backing store. With several processes a logout elsewhere is seen here within
+// `ttlMs`.
+
+class CachedSessionStore extends session.Store {
+    constructor(backingStore, { ttlMs = 5000, touchIntervalMs = 60000, maxEntries = 10000 } = {}) {
+        super();
+        this.backingStore = backingStore;
+        this.ttlMs = ttlMs;
+        this.touchIntervalMs = touchIntervalMs;
+        this.maxEntries = maxEntries;
+        this.entries = new Map();
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    remember(sid, sess) {
+        const previous = this.entries.get(sid);
+        this.entries.delete(sid);
+        this.entries.set(sid, {
+            json: JSON.stringify(sess),
+            expiresAt: Date.now() + this.ttlMs,
+            touchedAt: previous ? previous.touchedAt : Date.now()
+        });
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    get(sid, callback) {
+        const entry = this.entries.get(sid);
+        if (entry && entry.expiresAt > Date.now()) {
+            this.hits++;
+            // Hand out a fresh copy: express-session mutates what it is given
+            return callback(null, JSON.parse(entry.json));
+        }
+
+        this.misses++;
+        this.backingStore.get(sid, (error, sess) => {
+            if (!error && sess) {
+                this.remember(sid, sess);
+            }
+            callback(error, sess);
+        });
+    }
+
+    set(sid, sess, callback) {
+        this.backingStore.set(sid, sess, (error) => {
+            if (error) {
+                this.entries.delete(sid);
+            } else {
+                this.remember(sid, sess);
+            }
+            if (callback) {
+                callback(error);
+            }
+        });
+    }
+
+    destroy(sid, callback) {
+        this.entries.delete(sid);
+        this.backingStore.destroy(sid, callback);
+    }
+
+    touch(sid, sess, callback) {
+        const entry = this.entries.get(sid);
+        if (entry && Date.now() - entry.touchedAt < this.touchIntervalMs) {
+            return callback && callback(null);
+        }
+        if (entry) {
+            entry.touchedAt = Date.now();
+        }
+        this.backingStore.touch(sid, sess, callback);
+    }
+
+    close() {
+        this.entries.clear();
+        return this.backingStore.close();
+    }
+
+    stats() {
+        return { hits: this.hits, misses: this.misses, size: this.entries.size };
+    }
+}
+
+module.exports = {
+    createCookieSession,
+    CachedSessionStore
+};''',
+
+    'scripts/bench-sessions.js': '''// Compare authenticated request throughput for each SESSION_STORE mode.
+//
+//   node scripts/bench-sessions.js [requests] [concurrency] [path]
+//
+// Starts server.js once per mode on its own port (using the database settings
+// from .env), logs in as BENCH_USER / BENCH_PASSWORD (admin / password123 by
+// default) and replays the same authenticated GET with keep-alive connections.
+const { spawn } = require('child_process');
+const http = require('http');
+const path = require('path');
+require('dotenv').config();
+
+const MODES = ['mysql', 'cached', 'cookie'];
+const requests = parseInt(process.argv[2], 10) || 5000;
+const concurrency = parseInt(process.argv[3], 10) || 50;
+const targetPath = process.argv[4] || '/api/budgets';
+const agent = new http.Agent({ keepAlive: true, maxSockets: concurrency });
+
+function request(port, method, urlPath, { cookie, body } = {}) {
+    return new Promise((resolve, reject) => {
+        const req = http.request({
+            host: '127.0.0.1',
+            port,
+            method,
+            path: urlPath,
+            agent,
+            headers: {
+                'Content-Type': 'application/json',
+                ...(cookie ? { Cookie: cookie } : {})
+            }
+        }, (res) => {
+            res.resume();
+            res.on('end', () => resolve(res));
+        });
+        req.on('error', reject);
+        req.end(body ? JSON.stringify(body) : undefined);
+    });
+}
+
+function startServer(mode, port) {
+    return new Promise((resolve, reject) => {
+        const child = spawn(process.execPath, [path.join(__dirname, '..', 'server.js')], {
+            env: { ...process.env, PORT: String(port), SESSION_STORE: mode },
+            stdio: ['ignore', 'pipe', 'inherit']
+        });
+        child.stdout.on('data', (chunk) => {
+            if (chunk.toString().includes('Server running on port')) {
+                resolve(child);
+            }
+        });
+        child.on('exit', (code) => reject(new Error(`server (${mode}) exited with code ${code}`)));
+    });
+}
+
+async function benchmark(mode, port) {
+    const server = await startServer(mode, port);
+    try {
+        const login = await request(port, 'POST', '/api/auth/login', {
+            body: {
+                username: process.env.BENCH_USER || 'admin',
+                password: process.env.BENCH_PASSWORD || 'password123'
+            }
+        });
+        if (login.statusCode !== 200) {
+            throw new Error(`login failed with status ${login.statusCode}`);
+        }
+        const cookie = [].concat(login.headers['set-cookie'] || []).map(c => c.split(';')[0]).join('; ');
+
+        const run = async (total) => {
+            const latencies = [];
+            let next = 0;
+            let failures = 0;
+            const workerLoop = async () => {
+                while (next < total) {
+                    next++;
+                    const started = process.hrtime.bigint();
+                    const res = await request(port, 'GET', targetPath, { cookie });
+                    latencies.push(Number(process.hrtime.bigint() - started) / 1e6);
+                    if (res.statusCode !== 200) {
+                        failures++;
+                    }
+                }
+            };
+            const started = Date.now();
+            await Promise.all(Array.from({ length: concurrency }, workerLoop));
+            return { latencies, failures, elapsedMs: Date.now() - started };
+        };
+
+        await run(Math.min(500, requests)); // warm up pools and caches
+        const { latencies, failures, elapsedMs } = await run(requests);
+        latencies.sort((a, b) => a - b);
+        const percentile = (p) => latencies[Math.min(latencies.length - 1, Math.floor(p * latencies.length))];
+
+        return {
+            mode,
+            'req/s': Math.round(requests / (elapsedMs / 1000)),
+            'p50 ms': percentile(0.5).toFixed(2),
+            'p99 ms': percentile(0.99).toFixed(2),
+            failures
+        };
+    } finally {
+        server.kill();
+    }
+}
+
+async function main() {
+    console.log(`GET ${targetPath}: ${requests} requests, concurrency ${concurrency}`);
+    const results = [];
+    for (const [index, mode] of MODES.entries()) {
+        results.push(await benchmark(mode, 3900 + index));
+    }
+    console.table(results);
+    agent.destroy();
+}
+
+main().catch((error) => {
+    console.error('Benchmark error:', error);
+    process.exit(1);
+});''',
+
+    'migrations.js': '''const mysql = require('mysql2/promise');
+const { createRollupTable } = require('./rollups');
+const { createArchiveTable, createArchiveSummaryTable } = require('./archive');
+const { createLoginFailuresTable } = require('./auth');
+require('dotenv').config();
+
+// Versioned schema changes. Each migration runs once, in order, and is
+// recorded in schema_migrations, so a server start on an up-to-date database
+// only has to read the current version. Migrations are append-only: never edit
+// one that has shipped, add a new one instead.
+//
+// `up(connection, context)` receives a dedicated connection and
+// { hashPassword(password) -> Promise<hash>, allowBlocking } for seeding users.
+// A migration that locks a table against writes while it runs sets
+// `blocksWrites: true`; migrate() only applies those when the caller passes
+// `allowBlocking` (the `npm run migrate` command does, server startup does not).
+
+const createMigrationsTable = `
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+`;
+
+const MIGRATION_LOCK = 'finance_tracker_schema_migrations';
+const MIGRATION_LOCK_TIMEOUT_SECONDS = 60;
+
+async function indexExists(connection, table, name) {
+    const [existing] = await connection.execute(`
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ?
+        LIMIT 1
+    `, [table, name]);
+    return existing.length > 0;
+}
+
+// Add an index unless it already exists. ALGORITHM=INPLACE, LOCK=NONE keeps
+// the table readable and writable while the index builds, so this is safe to
+// run against a busy production table.
+async function addIndexOnline(connection, table, name, columns) {
+    if (!(await indexExists(connection, table, name))) {
+        await connection.query(`ALTER TABLE ${table} ADD INDEX ${name} ${columns}, ALGORITHM=INPLACE, LOCK=NONE`);
+        console.log(`Added index ${name} on ${table}`);
+    }
+}
+
+// Add a column unless it already exists. Without an ALGORITHM clause MySQL 8
+// picks INSTANT (a metadata-only change) and 5.7 an in-place rebuild that
+// still allows concurrent writes.
+async function addColumn(connection, table, name, definition) {
+    const [existing] = await connection.execute(`
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ?
+        LIMIT 1
+    `, [table, name]);
+    if (existing.length === 0) {
+        await connection.query(`ALTER TABLE ${table} ADD COLUMN ${name} ${definition}`);
+        console.log(`Added column ${name} on ${table}`);
+    }
+}
+
+const migrations = [
+    {
+        version: 1,
+        name: 'create_core_tables',
+        // IF NOT EXISTS lets databases created before migrations adopt this baseline
+        async up(connection) {
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS users (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    username VARCHAR(50) UNIQUE NOT NULL,
+                    password VARCHAR(255) NOT NULL,
+                    email VARCHAR(100),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            `);
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    description VARCHAR(255),
+                    transaction_type ENUM('income', 'expense') NOT NULL,
+                    date DATE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            `);
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS budgets (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    month CHAR(7) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY unique_user_category_month (user_id, category, month),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            `);
+        }
+    },
+    {
+        version: 2,
+        name: 'add_transaction_indexes',
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_date',
+                '(user_id, date, transaction_type, category, amount)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_date_created',
+                '(user_id, date, created_at)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_category_date',
+                '(user_id, category, date, created_at)');
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_type_date',
+                '(user_id, transaction_type, date, created_at)');
+        }
+    },
+    {
+        version: 3,
+        name: 'create_monthly_category_totals',
+        // The backfill is one INSERT ... SELECT over all of transactions, which
+        // holds shared locks on every row it reads until it commits. It cannot
+        // be split into batches: writes landing between batches would either
+        // miss the rollup or be counted twice.
+        blocksWrites: true,
+        async up(connection) {
+            await connection.query(createRollupTable);
+            // Populate it on databases that already have transactions
+            const [[state]] = await connection.execute(`
+                SELECT
+                    EXISTS(SELECT 1 FROM monthly_category_totals) AS has_rollups,
+                    EXISTS(SELECT 1 FROM transactions) AS has_transactions
+            `);
+            if (!state.has_rollups && state.has_transactions) {
+                const [result] = await connection.query(`
+                    INSERT INTO monthly_category_totals (user_id, month, transaction_type, category, total, transaction_count)
+                    SELECT user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category, SUM(amount), COUNT(*)
+                    FROM transactions
+                    GROUP BY user_id, DATE_FORMAT(date, '%Y-%m'), transaction_type, category
+                `);
+                console.log(`Backfilled monthly_category_totals (${result.affectedRows} rows)`);
+            }
+        }
+    },
+    {
+        version: 4,
+        name: 'create_sessions_table',
+        // Same layout express-mysql-session would create
+        async up(connection) {
+            await connection.query(`
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id VARCHAR(128) COLLATE utf8mb4_bin NOT NULL,
+                    expires INT(11) UNSIGNED NOT NULL,
+                    data MEDIUMTEXT COLLATE utf8mb4_bin,
+                    PRIMARY KEY (session_id)
+                )
+            `);
+        }
+    },
+    {
+        version: 5,
+        name: 'seed_admin_user',
+        async up(connection, { hashPassword }) {
+            const [admins] = await connection.execute('SELECT id FROM users WHERE username = ?', ['admin']);
+            if (admins.length === 0) {
+                const hashedPassword = await hashPassword('password123');
+                await connection.execute(`
+                    INSERT IGNORE INTO users (username, password, email)
+                    VALUES (?, ?, ?)
+                `, ['admin', hashedPassword, 'admin@example.com']);
+            }
+        }
+    },
+    {
+        version: 6,
+        name: 'add_users_data_version',
+        // Bumped by every write a user makes; read endpoints derive their ETags from it
+        async up(connection) {
+            await addColumn(connection, 'users', 'data_version', 'BIGINT UNSIGNED NOT NULL DEFAULT 0');
+        }
+    },
+    {
+        version: 7,
+        name: 'add_sync_columns',
+        // change_version is the users.data_version of the write that last touched
+        // a row; deleted_at turns deletes into tombstones that /api/sync can report
+        async up(connection) {
+            for (const table of ['transactions', 'budgets']) {
+                await addColumn(connection, table, 'updated_at',
+                    'TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)');
+                await addColumn(connection, table, 'deleted_at', 'TIMESTAMP NULL DEFAULT NULL');
+                await addColumn(connection, table, 'change_version', 'BIGINT UNSIGNED NOT NULL DEFAULT 0');
+                await addIndexOnline(connection, table, `idx_${table}_user_change`, '(user_id, change_version)');
+                await addIndexOnline(connection, table, `idx_${table}_deleted`, '(deleted_at)');
+            }
+        }
+    },
+    {
+        version: 8,
+        name: 'add_transaction_trend_index',
+        // Covers weekly trend aggregation: live rows of one user over a date range
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions', 'idx_transactions_user_live_date',
+                '(user_id, deleted_at, date, transaction_type, category, amount)');
+        }
+    },
+    {
+        version: 9,
+        name: 'add_transaction_search',
+        // search_text leads with a usr<id> token that every search requires.
+        // This does not narrow the index lookup: in boolean mode each `+` term
+        // reads its whole posting list and the lists are intersected, so the
+        // token's list grows with the user's rows and a common word's list with
+        // everyone's. The search route therefore keeps short prefixes out of
+        // MATCH. INVISIBLE keeps the column out of SELECT *. Both steps
+        // block writes to transactions while they run (a stored generated
+        // column copies the table; the first FULLTEXT index allows reads only).
+        blocksWrites: true,
+        async up(connection) {
+            await addColumn(connection, 'transactions', 'search_text',
+                "VARCHAR(330) GENERATED ALWAYS AS (CONCAT('usr', user_id, ' ', category, ' ', COALESCE(description, ''))) STORED INVISIBLE");
+            if (!(await indexExists(connection, 'transactions', 'ft_transactions_search'))) {
+                await connection.query(
+                    'ALTER TABLE transactions ADD FULLTEXT INDEX ft_transactions_search (search_text), ALGORITHM=INPLACE, LOCK=SHARED'
+                );
+                console.log('Added index ft_transactions_search on transactions');
+            }
+        }
+    },
+    {
+        version: 10,
+        name: 'create_transaction_archive',
+        // Filled by `node archive.js run`; see archive.js
+        async up(connection) {
+            await connection.query(createArchiveTable);
+            await connection.query(createArchiveSummaryTable);
+        }
+    },
+    {
+        version: 11,
+        name: 'add_archive_sync_index',
+        // /api/sync walks each user's archived rows by change_version
+        async up(connection) {
+            await addIndexOnline(connection, 'transactions_archive', 'idx_transactions_archive_user_change',
+                '(user_id, change_version)');
+        }
+    },
+    {
+        version: 12,
+        name: 'create_login_failures',
+        // Failed-login counters shared by every worker; see LoginThrottle in auth.js
+        async up(connection) {
+            await connection.query(createLoginFailuresTable);
+        }
+    }
+];
+
+const LATEST_SCHEMA_VERSION = migrations[migrations.length - 1].version;
+
+// Highest applied version, or 0 on a database that has never been migrated.
+// MAX() over the primary key is answered from the index.
+async function getSchemaVersion(connection) {
+    try {
+        const [[row]] = await connection.execute('SELECT MAX(version) AS version FROM schema_migrations');
+        return row.version || 0;
+    } catch (error) {
+        if (error.code === 'ER_NO_SUCH_TABLE') {
+            return 0;
+        }
+        throw error;
+    }
+}
+
+// Apply every pending migration. A named lock serializes concurrent runners
+// (for example several instances starting during a deploy); whoever waits
+// re-reads the version afterwards and finds nothing left to do. Nothing is
+// applied if a pending migration blocks writes and `context.allowBlocking` is
+// not set.
+async function migrate(connection, context) {
+    const [[lock]] = await connection.execute('SELECT GET_LOCK(?, ?) AS acquired',
+        [MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT_SECONDS]);
+    if (lock.acquired !== 1) {
+        throw new Error('Timed out waiting for another process to finish migrating');
+    }
+
+    try {
+        await connection.query(createMigrationsTable);
+        const current = await getSchemaVersion(connection);
+        const blocking = migrations.filter(migration => migration.version > current && migration.blocksWrites);
+        if (blocking.length > 0 && !context.allowBlocking) {
+            throw new Error(`Migration ${blocking.map(migration => `${migration.version} ${migration.name}`).join(', ')} ` +
+                'blocks writes while it runs; apply it with npm run migrate');
+        }
+        const applied = [];
+
+        for (const migration of migrations) {
+            if (migration.version <= current) {
+                continue;
+            }
+            // MySQL commits DDL implicitly, so each migration is recorded as soon as it completes
+            await migration.up(connection, context);
+            await connection.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                [migration.version, migration.name]);
+            console.log(`Applied migration ${migration.version} ${migration.name}`);
+            applied.push(migration.version);
+        }
+
+        return applied;
+    } finally {
+        await connection.execute('SELECT RELEASE_LOCK(?)', [MIGRATION_LOCK]);
+    }
+}
+
+// Command line: node migrations.js <up|status>
+async function main() {
+    const [command] = process.argv.slice(2);
+
+    if (!['up', 'status'].includes(command)) {
+        console.error('Usage: node migrations.js <up|status>');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        if (command === 'up') {
+            const bcrypt = require('bcrypt');
+            const rounds = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+            const applied = await migrate(connection, {
+                hashPassword: password => bcrypt.hash(password, rounds),
+                allowBlocking: true
+            });
+            console.log(applied.length === 0 ? 'Schema is up to date' : `Applied ${applied.length} migrations`);
+        } else {
+            const version = await getSchemaVersion(connection);
+            console.log(`Schema version ${version}, latest ${LATEST_SCHEMA_VERSION}`);
+            migrations.filter(migration => migration.version > version).forEach(migration => {
+                console.log(`Pending: ${migration.version} ${migration.name}${migration.blocksWrites ? ' (blocks writes)' : ''}`);
+            });
+        }
+    } catch (error) {
+        console.error('Migration error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    migrations,
+    LATEST_SCHEMA_VERSION,
+    addIndexOnline,
+    addColumn,
+    getSchemaVersion,
+    migrate
+};''',
+
+    'metrics.js': '''const { monitorEventLoopDelay } = require('perf_hooks');
+
+// In-process metrics rendered in the Prometheus text exposition format.
+// Counters and histograms are updated as things happen; gauges are read from a
+// callback at scrape time. In cluster mode every worker keeps its own
+// registry, so each scrape describes the worker that answered it.
+
+const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+function formatLabels(names, values) {
+    if (names.length === 0) {
+        return '';
+    }
+    const pairs = names.map((name, index) =>
+        `${name}="${String(values[index]).replace(/\\\\/g, '\\\\\\\\').replace(/"/g, '\\\\"').replace(/\\n/g, '\\\\n')}"`);
+    return `{${pairs.join(',')}}`;
+}
+
+function seconds(start) {
+    return Number(process.hrtime.bigint() - start) / 1e9;
+}
+
+class Counter {
+    constructor(name, help, labelNames = []) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.values = new Map();
+    }
+
+    inc(labels = {}, amount = 1) {
+        const key = JSON.stringify(this.labelNames.map(name => labels[name]));
+        this.values.set(key, (this.values.get(key) || 0) + amount);
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+        for (const [key, value] of this.values) {
+            lines.push(`${this.name}${formatLabels(this.labelNames, JSON.parse(key))} ${value}`);
+        }
+        return lines;
+    }
+}
+
+class Histogram {
+    constructor(name, help, labelNames = [], buckets = DEFAULT_BUCKETS) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.buckets = buckets;
+        this.series = new Map();
+    }
+
+    observe(labels, value) {
+        const key = JSON.stringify(this.labelNames.map(name => labels[name]));
+        let series = this.series.get(key);
+        if (!series) {
+            series = { counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 };
+            this.series.set(key, series);
+        }
+        // Counts are per bucket here and made cumulative when rendered
+        const index = this.buckets.findIndex(bound => value <= bound);
+        if (index !== -1) {
+            series.counts[index]++;
+        }
+        series.sum += value;
+        series.count++;
+    }
+
+    // Time a promise-returning function, recording failures as well
+    async time(labels, fn) {
+        const start = process.hrtime.bigint();
+        try {
+            return await fn();
+        } finally {
+            this.observe(labels, seconds(start));
+        }
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+        const names = [...this.labelNames, 'le'];
+        for (const [key, series] of this.series) {
+            const values = JSON.parse(key);
+            let cumulative = 0;
+            this.buckets.forEach((bound, index) => {
+                cumulative += series.counts[index];
+                lines.push(`${this.name}_bucket${formatLabels(names, [...values, bound])} ${cumulative}`);
+            });
+            lines.push(`${this.name}_bucket${formatLabels(names, [...values, '+Inf'])} ${series.count}`);
+            lines.push(`${this.name}_sum${formatLabels(this.labelNames, values)} ${series.sum}`);
+            lines.push(`${this.name}_count${formatLabels(this.labelNames, values)} ${series.count}`);
+        }
+        return lines;
+    }
+}
+
+// `collect()` returns a number, or an array of [labels, value] pairs
+class Gauge {
+    constructor(name, help, labelNames, collect) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.collect = collect;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} gauge`];
+        const collected = this.collect();
+        const samples = Array.isArray(collected) ? collected : [[{}, collected]];
+        for (const [labels, value] of samples) {
+            lines.push(`${this.name}${formatLabels(this.labelNames, this.labelNames.map(name => labels[name]))} ${value}`);
+        }
+        return lines;
+    }
+}
+
+class MetricsRegistry {
+    constructor() {
+        this.metrics = [];
+    }
+
+    counter(name, help, labelNames) {
+        return this.register(new Counter(name, help, labelNames));
+    }
+
+    histogram(name, help, labelNames, buckets) {
+        return this.register(new Histogram(name, help, labelNames, buckets));
+    }
+
+    gauge(name, help, labelNames, collect) {
+        return this.register(new Gauge(name, help, labelNames, collect));
+    }
+
+    register(metric) {
+        this.metrics.push(metric);
+        return metric;
+    }
+
+    render() {
+        return this.metrics.flatMap(metric => metric.render()).join('\\n') + '\\n';
+    }
+}
+
+// Per-route request latency, plus the time spent in res.json() so slow
+// serialization can be told apart from slow queries
+function requestMetrics(registry) {
+    const duration = registry.histogram('http_request_duration_seconds',
+        'HTTP request latency by route', ['method', 'route', 'status']);
+    const serialize = registry.histogram('http_response_serialize_seconds',
+        'Time spent serializing JSON responses', ['route'],
+        [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25]);
+
+    // Label by route pattern (/api/transactions/:id), never by raw URL
+    const routeOf = req => (req.route ? `${req.baseUrl}${req.route.path}` : 'unmatched');
+
+    return (req, res, next) => {
+        const start = process.hrtime.bigint();
+
+        const json = res.json;
+        res.json = function (body) {
+            const serializeStart = process.hrtime.bigint();
+            const result = json.call(this, body);
+            serialize.observe({ route: routeOf(req) }, seconds(serializeStart));
+            return result;
+        };
+
+        res.on('finish', () => {
+            duration.observe({ method: req.method, route: routeOf(req), status: res.statusCode }, seconds(start));
+        });
+        next();
+    };
+}
+
+// Name a statement by an explicit leading /* name */ comment, or else by its
+// verb and first table, e.g. "select transactions" (also for a UNION whose
+// first branch is parenthesized)
+function queryName(sql) {
+    const text = typeof sql === 'string' ? sql : sql.sql;
+    const comment = text.match(/^\\s*\\/\\*\\s*([\\w:.-]+)\\s*\\*\\//);
+    if (comment) {
+        return comment[1];
+    }
+    const verb = (text.match(/^[\\s(]*(\\w+)/) || [, 'unknown'])[1].toLowerCase();
+    const table = text.match(/\\b(?:from|into|update|table)\\s+(?:if\\s+(?:not\\s+)?exists\\s+)?`?(\\w+)/i);
+    return table ? `${verb} ${table[1]}` : verb;
+}
+
+function rowCount(result) {
+    const [rows] = result;
+    return Array.isArray(rows) ? rows.length : (rows && rows.affectedRows) || 0;
+}
+
+// Metric families shared by every instrumented pool, labelled by pool name
+const poolFamilies = new WeakMap();
+
+function poolMetrics(registry) {
+    let families = poolFamilies.get(registry);
+    if (families) {
+        return families;
+    }
+
+    // mysql2 keeps these counts on the underlying callback pool
+    const pools = new Map();
+    const byPool = collect => [...pools].flatMap(([name, core]) => collect(name, core));
+    families = {
+        pools,
+        duration: registry.histogram('db_query_duration_seconds',
+            'Database query latency by statement', ['pool', 'query']),
+        rows: registry.counter('db_query_rows_total',
+            'Rows returned or affected by statement', ['pool', 'query']),
+        errors: registry.counter('db_query_errors_total',
+            'Failed database queries by statement', ['pool', 'query']),
+        queueWait: registry.histogram('db_pool_queue_wait_seconds',
+            'Time spent waiting for a pool connection, including timeouts', ['pool'],
+            [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10])
+    };
+    registry.gauge('db_pool_connections', 'Pool connections by state', ['pool', 'state'], () =>
+        byPool((name, core) => {
+            const all = core._allConnections.length;
+            const idle = core._freeConnections.length;
+            return [[{ pool: name, state: 'active' }, all - idle], [{ pool: name, state: 'idle' }, idle]];
+        }));
+    registry.gauge('db_pool_queued_requests', 'Requests waiting for a pool connection', ['pool'], () =>
+        byPool((name, core) => [[{ pool: name }, core._connectionQueue.length]]));
+    registry.gauge('db_pool_connection_limit', 'Maximum pool size', ['pool'], () =>
+        byPool((name, core) => [[{ pool: name }, core.config.connectionLimit]]));
+
+    poolFamilies.set(registry, families);
+    return families;
+}
+
+// Time every execute()/query() on a mysql2 promise pool, including the
+// connections it hands out, and the wait for each connection. Statements
+// slower than `slowQueryMs` are logged. Metrics are labelled with `name`, so
+// several pools can share a registry.
+function instrumentPool(pool, registry, { name = 'default', slowQueryMs = 200 } = {}) {
+    const { pools, duration, rows, errors, queueWait } = poolMetrics(registry);
+    const instrumented = Symbol('instrumented');
+
+    const wrap = (target) => {
+        if (target[instrumented]) {
+            return target;
+        }
+        for (const method of ['execute', 'query']) {
+            const original = target[method];
+            target[method] = async function (sql, ...args) {
+                const labels = { pool: name, query: queryName(sql) };
+                const start = process.hrtime.bigint();
+                try {
+                    const result = await original.call(this, sql, ...args);
+                    rows.inc(labels, rowCount(result));
+                    return result;
+                } catch (error) {
+                    errors.inc(labels);
+                    throw error;
+                } finally {
+                    const elapsed = seconds(start);
+                    duration.observe(labels, elapsed);
+                    if (elapsed * 1000 >= slowQueryMs) {
+                        const text = (typeof sql === 'string' ? sql : sql.sql).replace(/\\s+/g, ' ').trim();
+                        console.warn(`Slow query (${Math.round(elapsed * 1000)}ms) ${labels.query} on ${name}: ${text.slice(0, 500)}`);
+                    }
+                }
+            };
+        }
+        target[instrumented] = true;
+        return target;
+    };
+
+    wrap(pool);
+    const getConnection = pool.getConnection;
+    pool.getConnection = async function (...args) {
+        return wrap(await getConnection.apply(this, args));
+    };
+
+    // execute() and query() acquire their connections through the callback
+    // pool's getConnection, so timing it there covers every caller
+    const core = pool.pool;
+    const acquire = core.getConnection;
+    core.getConnection = function (callback) {
+        const start = process.hrtime.bigint();
+        return acquire.call(this, (error, connection) => {
+            queueWait.observe({ pool: name }, seconds(start));
+            callback(error, connection);
+        });
+    };
+    pools.set(name, core);
+
+    return pool;
+}
+
+// Event loop delay percentiles over the interval since the previous scrape
+function monitorEventLoop(registry) {
+    const histogram = monitorEventLoopDelay({ resolution: 10 });
+    histogram.enable();
+
+    registry.gauge('nodejs_eventloop_lag_seconds', 'Event loop delay since the last scrape', ['quantile'], () => {
+        const samples = [0.5, 0.9, 0.99].map(quantile =>
+            [{ quantile }, histogram.count ? histogram.percentile(quantile * 100) / 1e9 : 0]);
+        samples.push([{ quantile: 1 }, histogram.count ? histogram.max / 1e9 : 0]);
+        histogram.reset();
+        return samples;
+    });
+    return histogram;
+}
+
+module.exports = {
+    MetricsRegistry,
+    requestMetrics,
+    instrumentPool,
+    monitorEventLoop,
+    queryName
+};''',
+
+    'archive.js': '''const mysql = require('mysql2/promise');
+require('dotenv').config();
+
+// Cold storage for closed years. `node archive.js run` moves live transactions
+// dated in years that have closed into transactions_archive, so the hot table
+// and its indexes only hold recent history. Each moved row is added to a
+// per-user, per-year summary in transaction_archive_years. The dashboard and
+// trends are unaffected: they read monthly_category_totals, which keeps the
+// archived rows' contribution. Archived rows are read-only, and search does not
+// cover them (the archive has no FULLTEXT index).
+
+// Same visible columns, in the same order, as transactions so reads can
+// UNION ALL the two tables with SELECT *. Only the index that ranged reads use
+// is kept, and rows are compressed since they are rarely read.
+const createArchiveTable = `
+    CREATE TABLE IF NOT EXISTS transactions_archive (
+        id INT PRIMARY KEY,
+        user_id INT NOT NULL,
+        amount DECIMAL(10,2) NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        description VARCHAR(255),
+        transaction_type ENUM('income', 'expense') NOT NULL,
+        date DATE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+        deleted_at TIMESTAMP NULL DEFAULT NULL,
+        change_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        INDEX idx_transactions_archive_user_date (user_id, date, created_at),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) ROW_FORMAT=COMPRESSED
+`;
+
+const createArchiveSummaryTable = `
+    CREATE TABLE IF NOT EXISTS transaction_archive_years (
+        user_id INT NOT NULL,
+        year SMALLINT NOT NULL,
+        income DECIMAL(14,2) NOT NULL DEFAULT 0,
+        expenses DECIMAL(14,2) NOT NULL DEFAULT 0,
+        transaction_count INT NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, year),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+`;
+
+const ARCHIVE_COLUMNS = ['id', 'user_id', 'amount', 'category', 'description', 'transaction_type',
+    'date', 'created_at', 'updated_at', 'deleted_at', 'change_version'];
+const ARCHIVE_LOCK = 'finance_tracker_archive';
+const DEFAULT_BATCH_SIZE = 1000;
+
+// The current year and ARCHIVE_HOT_YEARS - 1 before it stay in the hot table
+const ARCHIVE_HOT_YEARS = parseInt(process.env.ARCHIVE_HOT_YEARS, 10) || 2;
+
+// Move one batch of rows (already known to be archivable) in one transaction.
+// Users' rows are locked first, the same order the write routes use, and their
+// data_version is bumped so cached transaction lists revalidate. Moved rows take
+// that version as their change_version, which puts them in the archive's
+// /api/sync stream. Rows that were deleted or re-dated in the meantime are
+// skipped by the locking read.
+async function archiveBatch(connection, candidates, before) {
+    const userIds = [...new Set(candidates.map(row => row.user_id))].sort((a, b) => a - b);
+
+    await connection.beginTransaction();
+    try {
+        await connection.query('UPDATE users SET data_version = data_version + 1 WHERE id IN (?)', [userIds]);
+        const [rows] = await connection.query(`
+            SELECT id, user_id, YEAR(date) AS year, transaction_type, amount
+            FROM transactions
+            WHERE id IN (?) AND date < ? AND deleted_at IS NULL
+            FOR UPDATE
+        `, [candidates.map(row => row.id), before]);
+
+        if (rows.length > 0) {
+            const ids = rows.map(row => row.id);
+            const archived = ARCHIVE_COLUMNS.map(column =>
+                column === 'change_version' ? 'users.data_version' : `transactions.${column}`);
+            await connection.query(`
+                INSERT INTO transactions_archive (${ARCHIVE_COLUMNS.join(', ')})
+                SELECT ${archived.join(', ')}
+                FROM transactions JOIN users ON users.id = transactions.user_id
+                WHERE transactions.id IN (?)
+            `, [ids]);
+
+            const years = new Map();
+            for (const row of rows) {
+                const key = `${row.user_id}|${row.year}`;
+                const summary = years.get(key) || [row.user_id, row.year, 0, 0, 0];
+                // Sum in integer cents to avoid floating point drift
+                summary[row.transaction_type === 'income' ? 2 : 3] += Math.round(Number(row.amount) * 100);
+                summary[4] += 1;
+                years.set(key, summary);
+            }
+            await connection.query(`
+                INSERT INTO transaction_archive_years (user_id, year, income, expenses, transaction_count)
+                VALUES ?
+                ON DUPLICATE KEY UPDATE
+                    income = income + VALUES(income),
+                    expenses = expenses + VALUES(expenses),
+                    transaction_count = transaction_count + VALUES(transaction_count)
+            `, [[...years.values()].map(([user, year, income, expenses, count]) =>
+                [user, year, (income / 100).toFixed(2), (expenses / 100).toFixed(2), count])]);
+
+            await connection.query('DELETE FROM transactions WHERE id IN (?)', [ids]);
+        }
+
+        await connection.commit();
+        return rows.length;
+    } catch (error) {
+        await connection.rollback();
+        throw error;
+    }
+}
+
+// Archive every live transaction dated in `throughYear` or earlier. Candidates
+// are found by walking the primary key with plain (non-locking) reads, so the
+// scan never blocks writers; only the rows being moved are locked. Soft-deleted
+// rows stay behind for the tombstone purge. Returns the number of rows moved.
+async function archiveTransactions(connection, throughYear, { batchSize = DEFAULT_BATCH_SIZE } = {}) {
+    const before = `${throughYear + 1}-01-01`;
+    let lastId = 0;
+    let moved = 0;
+
+    for (;;) {
+        const [candidates] = await connection.execute(`
+            SELECT id, user_id FROM transactions
+            WHERE id > ? AND date < ? AND deleted_at IS NULL
+            ORDER BY id
+            LIMIT ${batchSize}
+        `, [lastId, before]);
+        if (candidates.length === 0) {
+            return moved;
+        }
+        moved += await archiveBatch(connection, candidates, before);
+        lastId = candidates[candidates.length - 1].id;
+    }
+}
+
+// Compare transaction_archive_years with the archived rows and return every
+// summary that drifted
+async function verifyArchive(connection) {
+    const [expectedRows] = await connection.execute(`
+        SELECT user_id, YEAR(date) AS year,
+               SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) AS income,
+               SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END) AS expenses,
+               COUNT(*) AS transaction_count
+        FROM transactions_archive
+        GROUP BY user_id, YEAR(date)
+    `);
+    const [actualRows] = await connection.execute(
+        'SELECT user_id, year, income, expenses, transaction_count FROM transaction_archive_years'
+    );
+
+    const key = row => `${row.user_id}|${row.year}`;
+    const actual = new Map(actualRows.map(row => [key(row), row]));
+    const drift = [];
+
+    for (const row of expectedRows) {
+        const stored = actual.get(key(row));
+        actual.delete(key(row));
+        if (!stored || ['income', 'expenses', 'transaction_count'].some(column => Number(stored[column]) !== Number(row[column]))) {
+            drift.push({ ...row, stored: stored || null });
+        }
+    }
+    // Summaries with no archived rows behind them
+    for (const row of actual.values()) {
+        drift.push({ user_id: row.user_id, year: row.year, income: '0.00', expenses: '0.00', transaction_count: 0, stored: row });
+    }
+
+    return drift;
+}
+
+// Command line: node archive.js <run|verify> [throughYear]
+async function main() {
+    const [command, yearArg] = process.argv.slice(2);
+    const throughYear = yearArg === undefined
+        ? new Date().getUTCFullYear() - ARCHIVE_HOT_YEARS
+        : parseInt(yearArg, 10);
+
+    if (!['run', 'verify'].includes(command) || Number.isNaN(throughYear)) {
+        console.error('Usage: node archive.js <run|verify> [throughYear]');
+        process.exit(1);
+    }
+    if (command === 'run' && throughYear >= new Date().getUTCFullYear()) {
+        console.error('Only closed years can be archived');
+        process.exit(1);
+    }
+
+    const connection = await mysql.createConnection({
+        host: process.env.DB_HOST || 'localhost',
+        user: process.env.DB_USER || 'root',
+        password: process.env.DB_PASSWORD || '',
+        database: process.env.DB_NAME || 'finance_tracker',
+        dateStrings: true
+    });
+
+    try {
+        await connection.query(createArchiveTable);
+        await connection.query(createArchiveSummaryTable);
+        if (command === 'run') {
+            // One archiver at a time; a second one would only contend for the same rows
+            const [[lock]] = await connection.execute('SELECT GET_LOCK(?, 0) AS acquired', [ARCHIVE_LOCK]);
+            if (lock.acquired !== 1) {
+                throw new Error('Another archive run is in progress');
+            }
+            const moved = await archiveTransactions(connection, throughYear);
+            console.log(`Archived ${moved} transactions dated ${throughYear} or earlier`);
+        } else {
+            const drift = await verifyArchive(connection);
+            drift.forEach(row => {
+                const stored = row.stored
+                    ? `${row.stored.income}/${row.stored.expenses} (${row.stored.transaction_count})`
+                    : 'nothing';
+                console.log(`Drift: user ${row.user_id} ${row.year}: expected ` +
+                    `${row.income}/${row.expenses} (${row.transaction_count}), stored ${stored}`);
+            });
+            console.log(drift.length === 0 ? 'transaction_archive_years is consistent' : `${drift.length} drifted rows`);
+            process.exitCode = drift.length === 0 ? 0 : 2;
+        }
+    } catch (error) {
+        console.error('Archive error:', error);
+        process.exitCode = 1;
+    } finally {
+        await connection.end();
+    }
+}
+
+if (require.main === module) {
+    main();
+}
+
+module.exports = {
+    createArchiveTable,
+    createArchiveSummaryTable,
+    archiveTransactions,
+    verifyArchive
+};''',
+
+    'pools.js': '''const mysql = require('mysql2/promise');
+
+// Separate MySQL pools for writes and reads. Writes (and logins) go to the
+// primary; the read pool serves list, search, export, sync and dashboard
+// reads and may point at a replica. Each pool fails requests that wait longer
+// than its queue timeout for a connection instead of queueing them forever.
+
+const RECENT_WRITE_COOKIE = 'finance_tracker_wrote';
+
+class PoolQueueTimeoutError extends Error {
+    constructor(name, timeoutMs) {
+        super(`Timed out after ${timeoutMs}ms waiting for a ${name} pool connection`);
+        this.name = 'PoolQueueTimeoutError';
+        this.code = 'POOL_QUEUE_TIMEOUT';
+    }
+}
+
+// A mysql2 promise pool whose connection requests give up after `queueTimeoutMs`
+// (0 waits indefinitely). execute() and query() acquire connections through
+// the same method, so the timeout covers them too. A connection that arrives
+// after its request gave up goes straight back to the pool.
+function createPool(config, { name, queueTimeoutMs = 0 }) {
+    const pool = mysql.createPool(config);
+    pool.name = name;
+    if (queueTimeoutMs <= 0) {
+        return pool;
+    }
+
+    const core = pool.pool;
+    const getConnection = core.getConnection;
+    core.getConnection = function (callback) {
+        let timedOut = false;
+        const timer = setTimeout(() => {
+            timedOut = true;
+            callback(new PoolQueueTimeoutError(name, queueTimeoutMs));
+        }, queueTimeoutMs);
+        return getConnection.call(this, (error, connection) => {
+            if (timedOut) {
+                if (connection) {
+                    connection.release();
+                }
+                return;
+            }
+            clearTimeout(timer);
+            callback(error, connection);
+        });
+    };
+    return pool;
+}
+
+// Read-your-writes for a replica. A mutation marks the client with a cookie
+// that lives `windowMs` (chosen to exceed the replica's usual lag), and that
+// client's reads go to the primary until it expires. The cookie works across
+// cluster workers but only covers the browser that wrote, so the user's last
+// write time is also kept in process: their other devices and tabs read from
+// the primary too while they hit this worker. Workers do not share that map.
+class ReadRouter {
+    constructor(readPool, writePool, { windowMs = 0 } = {}) {
+        this.readPool = readPool;
+        this.writePool = writePool;
+        this.windowMs = windowMs;
+        this.pattern = new RegExp(`(?:^|;\\\\s*)${RECENT_WRITE_COOKIE}=1(?:;|$)`);
+        // userId -> time the window ends, oldest first
+        this.recentWriters = new Map();
+    }
+
+    // Middleware: mark every authenticated mutation. The cookie is set before
+    // the route runs, so it goes out with the response even on errors.
+    markWrites() {
+        return (req, res, next) => {
+            if (this.windowMs > 0 && !['GET', 'HEAD', 'OPTIONS'].includes(req.method) && req.session && req.session.userId) {
+                res.cookie(RECENT_WRITE_COOKIE, '1', { maxAge: this.windowMs, httpOnly: true, sameSite: 'lax' });
+                this.recordWrite(req.session.userId);
+            }
+            next();
+        };
+    }
+
+    // Every window has the same length, so re-inserting keeps the map ordered
+    // by expiry and expired users can be dropped from the front
+    recordWrite(userId) {
+        const now = Date.now();
+        for (const [user, until] of this.recentWriters) {
+            if (until > now) {
+                break;
+            }
+            this.recentWriters.delete(user);
+        }
+        this.recentWriters.delete(userId);
+        this.recentWriters.set(userId, now + this.windowMs);
+    }
+
+    // The pool a read made for `req` should use. The choice is kept on the
+    // request, so the data_version behind its ETag and cache key comes from
+    // the same server as the body even if the window ends in between.
+    poolFor(req) {
+        if (!req.readPool) {
+            req.readPool = this.windowMs > 0 && this.wroteRecently(req) ? this.writePool : this.readPool;
+        }
+        return req.readPool;
+    }
+
+    wroteRecently(req) {
+        if (this.pattern.test(req.headers.cookie || '')) {
+            return true;
+        }
+        const until = req.session && this.recentWriters.get(req.session.userId);
+        return until > Date.now();
+    }
+}
+
+module.exports = {
+    createPool,
+    PoolQueueTimeoutError,
+    ReadRouter
+};'''
 }
 
 # Write all files
@@ -0,0 +1,119 @@
+// Compare authenticated request throughput for each SESSION_STORE mode.
+//
+//   node scripts/bench-sessions.js [requests] [concurrency] [path]
+//
+// Starts server.js once per mode on its own port (using the database settings
+// from .env), logs in as BENCH_USER / BENCH_PASSWORD (admin / password123 by
+// default) and replays the same authenticated GET with keep-alive connections.
+const { spawn } = require('child_process');
+const http = require('http');
+const path = require('path');
+require('dotenv').config();
+
+const MODES = ['mysql', 'cached', 'cookie'];
+const requests = parseInt(process.argv[2], 10) || 5000;
+const concurrency = parseInt(process.argv[3], 10) || 50;
+const targetPath = process.argv[4] || '/api/budgets';
+const agent = new http.Agent({ keepAlive: true, maxSockets: concurrency });
+
+function request(port, method, urlPath, { cookie, body } = {}) {
+    return new Promise((resolve, reject) => {
+        const req = http.request({
+            host: '127.0.0.1',
+            port,
+            method,
+            path: urlPath,
+            agent,
+            headers: {
+                'Content-Type': 'application/json',
+                ...(cookie ? { Cookie: cookie } : {})
+            }
+        }, (res) => {
+            res.resume();
+            res.on('end', () => resolve(res));
+        });
+        req.on('error', reject);
+        req.end(body ? JSON.stringify(body) : undefined);
+    });
+}
+
+function startServer(mode, port) {
+    return new Promise((resolve, reject) => {
+        const child = spawn(process.execPath, [path.join(__dirname, '..', 'server.js')], {
+            env: { ...process.env, PORT: String(port), SESSION_STORE: mode },
+            stdio: ['ignore', 'pipe', 'inherit']
+        });
+        child.stdout.on('data', (chunk) => {
+            if (chunk.toString().includes('Server running on port')) {
+                resolve(child);
+            }
+        });
+        child.on('exit', (code) => reject(new Error(`server (${mode}) exited with code ${code}`)));
+    });
+}
+
+async function benchmark(mode, port) {
+    const server = await startServer(mode, port);
+    try {
+        const login = await request(port, 'POST', '/api/auth/login', {
+            body: {
+                username: process.env.BENCH_USER || 'admin',
+                password: process.env.BENCH_PASSWORD || 'password123'
+            }
+        });
+        if (login.statusCode !== 200) {
+            throw new Error(`login failed with status ${login.statusCode}`);
+        }
+        const cookie = [].concat(login.headers['set-cookie'] || []).map(c => c.split(';')[0]).join('; ');
+
+        const run = async (total) => {
+            const latencies = [];
+            let next = 0;
+            let failures = 0;
+            const workerLoop = async () => {
+                while (next < total) {
+                    next++;
+                    const started = process.hrtime.bigint();
+                    const res = await request(port, 'GET', targetPath, { cookie });
+                    latencies.push(Number(process.hrtime.bigint() - started) / 1e6);
+                    if (res.statusCode !== 200) {
+                        failures++;
+                    }
+                }
+            };
+            const started = Date.now();
+            await Promise.all(Array.from({ length: concurrency }, workerLoop));
+            return { latencies, failures, elapsedMs: Date.now() - started };
+        };
+
+        await run(Math.min(500, requests)); // warm up pools and caches
+        const { latencies, failures, elapsedMs } = await run(requests);
+        latencies.sort((a, b) => a - b);
+        const percentile = (p) => latencies[Math.min(latencies.length - 1, Math.floor(p * latencies.length))];
+
+        return {
+            mode,
+            'req/s': Math.round(requests / (elapsedMs / 1000)),
+            'p50 ms': percentile(0.5).toFixed(2),
+            'p99 ms': percentile(0.99).toFixed(2),
+            failures
+        };
+    } finally {
+        server.kill();
+    }
+}
+
+async function main() {
+    console.log(`GET ${targetPath}: ${requests} requests, concurrency ${concurrency}`);
+    const results = [];
+    for (const [index, mode] of MODES.entries()) {
+        results.push(await benchmark(mode, 3900 + index));
+    }
+    console.table(results);
+    agent.destroy();
+}
+
+main().catch((error) => {
+    console.error('Benchmark error:', error);
+    process.exit(1);
+});
\ No newline at end of file
@@ -1,47 +1,201 @@
 const express = require('express');
-const mysql = require('mysql2/promise');
-const bcrypt = require('bcrypt');
 const session = require('express-session');
 const MySQLStore = require('express-mysql-session')(session);
 const cors = require('cors');
 const path = require('path');
+const os = require('os');
+const cluster = require('cluster');
+const { once } = require('events');
+const zlib = require('zlib');
+const { pipeline, Transform } = require('stream');
+const { applyRollupDelta, applyRollupDeltas } = require('./rollups');
+const { LATEST_SCHEMA_VERSION, getSchemaVersion, migrate } = require('./migrations');
+const { readCsvTransactions, readOfxTransactions } = require('./importer');
+const { MemoryCacheBackend, ResponseCache } = require('./cache');
+const { HashPool, LoginThrottle, getRounds } = require('./auth');
+const { createCookieSession, CachedSessionStore } = require('./sessions');
+const { MetricsRegistry, requestMetrics, instrumentPool, monitorEventLoop } = require('./metrics');
+const { createPool, ReadRouter } = require('./pools');
 require('dotenv').config();
 
 const app = express();
 const PORT = process.env.PORT || 3000;
 
+// Session backend: 'mysql' (default) stores sessions in the sessions table,
+// 'cached' puts a short-TTL read-through cache in front of that table, and
+// 'cookie' keeps the whole session in an encrypted cookie with no store at all.
+const SESSION_STORE = process.env.SESSION_STORE || 'mysql';
+
+// Cluster mode: CLUSTER_WORKERS > 1 (or 'auto' for one per CPU) makes this
+// process a primary that initializes the database once and forks the workers
+const CLUSTER_WORKERS = process.env.CLUSTER_WORKERS === 'auto'
+    ? os.cpus().length
+    : Math.max(1, parseInt(process.env.CLUSTER_WORKERS, 10) || 1);
+const WORKER_SHUTDOWN_TIMEOUT_MS = 30000;
+
+// Reads that can tolerate replication lag (lists, search, export, sync,
+// dashboard and trends) use a separate read pool, so long aggregate reads
+// cannot take every connection from logins and writes. DB_READ_HOST points
+// it at a replica; otherwise both pools connect to DB_HOST.
+const DB_READ_HOST = process.env.DB_READ_HOST || '';
+
+// Each worker opens its own pools, so in cluster mode DB_CONNECTION_BUDGET
+// (keep it below MySQL's max_connections) is divided between the workers.
+// Without a replica the read pool's share comes out of the same budget.
+function getPoolSizes() {
+    if (CLUSTER_WORKERS === 1) {
+        return {
+            write: parseInt(process.env.DB_WRITE_CONNECTIONS, 10) || 10,
+            read: parseInt(process.env.DB_READ_CONNECTIONS, 10) || 10,
+            session: 10
+        };
+    }
+
+    const budget = parseInt(process.env.DB_CONNECTION_BUDGET, 10) || 100;
+    const perWorker = Math.max(3, Math.floor(budget / CLUSTER_WORKERS));
+    const sessionConnections = SESSION_STORE === 'cookie' ? 0 : Math.max(1, Math.floor(perWorker / 5));
+    const primary = perWorker - sessionConnections;
+    if (DB_READ_HOST) {
+        return { write: primary, read: primary, session: sessionConnections };
+    }
+    const write = Math.max(1, Math.floor(primary / 2));
+    return { write, read: primary - write, session: sessionConnections };
+}
+const poolSizes = getPoolSizes();
+
 // Database configuration
 const dbConfig = {
     host: process.env.DB_HOST || 'localhost',
     user: process.env.DB_USER || 'root',
     password: process.env.DB_PASSWORD || '',
     database: process.env.DB_NAME || 'finance_tracker',
-    connectionLimit: 10,
-    acquireTimeout: 60000,
+    // Keep DATE/TIMESTAMP values as the strings MySQL returns so they
+    // round-trip exactly through pagination cursors
+    dateStrings: true,
     timeout: 60000
 };
 
-// Create MySQL connection pool
-const pool = mysql.createPool(dbConfig);
+// Requests that wait longer than the queue timeout for a connection fail
+// rather than piling up behind a saturated pool
+const pool = createPool({ ...dbConfig, connectionLimit: poolSizes.write }, {
+    name: 'write',
+    queueTimeoutMs: parseInt(process.env.DB_WRITE_QUEUE_TIMEOUT_MS, 10) || 5000
+});
+const readPool = createPool({ ...dbConfig, host: DB_READ_HOST || dbConfig.host, connectionLimit: poolSizes.read }, {
+    name: 'read',
+    queueTimeoutMs: parseInt(process.env.DB_READ_QUEUE_TIMEOUT_MS, 10) || 10000
+});
 
-// Session store
-const sessionStore = new MySQLStore({
-    ...dbConfig,
-    clearExpired: true,
-    checkExpirationInterval: 900000,
-    expiration: 86400000,
-    createDatabaseTable: true,
-    schema: {
-        tableName: 'sessions',
-        columnNames: {
-            session_id: 'session_id',
-            expires: 'expires',
-            data: 'data'
-        }
+// With a replica, a client's reads go to the primary for READ_YOUR_WRITES_MS
+// after each of its writes, until the replica has caught up
+const readRouter = new ReadRouter(readPool, pool, {
+    windowMs: DB_READ_HOST ? parseInt(process.env.READ_YOUR_WRITES_MS, 10) || 5000 : 0
+});
+
+// Metrics served at /metrics: request and query latency, pool usage and
+// event loop lag. Queries slower than SLOW_QUERY_MS are also logged.
+const metrics = new MetricsRegistry();
+const slowQueryMs = parseInt(process.env.SLOW_QUERY_MS, 10) || 200;
+instrumentPool(pool, metrics, { name: 'write', slowQueryMs });
+instrumentPool(readPool, metrics, { name: 'read', slowQueryMs });
+monitorEventLoop(metrics);
+
+// Per-user cache for dashboard and budget reads, keyed by the user's data_version
+const responseCache = new ResponseCache(
+    new MemoryCacheBackend({ maxEntries: parseInt(process.env.CACHE_MAX_ENTRIES, 10) || 5000 }),
+    {
+        ttlMs: parseInt(process.env.CACHE_TTL_MS, 10) || 60000,
+        enabled: process.env.CACHE_ENABLED !== 'false'
     }
+);
+
+// Password hashing on dedicated worker threads, and failed-login throttling
+const BCRYPT_ROUNDS = parseInt(process.env.BCRYPT_ROUNDS, 10) || 10;
+const MIGRATE_ON_START = process.env.MIGRATE_ON_START !== 'false';
+const hashPool = new HashPool({
+    size: parseInt(process.env.HASH_WORKERS, 10) || 2,
+    maxQueue: parseInt(process.env.HASH_MAX_QUEUE, 10) || 100
+});
+const loginThrottle = new LoginThrottle(pool, {
+    maxPerUsername: parseInt(process.env.LOGIN_MAX_FAILURES_PER_USER, 10) || 5,
+    maxPerIp: parseInt(process.env.LOGIN_MAX_FAILURES_PER_IP, 10) || 50
+});
+
+// Hash timings include the wait for a free hashing thread
+const hashDuration = metrics.histogram('password_hash_duration_seconds',
+    'bcrypt hash and compare latency, including queueing', ['op']);
+for (const op of ['hash', 'compare']) {
+    const run = hashPool[op].bind(hashPool);
+    hashPool[op] = (...args) => hashDuration.time({ op }, () => run(...args));
+}
+metrics.gauge('password_hash_pool', 'Password hashing pool state', ['state'], () => {
+    const { workers, active, queued } = hashPool.stats();
+    return [[{ state: 'workers' }, workers], [{ state: 'active' }, active], [{ state: 'queued' }, queued]];
+});
+metrics.gauge('response_cache_lookups', 'Response cache lookups since start', ['result'], () => {
+    const { hits, misses } = responseCache.stats();
+    return [[{ result: 'hit' }, hits], [{ result: 'miss' }, misses]];
 });
 
+// Session configuration. SESSION_SECRET may list several comma-separated
+// secrets, newest first.
+const SESSION_MAX_AGE = 86400000; // 24 hours
+const sessionSecrets = (process.env.SESSION_SECRET || 'your-secret-key-change-this')
+    .split(',')
+    .map(secret => secret.trim())
+    .filter(Boolean);
+let sessionStore = null;
+
+function createSessionMiddleware() {
+    if (SESSION_STORE === 'cookie') {
+        return createCookieSession({
+            name: 'finance_tracker_session',
+            secrets: sessionSecrets,
+            maxAge: SESSION_MAX_AGE,
+            secure: process.env.NODE_ENV === 'production'
+        });
+    }
+
+    sessionStore = new MySQLStore({
+        ...dbConfig,
+        connectionLimit: poolSizes.session,
+        clearExpired: true,
+        checkExpirationInterval: 900000,
+        expiration: SESSION_MAX_AGE,
+        // The sessions table is created by a migration
+        createDatabaseTable: false,
+        schema: {
+            tableName: 'sessions',
+            columnNames: {
+                session_id: 'session_id',
+                expires: 'expires',
+                data: 'data'
+            }
+        }
+    });
+    if (SESSION_STORE === 'cached') {
+        sessionStore = new CachedSessionStore(sessionStore, {
+            ttlMs: parseInt(process.env.SESSION_CACHE_TTL_MS, 10) || 5000
+        });
+    }
+
+    return session({
+        key: 'finance_tracker_session',
+        secret: sessionSecrets,
+        store: sessionStore,
+        resave: false,
+        saveUninitialized: false,
+        cookie: {
+            maxAge: SESSION_MAX_AGE,
+            httpOnly: true,
+            secure: process.env.NODE_ENV === 'production'
+        }
+    });
+}
+
 // Middleware
+app.use(requestMetrics(metrics));
+
 app.use(cors({
     origin: process.env.FRONTEND_URL || 'http://localhost:3000',
     credentials: true
@@ -52,18 +206,8 @@ app.use(express.urlencoded({ extended: true }));
 app.use(express.static(path.join(__dirname, 'public')));
 
 // Session configuration
-app.use(session({
-    key: 'finance_tracker_session',
-    secret: process.env.SESSION_SECRET || 'your-secret-key-change-this',
-    store: sessionStore,
-    resave: false,
-    saveUninitialized: false,
-    cookie: {
-        maxAge: 86400000, // 24 hours
-        httpOnly: true,
-        secure: process.env.NODE_ENV === 'production'
-    }
-}));
+app.use(createSessionMiddleware());
+app.use(readRouter.markWrites());
 
 // Authentication middleware
 const authenticateUser = (req, res, next) => {
@@ -74,59 +218,295 @@ const authenticateUser = (req, res, next) => {
     }
 };
 
-// Initialize database tables
-async function initializeDatabase() {
+// Conditional GETs. users.data_version changes on every write a user makes, so
+// it identifies the state of all their data. The ETag also carries the app
+// version (response formats may change between releases) and today's date
+// (routes default to the current month).
+const APP_VERSION = require('./package.json').version;
+
+const conditionalRead = async (req, res, next) => {
     try {
-        // Create users table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                email VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        `);
-
-        // Create transactions table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                description VARCHAR(255),
-                transaction_type ENUM('income', 'expense') NOT NULL,
-                date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-
-        // Create budgets table
-        await pool.execute(`
-            CREATE TABLE IF NOT EXISTS budgets (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                month CHAR(7) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_user_category_month (user_id, category, month),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        `);
-
-        // Create default admin user if not exists
-        const hashedPassword = await bcrypt.hash('password123', 10);
-        await pool.execute(`
-            INSERT IGNORE INTO users (username, password, email) 
-            VALUES (?, ?, ?)
-        `, ['admin', hashedPassword, 'admin@example.com']);
+        const [[user]] = await readRouter.poolFor(req).execute(
+            '/* data_version */ SELECT data_version FROM users WHERE id = ?',
+            [req.session.userId]
+        );
+        const today = new Date().toISOString().slice(0, 10);
+        // The same version keys the route's response cache entries
+        req.dataVersion = user ? user.data_version : 0;
+        res.set('ETag', `"${APP_VERSION}-${req.session.userId}-${req.dataVersion}-${today}"`);
+        // Browsers must revalidate on every use, never serve a stored copy blindly
+        res.set('Cache-Control', 'private, no-cache');
 
-        console.log('Database initialized successfully');
+        // Answer before any of the route's own queries run
+        if (req.fresh) {
+            return res.status(304).end();
+        }
+        next();
+    } catch (error) {
+        next(error);
+    }
+};
+
+// Take the user's next data version. Every write transaction calls this
+// first: the row lock on users serializes a user's writes (and always being
+// taken first keeps lock order consistent), so versions commit in order and
+// rows stamped with them as change_version can be synced by version.
+async function nextDataVersion(connection, userId) {
+    const [result] = await connection.execute(
+        'UPDATE users SET data_version = LAST_INSERT_ID(data_version + 1) WHERE id = ?',
+        [userId]
+    );
+    return result.insertId;
+}
+
+const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+// What DECIMAL(10,2) holds without rounding or overflowing
+const AMOUNT_PATTERN = /^\d{1,8}(\.\d{1,2})?$/;
+const MONTH_PATTERN = /^\d{4}-\d{2}$/;
+const TRANSACTION_TYPES = ['income', 'expense'];
+const DEFAULT_PAGE_SIZE = 50;
+const MAX_PAGE_SIZE = 200;
+const IMPORT_BATCH_SIZE = 1000;
+const MAX_IMPORT_ERRORS = 100; // row errors listed per response line
+const MAX_BATCH_OPERATIONS = 1000;
+const EXPORT_COLUMNS = ['id', 'date', 'transaction_type', 'category', 'amount', 'description', 'created_at'];
+const DEFAULT_SEARCH_LIMIT = 10;
+const MAX_SEARCH_LIMIT = 50;
+const MAX_SEARCH_OFFSET = 1000;
+const MAX_SEARCH_TERMS = 8;
+// Shorter prefixes are not sent to the FULLTEXT index (innodb_ft_min_token_size
+// defaults to 3), because they expand to most of its vocabulary
+const MIN_FULLTEXT_TERM_LENGTH = 3;
+const TREND_GRANULARITIES = { month: 10, week: 5 }; // maximum range in years
+const SYNC_PAGE_SIZE = 1000;
+const SYNC_TABLES = ['transactions', 'budgets'];
+const SYNC_ARCHIVE = 'transactions_archive'; // synced as part of `transactions`
+const TOMBSTONE_RETENTION_DAYS = parseInt(process.env.TOMBSTONE_RETENTION_DAYS, 10) || 30;
+const TOMBSTONE_PURGE_INTERVAL_MS = 60 * 60 * 1000;
+const TOMBSTONE_PURGE_BATCH_SIZE = 5000;
+const TOMBSTONE_PURGE_LOCK = 'finance_tracker_tombstone_purge';
+
+// Translate the list filters (type, category, from, to, min_amount, max_amount)
+// into WHERE clauses. Returns { error } when a filter value is invalid.
+function buildTransactionFilters(query, userId) {
+    const clauses = ['user_id = ?', 'deleted_at IS NULL'];
+    const params = [userId];
+    const { type, category, from, to, min_amount, max_amount } = query;
+
+    if (type) {
+        if (!TRANSACTION_TYPES.includes(type)) {
+            return { error: 'type must be income or expense' };
+        }
+        clauses.push('transaction_type = ?');
+        params.push(type);
+    }
+    if (category) {
+        clauses.push('category = ?');
+        params.push(category);
+    }
+    for (const [value, clause, name] of [[from, 'date >= ?', 'from'], [to, 'date <= ?', 'to']]) {
+        if (value) {
+            if (!DATE_PATTERN.test(value)) {
+                return { error: `${name} must be a YYYY-MM-DD date` };
+            }
+            clauses.push(clause);
+            params.push(value);
+        }
+    }
+    for (const [value, clause, name] of [[min_amount, 'amount >= ?', 'min_amount'], [max_amount, 'amount <= ?', 'max_amount']]) {
+        if (value !== undefined && value !== '') {
+            if (!Number.isFinite(Number(value))) {
+                return { error: `${name} must be a number` };
+            }
+            clauses.push(clause);
+            params.push(String(Number(value)));
+        }
+    }
+
+    return { clauses, params };
+}
+
+// Tables a read starting at `from` (or unbounded, without it) has to cover.
+// Closed years may have been moved to transactions_archive (see archive.js);
+// it is only queried when this user has archived years and the range is open
+// or reaches back into one of them.
+async function transactionTables(db, userId, from) {
+    const [[archived]] = await db.execute(
+        '/* archived_through */ SELECT MAX(year) AS year FROM transaction_archive_years WHERE user_id = ?',
+        [userId]
+    );
+    return archived.year !== null && (!from || Number(from.slice(0, 4)) <= archived.year)
+        ? ['transactions', 'transactions_archive']
+        : ['transactions'];
+}
+
+// Run `select(table)` over each table and merge the results with UNION ALL.
+// `tail` (ORDER BY / LIMIT) applies inside every branch, so each can stop
+// early, and again to the merged rows.
+function acrossTables(tables, select, params, tail = '') {
+    if (tables.length === 1) {
+        return { sql: `${select(tables[0])} ${tail}`, params };
+    }
+    return {
+        sql: `${tables.map(table => `(${select(table)} ${tail})`).join(' UNION ALL ')} ${tail}`,
+        params: tables.flatMap(() => params)
+    };
+}
+
+// Amounts are stored as DECIMAL(10,2) and summed into the rollup in cents, so
+// anything MySQL would round or reject must be refused before the write
+function isValidAmount(amount) {
+    return AMOUNT_PATTERN.test(String(amount)) && Number(amount) > 0;
+}
+
+// Shared validation for the transaction write routes. Returns an error message or null.
+function validateTransaction({ amount, category, description, transaction_type, date }) {
+    if (!amount || !category || !transaction_type || !date) {
+        return 'Missing required fields';
+    }
+    if (!isValidAmount(amount)) {
+        return 'amount must be a positive number below 100000000 with at most 2 decimals';
+    }
+    if (!TRANSACTION_TYPES.includes(transaction_type)) {
+        return 'transaction_type must be income or expense';
+    }
+    if (!DATE_PATTERN.test(date)) {
+        return 'date must be a YYYY-MM-DD date';
+    }
+    if (String(category).length > 50 || String(description || '').length > 255) {
+        return 'category or description is too long';
+    }
+    return null;
+}
+
+// Build a write route's response from the values just written, formatted the
+// way mysql2 returns them, instead of reading the row back
+function transactionResponse(row, { amount, category, description, transaction_type, date }) {
+    return {
+        ...row,
+        amount: Number(amount).toFixed(2),
+        category,
+        description: description || '',
+        transaction_type,
+        date
+    };
+}
+
+// Run `work` with a pooled connection inside a database transaction
+async function withTransaction(work) {
+    const connection = await pool.getConnection();
+    try {
+        await connection.beginTransaction();
+        const result = await work(connection);
+        await connection.commit();
+        return result;
     } catch (error) {
-        console.error('Database initialization error:', error);
+        await connection.rollback();
+        throw error;
+    } finally {
+        connection.release();
+    }
+}
+
+function toCsvLine(values) {
+    return values.map(value => {
+        const text = value === null || value === undefined ? '' : String(value);
+        return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+    }).join(',') + '\n';
+}
+
+// Pagination cursors are the (date, created_at, id) of the last row of a page
+function encodeCursor(row) {
+    return Buffer.from(JSON.stringify([row.date, row.created_at, row.id])).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+    try {
+        const values = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+        if (Array.isArray(values) && values.length === 3 && DATE_PATTERN.test(values[0]) &&
+            typeof values[1] === 'string' && Number.isInteger(values[2])) {
+            return values;
+        }
+    } catch (error) {
+        // Fall through to the invalid cursor result
+    }
+    return null;
+}
+
+// Sync cursors hold, per table, the (change_version, id) of the last row sent,
+// plus when the cursor was issued so ones older than the tombstone retention
+// can be refused
+function encodeSyncCursor(positions, issuedAt) {
+    return Buffer.from(JSON.stringify({ ...positions, at: issuedAt })).toString('base64url');
+}
+
+function decodeSyncCursor(cursor) {
+    try {
+        const value = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+        const isPosition = position => Array.isArray(position) && position.length === 2 &&
+            position.every(Number.isInteger);
+        if (value && SYNC_TABLES.every(table => isPosition(value[table])) && Number.isInteger(value.at)) {
+            // Cursors issued before archived rows were synced start that stream over
+            if (!isPosition(value[SYNC_ARCHIVE])) {
+                value[SYNC_ARCHIVE] = [0, 0];
+            }
+            return value;
+        }
+    } catch (error) {
+        // Fall through to the invalid cursor result
+    }
+    return null;
+}
+
+// Hard-delete tombstones past the retention period, in small batches so no
+// single statement holds locks for long. Every worker (and every server)
+// schedules this; a named lock lets only one of them run it at a time, and
+// the others skip that round.
+async function purgeTombstones() {
+    const connection = await pool.getConnection();
+    try {
+        const [[lock]] = await connection.execute('SELECT GET_LOCK(?, 0) AS acquired', [TOMBSTONE_PURGE_LOCK]);
+        if (lock.acquired !== 1) {
+            return;
+        }
+        try {
+            for (const table of SYNC_TABLES) {
+                let purged;
+                do {
+                    [{ affectedRows: purged }] = await connection.execute(
+                        `DELETE FROM ${table} WHERE deleted_at < NOW() - INTERVAL ? DAY LIMIT ${TOMBSTONE_PURGE_BATCH_SIZE}`,
+                        [TOMBSTONE_RETENTION_DAYS]
+                    );
+                } while (purged === TOMBSTONE_PURGE_BATCH_SIZE);
+            }
+        } finally {
+            await connection.execute('SELECT RELEASE_LOCK(?)', [TOMBSTONE_PURGE_LOCK]);
+        }
+    } finally {
+        connection.release();
+    }
+}
+
+// Schema changes live in migrations.js. On an up-to-date database startup is a
+// single read of schema_migrations; pending migrations are applied here unless
+// MIGRATE_ON_START=false, in which case `npm run migrate` must be run first
+// (for example as a deploy step). Migrations that block writes are never
+// applied at startup, so those always need `npm run migrate`.
+async function initializeDatabase() {
+    const version = await getSchemaVersion(pool);
+    if (version >= LATEST_SCHEMA_VERSION) {
+        return;
+    }
+    if (!MIGRATE_ON_START) {
+        throw new Error(`Database schema is at version ${version}, expected ${LATEST_SCHEMA_VERSION}; run npm run migrate`);
+    }
+
+    const connection = await pool.getConnection();
+    try {
+        await migrate(connection, { hashPassword: password => hashPool.hash(password, BCRYPT_ROUNDS) });
+        console.log('Database initialized successfully');
+    } finally {
+        connection.release();
     }
 }
 
@@ -141,22 +521,40 @@ app.post('/api/auth/login', async (req, res) => {
             return res.status(400).json({ error: 'Username and password are required' });
         }
 
+        // Refuse throttled callers before looking up the user or hashing
+        const retryAfter = await loginThrottle.retryAfter(username, req.ip);
+        if (retryAfter > 0) {
+            res.set('Retry-After', String(Math.ceil(retryAfter / 1000)));
+            return res.status(429).json({ error: 'Too many failed login attempts' });
+        }
+
         const [users] = await pool.execute(
             'SELECT * FROM users WHERE username = ?',
             [username]
         );
 
         if (users.length === 0) {
+            await loginThrottle.recordFailure(username, req.ip);
             return res.status(401).json({ error: 'Invalid credentials' });
         }
 
         const user = users[0];
-        const isValidPassword = await bcrypt.compare(password, user.password);
+        const isValidPassword = await hashPool.compare(password, user.password);
 
         if (!isValidPassword) {
+            await loginThrottle.recordFailure(username, req.ip);
             return res.status(401).json({ error: 'Invalid credentials' });
         }
 
+        await loginThrottle.recordSuccess(username);
+
+        // Upgrade hashes made with a different cost factor while the plaintext is at hand
+        if (getRounds(user.password) !== BCRYPT_ROUNDS) {
+            hashPool.hash(password, BCRYPT_ROUNDS)
+                .then(hash => pool.execute('UPDATE users SET password = ? WHERE id = ?', [hash, user.id]))
+                .catch(error => console.error('Password rehash error:', error));
+        }
+
         req.session.userId = user.id;
         req.session.username = user.username;
 
@@ -169,6 +567,10 @@ app.post('/api/auth/login', async (req, res) => {
             }
         });
     } catch (error) {
+        if (error.code === 'HASH_QUEUE_FULL') {
+            res.set('Retry-After', '1');
+            return res.status(503).json({ error: 'Server busy, please retry' });
+        }
         console.error('Login error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
@@ -184,66 +586,533 @@ app.post('/api/auth/logout', (req, res) => {
 });
 
 // Transaction routes
-app.get('/api/transactions', authenticateUser, async (req, res) => {
+app.get('/api/transactions', authenticateUser, conditionalRead, async (req, res) => {
     try {
-        const [transactions] = await pool.execute(
-            'SELECT * FROM transactions WHERE user_id = ? ORDER BY date DESC, created_at DESC',
-            [req.session.userId]
-        );
+        const limit = req.query.limit === undefined ? DEFAULT_PAGE_SIZE : parseInt(req.query.limit, 10);
+        if (!Number.isInteger(limit) || limit < 1 || limit > MAX_PAGE_SIZE) {
+            return res.status(400).json({ error: `limit must be between 1 and ${MAX_PAGE_SIZE}` });
+        }
+
+        const filters = buildTransactionFilters(req.query, req.session.userId);
+        if (filters.error) {
+            return res.status(400).json({ error: filters.error });
+        }
+        const { clauses, params } = filters;
+
+        // Keyset pagination: continue strictly after the last row of the previous page
+        if (req.query.cursor) {
+            const cursor = decodeCursor(req.query.cursor);
+            if (!cursor) {
+                return res.status(400).json({ error: 'Invalid cursor' });
+            }
+            const [date, createdAt, id] = cursor;
+            clauses.push('(date < ? OR (date = ? AND (created_at < ? OR (created_at = ? AND id < ?))))');
+            params.push(date, date, createdAt, createdAt, id);
+        }
+
+        // Fetch one extra row to learn whether another page exists
+        const db = readRouter.poolFor(req);
+        const tables = await transactionTables(db, req.session.userId, req.query.from);
+        // Archived rows are flagged so clients can offer them read-only
+        const query = acrossTables(tables,
+            table => `SELECT *, ${table === 'transactions_archive' ? 1 : 0} AS archived FROM ${table} WHERE ${clauses.join(' AND ')}`,
+            params,
+            `ORDER BY date DESC, created_at DESC, id DESC LIMIT ${limit + 1}`);
+        const [rows] = await db.execute(query.sql, query.params);
 
-        res.json(transactions);
+        const transactions = rows.slice(0, limit);
+        const nextCursor = rows.length > limit ? encodeCursor(transactions[transactions.length - 1]) : null;
+
+        res.json({ transactions, nextCursor });
     } catch (error) {
         console.error('Get transactions error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Export: rows are streamed from a dedicated connection through a formatter
+// (and gzip when the client accepts it) straight into the response, so memory
+// use does not depend on the size of the export. pipeline() propagates
+// backpressure from the socket back to the MySQL result stream.
+app.get('/api/transactions/export', authenticateUser, async (req, res) => {
+    const format = req.query.format || 'csv';
+    if (!['csv', 'ndjson'].includes(format)) {
+        return res.status(400).json({ error: 'format must be csv or ndjson' });
+    }
+
+    const filters = buildTransactionFilters(req.query, req.session.userId);
+    if (filters.error) {
+        return res.status(400).json({ error: filters.error });
+    }
+
+    let connection;
+    let query;
+    try {
+        const db = readRouter.poolFor(req);
+        const tables = await transactionTables(db, req.session.userId, req.query.from);
+        query = acrossTables(tables,
+            table => `SELECT ${EXPORT_COLUMNS.join(', ')} FROM ${table} WHERE ${filters.clauses.join(' AND ')}`,
+            filters.params,
+            'ORDER BY date DESC, created_at DESC, id DESC');
+        connection = await db.getConnection();
+    } catch (error) {
+        console.error('Export transactions error:', error);
+        return res.status(500).json({ error: 'Internal server error' });
+    }
+
+    const gzip = req.acceptsEncodings('gzip') === 'gzip';
+    res.set({
+        'Content-Type': format === 'csv' ? 'text/csv; charset=utf-8' : 'application/x-ndjson',
+        'Content-Disposition': `attachment; filename="transactions.${format}"`
+    });
+    if (gzip) {
+        res.set('Content-Encoding', 'gzip');
+    }
+
+    const rows = connection.connection.query(query.sql, query.params).stream({ highWaterMark: 500 });
+
+    let headerWritten = false;
+    const formatter = new Transform({
+        writableObjectMode: true,
+        transform(row, encoding, callback) {
+            if (format === 'ndjson') {
+                return callback(null, JSON.stringify(row) + '\n');
+            }
+            const line = toCsvLine(EXPORT_COLUMNS.map(column => row[column]));
+            if (!headerWritten) {
+                headerWritten = true;
+                return callback(null, toCsvLine(EXPORT_COLUMNS) + line);
+            }
+            callback(null, line);
+        },
+        flush(callback) {
+            // An empty CSV export still gets its header row
+            callback(null, format === 'csv' && !headerWritten ? toCsvLine(EXPORT_COLUMNS) : undefined);
+        }
+    });
+
+    const stages = gzip ? [rows, formatter, zlib.createGzip(), res] : [rows, formatter, res];
+    pipeline(...stages, (error) => {
+        if (error) {
+            // The result set may not have been fully read, so the connection cannot be reused
+            console.error('Export transactions error:', error);
+            connection.destroy();
+        } else {
+            connection.release();
+        }
+    });
+});
+
+// Ranked search over descriptions and categories. Every word of `q` must
+// match as a prefix ("ama" finds "Amazon"). The FULLTEXT index is not scoped
+// per user: boolean mode reads each `+` term's posting list across all users
+// (a `term*` prefix first expands to every matching word) and intersects them,
+// with the required usr<id> token only removing other users' rows. So only
+// words of at least MIN_FULLTEXT_TERM_LENGTH go to MATCH. Shorter ones, typed
+// early in a typeahead, are matched as word prefixes with LIKE on rows the
+// other terms already narrowed down. A query with no long word skips the
+// FULLTEXT index altogether and walks this user's live rows by date, newest
+// first, with relevance 0. Accepts the list's type, category, from and to
+// filters; pages with an opaque offset cursor. Only the hot table is searched:
+// transactions_archive has no FULLTEXT index, so archived years never match.
+app.get('/api/transactions/search', authenticateUser, conditionalRead, async (req, res) => {
+    try {
+        const terms = (String(req.query.q || '').toLowerCase().match(/[\p{L}\p{N}]+/gu) || [])
+            .slice(0, MAX_SEARCH_TERMS);
+        if (terms.length === 0) {
+            return res.status(400).json({ error: 'q must contain at least one word' });
+        }
+        const limit = req.query.limit === undefined ? DEFAULT_SEARCH_LIMIT : parseInt(req.query.limit, 10);
+        if (!Number.isInteger(limit) || limit < 1 || limit > MAX_SEARCH_LIMIT) {
+            return res.status(400).json({ error: `limit must be between 1 and ${MAX_SEARCH_LIMIT}` });
+        }
+        const offset = req.query.cursor
+            ? parseInt(Buffer.from(String(req.query.cursor), 'base64url').toString('utf8'), 10)
+            : 0;
+        if (!Number.isInteger(offset) || offset < 0 || offset > MAX_SEARCH_OFFSET) {
+            return res.status(400).json({ error: 'Invalid cursor' });
+        }
+
+        const filters = buildTransactionFilters(req.query, req.session.userId);
+        if (filters.error) {
+            return res.status(400).json({ error: filters.error });
+        }
+        const longTerms = terms.filter(term => term.length >= MIN_FULLTEXT_TERM_LENGTH);
+        // Terms are letters and digits only, so they need no LIKE escaping
+        const shortTerms = terms.filter(term => term.length < MIN_FULLTEXT_TERM_LENGTH);
+        const clauses = [...filters.clauses, ...shortTerms.map(() => "search_text LIKE CONCAT('% ', ?, '%')")];
+        const params = [...filters.params, ...shortTerms];
+
+        let rows;
+        if (longTerms.length > 0) {
+            const match = [`+usr${req.session.userId}`, ...longTerms.map(term => `+${term}*`)].join(' ');
+            [rows] = await readRouter.poolFor(req).execute(`
+                /* transaction_search */
+                SELECT *, MATCH(search_text) AGAINST (? IN BOOLEAN MODE) AS relevance
+                FROM transactions
+                WHERE MATCH(search_text) AGAINST (? IN BOOLEAN MODE) AND ${clauses.join(' AND ')}
+                ORDER BY relevance DESC, date DESC, id DESC
+                LIMIT ${limit + 1} OFFSET ${offset}
+            `, [match, match, ...params]);
+        } else {
+            [rows] = await readRouter.poolFor(req).execute(`
+                /* transaction_search_prefix */
+                SELECT *, 0 AS relevance
+                FROM transactions
+                WHERE ${clauses.join(' AND ')}
+                ORDER BY date DESC, id DESC
+                LIMIT ${limit + 1} OFFSET ${offset}
+            `, params);
+        }
+
+        const transactions = rows.slice(0, limit);
+        const nextOffset = offset + limit;
+        const nextCursor = rows.length > limit && nextOffset <= MAX_SEARCH_OFFSET
+            ? Buffer.from(String(nextOffset)).toString('base64url')
+            : null;
+
+        res.json({ transactions, nextCursor });
+    } catch (error) {
+        console.error('Search transactions error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 app.post('/api/transactions', authenticateUser, async (req, res) => {
     try {
         const { amount, category, description, transaction_type, date } = req.body;
 
-        if (!amount || !category || !transaction_type || !date) {
-            return res.status(400).json({ error: 'Missing required fields' });
+        const validationError = validateTransaction(req.body);
+        if (validationError) {
+            return res.status(400).json({ error: validationError });
         }
 
-        const [result] = await pool.execute(`
-            INSERT INTO transactions (user_id, amount, category, description, transaction_type, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        `, [req.session.userId, amount, category, description || '', transaction_type, date]);
+        const newTransaction = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [result] = await connection.execute(`
+                INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            `, [req.session.userId, amount, category, description || '', transaction_type, date, version]);
 
-        const [newTransaction] = await pool.execute(
-            'SELECT * FROM transactions WHERE id = ?',
-            [result.insertId]
-        );
+            await applyRollupDelta(connection, req.session.userId, { amount, category, transaction_type, date }, 1);
+
+            // Only ?return=full pays for a read-back, to pick up DB-generated columns
+            if (req.query.return === 'full') {
+                const [rows] = await connection.execute('SELECT * FROM transactions WHERE id = ?', [result.insertId]);
+                return rows[0];
+            }
+            return transactionResponse({ id: result.insertId, user_id: req.session.userId }, req.body);
+        });
 
-        res.status(201).json(newTransaction[0]);
+        res.status(201).json(newTransaction);
     } catch (error) {
         console.error('Add transaction error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Bulk import: the request body is a raw CSV or OFX file, parsed as it streams in.
+// Valid rows are written IMPORT_BATCH_SIZE at a time, each batch in its own
+// database transaction. The response is NDJSON: one progress line per committed
+// batch (with the row errors seen since the previous line), then a summary line.
+app.post('/api/transactions/import', authenticateUser, async (req, res) => {
+    const userId = req.session.userId;
+    const format = req.query.format || (req.is('application/x-ofx', 'application/ofx') ? 'ofx' : 'csv');
+
+    if (!['csv', 'ofx'].includes(format)) {
+        return res.status(400).json({ error: 'format must be csv or ofx' });
+    }
+
+    req.setEncoding('utf8');
+    const records = format === 'ofx'
+        ? readOfxTransactions(req, { defaultCategory: req.query.category || 'Other' })
+        : readCsvTransactions(req);
+
+    const summary = { rows: 0, imported: 0, failed: 0 };
+    let errors = [];
+    let batch = [];
+
+    const writeLine = (line) => res.write(JSON.stringify(line) + '\n');
+
+    const flush = async () => {
+        const rows = batch;
+        batch = [];
+        await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, userId);
+            await connection.query(`
+                INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                VALUES ?
+            `, [rows.map(t => [userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version])]);
+            await applyRollupDeltas(connection, userId, rows, 1);
+        });
+        summary.imported += rows.length;
+        writeLine({ progress: summary, errors });
+        errors = [];
+    };
+
+    res.status(200).type('application/x-ndjson');
+
+    try {
+        for await (const { row, transaction } of records) {
+            summary.rows++;
+            const validationError = validateTransaction(transaction);
+            if (validationError) {
+                summary.failed++;
+                // A file of nothing but bad rows never flushes, so the list is capped
+                if (errors.length < MAX_IMPORT_ERRORS) {
+                    errors.push({ row, error: validationError });
+                }
+                continue;
+            }
+
+            batch.push(transaction);
+            if (batch.length >= IMPORT_BATCH_SIZE) {
+                await flush();
+            }
+        }
+        if (batch.length > 0) {
+            await flush();
+        }
+
+        writeLine({ done: true, ...summary, errors });
+    } catch (error) {
+        console.error('Import transactions error:', error);
+        writeLine({ done: false, error: 'Import aborted; earlier batches were committed', ...summary, errors });
+    }
+    res.end();
+});
+
+// Batch mutations: { operations: [{ op: 'create', data }, { op: 'update', id, data },
+// { op: 'delete', id }], atomic }. All operations run in one database transaction
+// using one multi-row statement per kind. With atomic (the default) any failing
+// item rolls back the whole batch; with atomic: false the failing items are
+// skipped and the rest are applied. Every item gets its own status in `results`.
+app.post('/api/transactions/batch', authenticateUser, async (req, res) => {
+    const userId = req.session.userId;
+    const { operations, atomic = true } = req.body;
+
+    if (!Array.isArray(operations) || operations.length === 0 || operations.length > MAX_BATCH_OPERATIONS) {
+        return res.status(400).json({ error: `operations must be an array of 1 to ${MAX_BATCH_OPERATIONS} items` });
+    }
+    if (typeof atomic !== 'boolean') {
+        return res.status(400).json({ error: 'atomic must be true or false' });
+    }
+
+    // Validate every item up front
+    const results = operations.map((operation, index) => ({ index, op: operation && operation.op }));
+    const creates = [];
+    const changes = [];
+    const targetIds = new Set();
+
+    operations.forEach((operation, index) => {
+        const result = results[index];
+        if (!operation || !['create', 'update', 'delete'].includes(operation.op)) {
+            Object.assign(result, { status: 400, error: 'op must be create, update or delete' });
+            return;
+        }
+        if (operation.op !== 'delete') {
+            const validationError = validateTransaction(operation.data || {});
+            if (validationError) {
+                Object.assign(result, { status: 400, error: validationError });
+                return;
+            }
+        }
+        if (operation.op === 'create') {
+            creates.push(index);
+            return;
+        }
+
+        const id = Number(operation.id);
+        if (!Number.isInteger(id) || id < 1) {
+            Object.assign(result, { status: 400, error: 'id must be a positive integer' });
+        } else if (targetIds.has(id)) {
+            Object.assign(result, { status: 400, error: 'id appears more than once in the batch' });
+        } else {
+            targetIds.add(id);
+            result.id = id;
+            changes.push(index);
+        }
+    });
+
+    const hasInvalid = () => results.some(result => result.status >= 400);
+    const rejectBatch = () => {
+        results.filter(result => !result.status).forEach(result => {
+            Object.assign(result, { status: 409, error: 'Not applied because another operation failed' });
+        });
+        res.status(400).json({ applied: false, results });
+    };
+    if (atomic && hasInvalid()) {
+        return rejectBatch();
+    }
+    // Every item failed validation: no transaction, and no data_version bump
+    if (creates.length === 0 && changes.length === 0) {
+        return res.status(400).json({ applied: false, results });
+    }
+
+    try {
+        await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, userId);
+
+            // Lock every row being updated or deleted; their old values leave the rollup
+            const existing = new Map();
+            if (changes.length > 0) {
+                const [rows] = await connection.query(
+                    'SELECT * FROM transactions WHERE user_id = ? AND id IN (?) AND deleted_at IS NULL FOR UPDATE',
+                    [userId, changes.map(index => results[index].id)]
+                );
+                rows.forEach(row => existing.set(row.id, row));
+            }
+
+            const updates = [];
+            const deletes = [];
+            changes.forEach(index => {
+                if (!existing.has(results[index].id)) {
+                    Object.assign(results[index], { status: 404, error: 'Transaction not found' });
+                } else if (operations[index].op === 'update') {
+                    updates.push(index);
+                } else {
+                    deletes.push(index);
+                }
+            });
+
+            if (atomic && hasInvalid()) {
+                throw Object.assign(new Error('Batch rejected'), { batchRejected: true });
+            }
+            // Nothing left to write (every update or delete target was missing):
+            // roll back so the data_version bump does not invalidate anything
+            if (creates.length === 0 && updates.length === 0 && deletes.length === 0) {
+                throw Object.assign(new Error('Nothing to apply'), { nothingApplied: true });
+            }
+
+            if (creates.length > 0) {
+                await connection.query(`
+                    INSERT INTO transactions (user_id, amount, category, description, transaction_type, date, change_version)
+                    VALUES ?
+                `, [creates.map(index => {
+                    const t = operations[index].data;
+                    return [userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version];
+                })]);
+
+                // Read the new ids back rather than assuming insertId + offset, which
+                // fails when auto_increment_increment > 1. Nothing else of this
+                // user's carries this version yet, and ids ascend in VALUES order.
+                const [inserted] = await connection.execute(
+                    'SELECT id FROM transactions WHERE user_id = ? AND change_version = ? ORDER BY id',
+                    [userId, version]
+                );
+                creates.forEach((index, offset) => {
+                    const id = inserted[offset].id;
+                    Object.assign(results[index], {
+                        status: 201,
+                        id,
+                        transaction: transactionResponse({ id, user_id: userId }, operations[index].data)
+                    });
+                });
+            }
+
+            if (updates.length > 0) {
+                // Every target row exists and is locked, so this upsert always takes the UPDATE path
+                await connection.query(`
+                    INSERT INTO transactions (id, user_id, amount, category, description, transaction_type, date, change_version)
+                    VALUES ?
+                    ON DUPLICATE KEY UPDATE
+                        amount = VALUES(amount),
+                        category = VALUES(category),
+                        description = VALUES(description),
+                        transaction_type = VALUES(transaction_type),
+                        date = VALUES(date),
+                        change_version = VALUES(change_version)
+                `, [updates.map(index => {
+                    const t = operations[index].data;
+                    return [results[index].id, userId, t.amount, t.category, t.description || '', t.transaction_type, t.date, version];
+                })]);
+
+                updates.forEach(index => {
+                    Object.assign(results[index], {
+                        status: 200,
+                        transaction: transactionResponse(existing.get(results[index].id), operations[index].data)
+                    });
+                });
+            }
+
+            if (deletes.length > 0) {
+                // Soft delete: the tombstones are what /api/sync reports
+                await connection.query(
+                    'UPDATE transactions SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE user_id = ? AND id IN (?)',
+                    [version, userId, deletes.map(index => results[index].id)]
+                );
+                deletes.forEach(index => { results[index].status = 200; });
+            }
+
+            const changedRows = [...updates, ...deletes].map(index => existing.get(results[index].id));
+            await applyRollupDeltas(connection, userId, changedRows, -1);
+            await applyRollupDeltas(connection, userId, [...creates, ...updates].map(index => operations[index].data), 1);
+        });
+
+        res.json({ applied: true, results });
+    } catch (error) {
+        if (error.batchRejected) {
+            return rejectBatch();
+        }
+        if (error.nothingApplied) {
+            return res.status(400).json({ applied: false, results });
+        }
+        console.error('Batch transactions error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Answer a write to a transaction the hot table does not have: 409 when it
+// was moved to the archive, which is read-only, otherwise 404
+async function sendMissingTransaction(res, userId, id) {
+    const [archived] = await pool.execute(
+        'SELECT 1 FROM transactions_archive WHERE id = ? AND user_id = ?',
+        [id, userId]
+    );
+    return archived.length > 0
+        ? res.status(409).json({ error: 'Archived transactions are read-only' })
+        : res.status(404).json({ error: 'Transaction not found' });
+}
+
 app.put('/api/transactions/:id', authenticateUser, async (req, res) => {
     try {
         const { id } = req.params;
         const { amount, category, description, transaction_type, date } = req.body;
 
-        const [result] = await pool.execute(`
-            UPDATE transactions 
-            SET amount = ?, category = ?, description = ?, transaction_type = ?, date = ?
-            WHERE id = ? AND user_id = ?
-        `, [amount, category, description || '', transaction_type, date, id, req.session.userId]);
-
-        if (result.affectedRows === 0) {
-            return res.status(404).json({ error: 'Transaction not found' });
+        const validationError = validateTransaction(req.body);
+        if (validationError) {
+            return res.status(400).json({ error: validationError });
         }
 
-        const [updatedTransaction] = await pool.execute(
-            'SELECT * FROM transactions WHERE id = ?',
-            [id]
-        );
+        const updatedTransaction = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+
+            // Lock the current row so its old values can be taken out of the rollup;
+            // the same read supplies the columns the response needs
+            const [existing] = await connection.execute(
+                'SELECT * FROM transactions WHERE id = ? AND user_id = ? AND deleted_at IS NULL FOR UPDATE',
+                [id, req.session.userId]
+            );
+            if (existing.length === 0) {
+                return null;
+            }
+
+            await connection.execute(`
+                UPDATE transactions 
+                SET amount = ?, category = ?, description = ?, transaction_type = ?, date = ?, change_version = ?
+                WHERE id = ? AND user_id = ?
+            `, [amount, category, description || '', transaction_type, date, version, id, req.session.userId]);
 
-        res.json(updatedTransaction[0]);
+            await applyRollupDelta(connection, req.session.userId, existing[0], -1);
+            await applyRollupDelta(connection, req.session.userId, { amount, category, transaction_type, date }, 1);
+            return transactionResponse(existing[0], req.body);
+        });
+
+        if (!updatedTransaction) {
+            return sendMissingTransaction(res, req.session.userId, id);
+        }
+
+        res.json(updatedTransaction);
     } catch (error) {
         console.error('Update transaction error:', error);
         res.status(500).json({ error: 'Internal server error' });
@@ -254,13 +1123,28 @@ app.delete('/api/transactions/:id', authenticateUser, async (req, res) => {
     try {
         const { id } = req.params;
 
-        const [result] = await pool.execute(
-            'DELETE FROM transactions WHERE id = ? AND user_id = ?',
-            [id, req.session.userId]
-        );
+        const deleted = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [existing] = await connection.execute(
+                'SELECT amount, category, transaction_type, date FROM transactions WHERE id = ? AND user_id = ? AND deleted_at IS NULL FOR UPDATE',
+                [id, req.session.userId]
+            );
+            if (existing.length === 0) {
+                return false;
+            }
 
-        if (result.affectedRows === 0) {
-            return res.status(404).json({ error: 'Transaction not found' });
+            // Keep a tombstone so clients learn about the delete through /api/sync
+            await connection.execute(
+                'UPDATE transactions SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE id = ? AND user_id = ?',
+                [version, id, req.session.userId]
+            );
+
+            await applyRollupDelta(connection, req.session.userId, existing[0], -1);
+            return true;
+        });
+
+        if (!deleted) {
+            return sendMissingTransaction(res, req.session.userId, id);
         }
 
         res.json({ success: true });
@@ -271,16 +1155,20 @@ app.delete('/api/transactions/:id', authenticateUser, async (req, res) => {
 });
 
 // Budget routes
-app.get('/api/budgets', authenticateUser, async (req, res) => {
+app.get('/api/budgets', authenticateUser, conditionalRead, async (req, res) => {
     try {
         const { month } = req.query;
         const currentMonth = month || new Date().toISOString().slice(0, 7);
 
-        const [budgets] = await pool.execute(
-            'SELECT * FROM budgets WHERE user_id = ? AND month = ?',
-            [req.session.userId, currentMonth]
-        );
+        const { value: budgets, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `budgets:${currentMonth}`, async () => {
+            const [rows] = await readRouter.poolFor(req).execute(
+                'SELECT * FROM budgets WHERE user_id = ? AND month = ? AND deleted_at IS NULL',
+                [req.session.userId, currentMonth]
+            );
+            return rows;
+        });
 
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
         res.json(budgets);
     } catch (error) {
         console.error('Get budgets error:', error);
@@ -288,6 +1176,59 @@ app.get('/api/budgets', authenticateUser, async (req, res) => {
     }
 });
 
+// Budgets for a month with their actual spending. Each budget joins to its
+// rollup row by primary key, so nothing is aggregated per request.
+app.get('/api/budgets/overview', authenticateUser, conditionalRead, async (req, res) => {
+    try {
+        const month = req.query.month || new Date().toISOString().slice(0, 7);
+        if (!MONTH_PATTERN.test(month)) {
+            return res.status(400).json({ error: 'month must be YYYY-MM' });
+        }
+
+        const { value: overview, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `budget-overview:${month}`, async () => {
+            const [budgets] = await readRouter.poolFor(req).execute(`
+                /* budget_overview */
+                SELECT
+                    b.id,
+                    b.category,
+                    b.amount,
+                    COALESCE(t.total, 0) AS spent,
+                    b.amount - COALESCE(t.total, 0) AS remaining,
+                    ROUND(COALESCE(t.total, 0) / NULLIF(b.amount, 0) * 100, 1) AS percent_used
+                FROM budgets b
+                LEFT JOIN monthly_category_totals t
+                    ON t.user_id = b.user_id
+                    AND t.month = b.month
+                    AND t.transaction_type = 'expense'
+                    AND t.category = b.category
+                WHERE b.user_id = ? AND b.month = ? AND b.deleted_at IS NULL
+                ORDER BY b.category
+            `, [req.session.userId, month]);
+
+            // Sum in integer cents, formatted like the DECIMAL columns
+            const cents = value => Math.round(Number(value) * 100);
+            const budgeted = budgets.reduce((sum, budget) => sum + cents(budget.amount), 0);
+            const spent = budgets.reduce((sum, budget) => sum + cents(budget.spent), 0);
+
+            return {
+                month,
+                budgets,
+                totals: {
+                    budgeted: (budgeted / 100).toFixed(2),
+                    spent: (spent / 100).toFixed(2),
+                    remaining: ((budgeted - spent) / 100).toFixed(2)
+                }
+            };
+        });
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(overview);
+    } catch (error) {
+        console.error('Get budget overview error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 app.post('/api/budgets', authenticateUser, async (req, res) => {
     try {
         const { category, amount, month } = req.body;
@@ -296,78 +1237,388 @@ app.post('/api/budgets', authenticateUser, async (req, res) => {
         if (!category || !amount) {
             return res.status(400).json({ error: 'Category and amount are required' });
         }
+        if (!isValidAmount(amount)) {
+            return res.status(400).json({ error: 'amount must be a positive number below 100000000 with at most 2 decimals' });
+        }
 
-        await pool.execute(`
-            INSERT INTO budgets (user_id, category, amount, month)
-            VALUES (?, ?, ?, ?)
-            ON DUPLICATE KEY UPDATE amount = VALUES(amount)
-        `, [req.session.userId, category, amount, budgetMonth]);
+        // LAST_INSERT_ID(id) makes insertId report the existing row on update;
+        // saving over a deleted budget brings it back
+        const result = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [upsert] = await connection.execute(`
+                INSERT INTO budgets (user_id, category, amount, month, change_version)
+                VALUES (?, ?, ?, ?, ?)
+                ON DUPLICATE KEY UPDATE
+                    amount = VALUES(amount),
+                    change_version = VALUES(change_version),
+                    deleted_at = NULL,
+                    id = LAST_INSERT_ID(id)
+            `, [req.session.userId, category, amount, budgetMonth, version]);
+            return upsert;
+        });
 
-        const [budgets] = await pool.execute(
-            'SELECT * FROM budgets WHERE user_id = ? AND month = ?',
-            [req.session.userId, budgetMonth]
-        );
+        // ?return=full keeps the old response: every budget for the month
+        if (req.query.return === 'full') {
+            const [budgets] = await pool.execute(
+                'SELECT * FROM budgets WHERE user_id = ? AND month = ? AND deleted_at IS NULL',
+                [req.session.userId, budgetMonth]
+            );
+            return res.json(budgets);
+        }
 
-        res.json(budgets);
+        res.json({
+            id: result.insertId,
+            user_id: req.session.userId,
+            category,
+            amount: Number(amount).toFixed(2),
+            month: budgetMonth
+        });
     } catch (error) {
         console.error('Save budget error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+app.delete('/api/budgets/:id', authenticateUser, async (req, res) => {
+    try {
+        const deleted = await withTransaction(async (connection) => {
+            const version = await nextDataVersion(connection, req.session.userId);
+            const [result] = await connection.execute(
+                'UPDATE budgets SET deleted_at = CURRENT_TIMESTAMP, change_version = ? WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+                [version, req.params.id, req.session.userId]
+            );
+            return result.affectedRows > 0;
+        });
+
+        if (!deleted) {
+            return res.status(404).json({ error: 'Budget not found' });
+        }
+
+        res.json({ success: true });
+    } catch (error) {
+        console.error('Delete budget error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Delta sync for offline clients. Without a cursor the response starts a full
+// load; with one it returns every transaction and budget written since,
+// tombstones (rows with deleted_at set) included. Rows come in
+// (change_version, id) order, and because a user's writes take their versions
+// one at a time under the users row lock, a row that changes after a page was
+// read reappears with a higher version on a later page: following nextCursor
+// until hasMore is false never misses a change. A cursor older than
+// TOMBSTONE_RETENTION_DAYS might have missed purged deletes, so the client is
+// told to reset and reload instead.
+app.get('/api/sync', authenticateUser, async (req, res) => {
+    try {
+        const issuedAt = Date.now();
+        let cursor = null;
+        if (req.query.since) {
+            cursor = decodeSyncCursor(req.query.since);
+            if (!cursor) {
+                return res.status(400).json({ error: 'Invalid cursor' });
+            }
+            if (cursor.at < issuedAt - TOMBSTONE_RETENTION_DAYS * 86400000) {
+                cursor = null;
+            }
+        }
+
+        const db = readRouter.poolFor(req);
+        const response = { reset: cursor === null, hasMore: false };
+        const positions = {};
+        // Archived rows are read-only and reach the client as transactions.
+        // Archiving stamps each moved row with a new change_version, so it shows
+        // up in this stream even for clients that synced it from the hot table.
+        for (const table of [...SYNC_TABLES, SYNC_ARCHIVE]) {
+            const [version, id] = cursor ? cursor[table] : [0, 0];
+            const [rows] = await db.execute(`
+                /* sync_${table} */
+                SELECT * FROM ${table}
+                WHERE user_id = ? AND (change_version > ? OR (change_version = ? AND id > ?))
+                ORDER BY change_version, id
+                LIMIT ${SYNC_PAGE_SIZE + 1}
+            `, [req.session.userId, version, version, id]);
+
+            const page = rows.slice(0, SYNC_PAGE_SIZE);
+            response.hasMore = response.hasMore || rows.length > SYNC_PAGE_SIZE;
+            const last = page[page.length - 1];
+            positions[table] = last ? [Number(last.change_version), last.id] : [version, id];
+            if (table === SYNC_ARCHIVE) {
+                page.forEach(row => { row.archived = 1; });
+                response.transactions.push(...page);
+            } else {
+                response[table] = page;
+            }
+        }
+
+        response.nextCursor = encodeSyncCursor(positions, issuedAt);
+        res.set('Cache-Control', 'no-store');
+        res.json(response);
+    } catch (error) {
+        console.error('Sync error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 // Dashboard statistics
-app.get('/api/dashboard/stats', authenticateUser, async (req, res) => {
+async function getDashboardStats(db, userId, month) {
+    // Monthly totals per type and category come straight from the rollup
+    const [monthlyStats] = await db.execute(`
+        /* dashboard_month_totals */
+        SELECT 
+            transaction_type,
+            category,
+            total
+        FROM monthly_category_totals 
+        WHERE user_id = ? AND month = ? AND transaction_count > 0
+    `, [userId, month]);
+
+    // Get current balance from at most a few hundred rollup rows
+    const [balanceResult] = await db.execute(`
+        /* dashboard_balance */
+        SELECT 
+            COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN total ELSE -total END), 0) as balance
+        FROM monthly_category_totals 
+        WHERE user_id = ?
+    `, [userId]);
+
+    let income = 0;
+    let expenses = 0;
+    const categoryStats = [];
+    monthlyStats.forEach(stat => {
+        if (stat.transaction_type === 'income') {
+            income += parseFloat(stat.total);
+        } else {
+            expenses += parseFloat(stat.total);
+            categoryStats.push(stat);
+        }
+    });
+    const balance = balanceResult[0]?.balance || 0;
+
+    return {
+        income: Math.round(income * 100) / 100,
+        expenses: Math.round(expenses * 100) / 100,
+        balance: parseFloat(balance),
+        categoryBreakdown: categoryStats.map(stat => ({
+            category: stat.category,
+            amount: parseFloat(stat.total)
+        }))
+    };
+}
+
+app.get('/api/dashboard/stats', authenticateUser, conditionalRead, async (req, res) => {
     try {
         const currentMonth = new Date().toISOString().slice(0, 7);
 
-        // Get monthly income and expenses
-        const [monthlyStats] = await pool.execute(`
-            SELECT 
+        const { value: stats, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, `dashboard:${currentMonth}`,
+            () => getDashboardStats(readRouter.poolFor(req), req.session.userId, currentMonth));
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(stats);
+    } catch (error) {
+        console.error('Get dashboard stats error:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Period labels from `from` to `to` inclusive: YYYY-MM months, or the
+// YYYY-MM-DD Monday starting each week
+function trendPeriods(granularity, from, to) {
+    const periods = [];
+    const cursor = new Date(`${from}T00:00:00Z`);
+    const end = new Date(`${to}T00:00:00Z`);
+    if (granularity === 'month') {
+        cursor.setUTCDate(1);
+        while (cursor <= end) {
+            periods.push(cursor.toISOString().slice(0, 7));
+            cursor.setUTCMonth(cursor.getUTCMonth() + 1);
+        }
+    } else {
+        cursor.setUTCDate(cursor.getUTCDate() - (cursor.getUTCDay() + 6) % 7);
+        while (cursor <= end) {
+            periods.push(cursor.toISOString().slice(0, 10));
+            cursor.setUTCDate(cursor.getUTCDate() + 7);
+        }
+    }
+    return periods;
+}
+
+// Income, expenses, net and running balance per month or week. Monthly series
+// come from the rollup; weekly ones aggregate raw rows through the covering
+// idx_transactions_user_live_date index. Cumulative figures are window sums
+// over the grouped periods, offset by the balance before the range.
+async function getTrends(db, userId, { granularity, from, to, category, byCategory }) {
+    const signed = "CASE WHEN transaction_type = 'income' THEN total ELSE -total END";
+    const fromMonth = from.slice(0, 7);
+    const categoryClause = category ? 'AND category = ?' : '';
+    const categoryParams = category ? [category] : [];
+
+    // Everything before the range: whole months from the rollup, plus for weeks
+    // the days of the starting month that precede `from`
+    const [[opening]] = await db.execute(`
+        /* trends_opening_balance */
+        SELECT COALESCE(SUM(${signed}), 0) AS balance
+        FROM monthly_category_totals
+        WHERE user_id = ? AND month < ? ${categoryClause}
+    `, [userId, fromMonth, ...categoryParams]);
+    let openingBalance = Number(opening.balance);
+
+    let source;
+    let params;
+    if (granularity === 'month') {
+        source = `
+            SELECT month AS period, transaction_type, category, total
+            FROM monthly_category_totals
+            WHERE user_id = ? AND month BETWEEN ? AND ? ${categoryClause}
+        `;
+        params = [userId, fromMonth, to.slice(0, 7), ...categoryParams];
+    } else {
+        // Raw rows of archived years live in transactions_archive
+        const tables = await transactionTables(db, userId, `${fromMonth}-01`);
+        const days = acrossTables(tables, table => `
+            SELECT CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END AS amount
+            FROM ${table}
+            WHERE user_id = ? AND deleted_at IS NULL AND date >= ? AND date < ? ${categoryClause}
+        `, [userId, `${fromMonth}-01`, from, ...categoryParams]);
+        const [[partial]] = await db.execute(`
+            /* trends_opening_days */
+            SELECT COALESCE(SUM(amount), 0) AS balance FROM (${days.sql}) AS days
+        `, days.params);
+        openingBalance += Number(partial.balance);
+
+        ({ sql: source, params } = acrossTables(tables, table => `
+            SELECT
+                DATE_FORMAT(DATE_SUB(date, INTERVAL WEEKDAY(date) DAY), '%Y-%m-%d') AS period,
+                transaction_type, category, amount AS total
+            FROM ${table}
+            WHERE user_id = ? AND deleted_at IS NULL AND date BETWEEN ? AND ? ${categoryClause}
+        `, [userId, from, to, ...categoryParams]));
+    }
+
+    const [rows] = await db.execute(`
+        /* trends_${granularity} */
+        SELECT
+            period,
+            SUM(CASE WHEN transaction_type = 'income' THEN total ELSE 0 END) AS income,
+            SUM(CASE WHEN transaction_type = 'expense' THEN total ELSE 0 END) AS expenses,
+            SUM(SUM(${signed})) OVER (ORDER BY period) AS cumulative_net
+        FROM (${source}) AS entries
+        GROUP BY period
+        ORDER BY period
+    `, params);
+
+    // Periods without transactions carry the balance forward
+    const byPeriod = new Map(rows.map(row => [row.period, row]));
+    let cumulativeNet = 0;
+    const periods = trendPeriods(granularity, from, to).map(period => {
+        const row = byPeriod.get(period);
+        if (row) {
+            cumulativeNet = Number(row.cumulative_net);
+        }
+        const income = row ? Number(row.income) : 0;
+        const expenses = row ? Number(row.expenses) : 0;
+        return {
+            period,
+            income,
+            expenses,
+            net: Math.round((income - expenses) * 100) / 100,
+            balance: Math.round((openingBalance + cumulativeNet) * 100) / 100
+        };
+    });
+
+    const trends = {
+        granularity,
+        from,
+        to,
+        openingBalance: Math.round(openingBalance * 100) / 100,
+        periods
+    };
+
+    if (byCategory) {
+        const [categoryRows] = await db.execute(`
+            /* trends_${granularity}_categories */
+            SELECT
+                period,
                 transaction_type,
-                SUM(amount) as total
-            FROM transactions 
-            WHERE user_id = ? AND DATE_FORMAT(date, '%Y-%m') = ?
-            GROUP BY transaction_type
-        `, [req.session.userId, currentMonth]);
-
-        // Get category breakdown for expenses
-        const [categoryStats] = await pool.execute(`
-            SELECT 
                 category,
-                SUM(amount) as total
-            FROM transactions 
-            WHERE user_id = ? AND transaction_type = 'expense' AND DATE_FORMAT(date, '%Y-%m') = ?
-            GROUP BY category
-        `, [req.session.userId, currentMonth]);
-
-        // Get current balance
-        const [balanceResult] = await pool.execute(`
-            SELECT 
-                COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0) -
-                COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0) as balance
-            FROM transactions 
-            WHERE user_id = ?
-        `, [req.session.userId]);
-
-        const income = monthlyStats.find(stat => stat.transaction_type === 'income')?.total || 0;
-        const expenses = monthlyStats.find(stat => stat.transaction_type === 'expense')?.total || 0;
-        const balance = balanceResult[0]?.balance || 0;
+                SUM(total) AS total,
+                SUM(SUM(total)) OVER (PARTITION BY transaction_type, category ORDER BY period) AS cumulative
+            FROM (${source}) AS entries
+            GROUP BY period, transaction_type, category
+            HAVING SUM(total) <> 0
+            ORDER BY period, transaction_type, category
+        `, params);
+        trends.categories = categoryRows.map(row => ({
+            period: row.period,
+            transaction_type: row.transaction_type,
+            category: row.category,
+            total: Number(row.total),
+            cumulative: Number(row.cumulative)
+        }));
+    }
 
-        res.json({
-            income: parseFloat(income),
-            expenses: parseFloat(expenses),
-            balance: parseFloat(balance),
-            categoryBreakdown: categoryStats.map(stat => ({
-                category: stat.category,
-                amount: parseFloat(stat.total)
-            }))
-        });
+    return trends;
+}
+
+// Trend series over a date range. Query parameters: granularity (month or
+// week), from and to (YYYY-MM-DD; the default is the 12 months up to today),
+// category, and by=category for a per-category breakdown.
+app.get('/api/trends', authenticateUser, conditionalRead, async (req, res) => {
+    try {
+        const granularity = req.query.granularity || 'month';
+        if (!TREND_GRANULARITIES[granularity]) {
+            return res.status(400).json({ error: 'granularity must be month or week' });
+        }
+
+        const today = new Date();
+        const to = req.query.to || today.toISOString().slice(0, 10);
+        const defaultFrom = new Date(Date.UTC(today.getUTCFullYear(), today.getUTCMonth() - 11, 1));
+        const from = req.query.from || defaultFrom.toISOString().slice(0, 10);
+        if (!DATE_PATTERN.test(from) || !DATE_PATTERN.test(to)) {
+            return res.status(400).json({ error: 'from and to must be YYYY-MM-DD dates' });
+        }
+        if (from > to) {
+            return res.status(400).json({ error: 'from must not be after to' });
+        }
+        const maxYears = TREND_GRANULARITIES[granularity];
+        const limit = new Date(`${from}T00:00:00Z`);
+        limit.setUTCFullYear(limit.getUTCFullYear() + maxYears);
+        if (new Date(`${to}T00:00:00Z`) >= limit) {
+            return res.status(400).json({ error: `${granularity}ly trends cover at most ${maxYears} years` });
+        }
+
+        const options = {
+            granularity,
+            from,
+            to,
+            category: req.query.category || null,
+            byCategory: req.query.by === 'category'
+        };
+        const key = `trends:${JSON.stringify(options)}`;
+        const { value: trends, hit } = await responseCache.wrap(req.session.userId, req.dataVersion, key,
+            () => getTrends(readRouter.poolFor(req), req.session.userId, options));
+
+        res.set('X-Cache', hit ? 'HIT' : 'MISS');
+        res.json(trends);
     } catch (error) {
-        console.error('Get dashboard stats error:', error);
+        console.error('Get trends error:', error);
         res.status(500).json({ error: 'Internal server error' });
     }
 });
 
+// Prometheus scrape endpoint. Set METRICS_TOKEN to require
+// `Authorization: Bearer <token>`; METRICS_ENABLED=false turns it off.
+app.get('/metrics', (req, res) => {
+    if (process.env.METRICS_ENABLED === 'false') {
+        return res.status(404).json({ error: 'Not found' });
+    }
+    if (process.env.METRICS_TOKEN && req.get('Authorization') !== `Bearer ${process.env.METRICS_TOKEN}`) {
+        return res.status(401).json({ error: 'Authentication required' });
+    }
+    res.type('text/plain; version=0.0.4').send(metrics.render());
+});
+
 // Serve frontend files
 app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'public', 'index.html'));
@@ -379,14 +1630,109 @@ app.use((err, req, res, next) => {
     res.status(500).json({ error: 'Something went wrong!' });
 });
 
+// Release every MySQL connection this process holds
+async function closeDatabaseConnections() {
+    await Promise.all([pool.end(), readPool.end()]);
+    if (sessionStore) {
+        await sessionStore.close();
+    }
+}
+
+// Stop a worker gracefully: it stops accepting connections, finishes in-flight
+// requests and exits; it is killed if that takes too long
+function retireWorker(worker) {
+    return new Promise((resolve) => {
+        const timer = setTimeout(() => worker.kill(), WORKER_SHUTDOWN_TIMEOUT_MS);
+        worker.once('exit', () => {
+            clearTimeout(timer);
+            resolve();
+        });
+        worker.disconnect();
+    });
+}
+
+function startCluster() {
+    console.log(`Primary ${process.pid} starting ${CLUSTER_WORKERS} workers ` +
+        `(${poolSizes.write} write + ${poolSizes.read} read + ${poolSizes.session} session connections each)`);
+
+    for (let i = 0; i < CLUSTER_WORKERS; i++) {
+        cluster.fork();
+    }
+
+    // Replace workers that crash; planned exits go through retireWorker
+    cluster.on('exit', (worker, code, signal) => {
+        if (!worker.exitedAfterDisconnect) {
+            console.error(`Worker ${worker.process.pid} died (${signal || code}), starting a replacement`);
+            cluster.fork();
+        }
+    });
+
+    // SIGHUP: rolling restart, one worker at a time. Each old worker is only
+    // retired once its replacement is listening, so capacity never drops to zero.
+    let restarting = false;
+    process.on('SIGHUP', async () => {
+        if (restarting) {
+            return;
+        }
+        restarting = true;
+        console.log('Rolling restart of workers');
+
+        for (const worker of Object.values(cluster.workers)) {
+            const replacement = cluster.fork();
+            const [event] = await Promise.race([
+                once(replacement, 'listening').then(() => ['listening']),
+                once(replacement, 'exit').then(() => ['exit'])
+            ]);
+            if (event === 'exit') {
+                console.error('Replacement worker failed to start, aborting rolling restart');
+                break;
+            }
+            await retireWorker(worker);
+        }
+        restarting = false;
+    });
+
+    process.on('SIGTERM', () => {
+        Object.values(cluster.workers).forEach(worker => retireWorker(worker));
+    });
+}
+
 // Start server
 async function startServer() {
     try {
-        await initializeDatabase();
-        app.listen(PORT, () => {
-            console.log(`Server running on port ${PORT}`);
+        // Workers skip initialization: the primary (or the single process) has done it
+        if (!cluster.isWorker) {
+            await initializeDatabase();
+        }
+
+        if (CLUSTER_WORKERS > 1 && !cluster.isWorker) {
+            await closeDatabaseConnections();
+            startCluster();
+            return;
+        }
+
+        const server = app.listen(PORT, () => {
+            console.log(`Server running on port ${PORT}${cluster.isWorker ? ` (worker ${process.pid})` : ''}`);
             console.log(`Frontend available at http://localhost:${PORT}`);
         });
+
+        const purgeTimer = setInterval(() => {
+            purgeTombstones().catch(error => console.error('Tombstone purge error:', error));
+            loginThrottle.prune().catch(error => console.error('Login throttle prune error:', error));
+        }, TOMBSTONE_PURGE_INTERVAL_MS);
+        purgeTimer.unref();
+
+        if (cluster.isWorker) {
+            // The primary disconnects a worker to retire it; once the listening
+            // socket is closed, drain in-flight requests and exit
+            cluster.worker.on('disconnect', () => {
+                server.close(() => {
+                    closeDatabaseConnections()
+                        .catch(error => console.error('Shutdown error:', error))
+                        .finally(() => process.exit(0));
+                });
+            });
+        }
     } catch (error) {
         console.error('Failed to start server:', error);
         process.exit(1);
@@ -0,0 +1,203 @@
+const crypto = require('crypto');
+const session = require('express-session');
+
+// Session backends that avoid a MySQL round trip on every authenticated request.
+// Both keep the `req.session` contract the routes rely on: plain properties
+// such as req.session.userId plus req.session.destroy(callback).
+
+// --- Stateless encrypted cookies -------------------------------------------
+//
+// The whole session is AES-256-GCM encrypted into the cookie, which both hides
+// and authenticates it. `secrets` is ordered newest first: cookies are always
+// issued with the first one, and cookies made with an older one are still
+// accepted and transparently re-issued, so secrets can be rotated without
+// logging anyone out.
+
+function deriveKey(secret) {
+    return crypto.createHash('sha256').update(String(secret)).digest();
+}
+
+function sealCookie(payload, key) {
+    const iv = crypto.randomBytes(12);
+    const cipher = crypto.createCipheriv('aes-256-gcm', key, iv);
+    const ciphertext = Buffer.concat([cipher.update(JSON.stringify(payload), 'utf8'), cipher.final()]);
+    return Buffer.concat([iv, cipher.getAuthTag(), ciphertext]).toString('base64url');
+}
+
+// Returns { payload, keyIndex } or null when no key can open the cookie
+function openCookie(value, keys) {
+    const raw = Buffer.from(value, 'base64url');
+    if (raw.length < 29) {
+        return null;
+    }
+
+    for (let keyIndex = 0; keyIndex < keys.length; keyIndex++) {
+        try {
+            const decipher = crypto.createDecipheriv('aes-256-gcm', keys[keyIndex], raw.subarray(0, 12));
+            decipher.setAuthTag(raw.subarray(12, 28));
+            const plaintext = Buffer.concat([decipher.update(raw.subarray(28)), decipher.final()]);
+            return { payload: JSON.parse(plaintext.toString('utf8')), keyIndex };
+        } catch (error) {
+            // Wrong key or tampered cookie: try the next key
+        }
+    }
+    return null;
+}
+
+function readCookie(header, name) {
+    for (const part of (header || '').split(';')) {
+        const index = part.indexOf('=');
+        if (index !== -1 && part.slice(0, index).trim() === name) {
+            try {
+                return decodeURIComponent(part.slice(index + 1).trim());
+            } catch (error) {
+                // Malformed percent-encoding: treat the cookie as absent
+                return null;
+            }
+        }
+    }
+    return null;
+}
+
+function appendSetCookie(res, cookie) {
+    const existing = res.getHeader('Set-Cookie');
+    res.setHeader('Set-Cookie', existing ? [].concat(existing, cookie) : cookie);
+}
+
+function createCookieSession({ name, secrets, maxAge, secure = false }) {
+    const keys = secrets.map(deriveKey);
+    const attributes = `Path=/; HttpOnly; SameSite=Lax${secure ? '; Secure' : ''}`;
+
+    return (req, res, next) => {
+        const cookie = readCookie(req.headers.cookie, name);
+        const opened = cookie ? openCookie(cookie, keys) : null;
+        const valid = opened && opened.payload.exp > Date.now();
+        const data = valid ? opened.payload.data : {};
+        const original = JSON.stringify(data);
+        let destroyed = false;
+
+        req.session = { ...data };
+        Object.defineProperty(req.session, 'destroy', {
+            enumerable: false,
+            value(callback) {
+                destroyed = true;
+                Object.keys(req.session).forEach(key => delete req.session[key]);
+                if (callback) {
+                    callback(null);
+                }
+            }
+        });
+
+        // Decide on the cookie right before the headers go out
+        const writeHead = res.writeHead;
+        res.writeHead = function (...args) {
+            const current = JSON.stringify(req.session);
+            if (destroyed || (cookie && !valid)) {
+                appendSetCookie(res, `${name}=; ${attributes}; Max-Age=0`);
+            } else if (Object.keys(req.session).length > 0 &&
+                (current !== original || (valid && opened.keyIndex > 0))) {
+                // Keep the original expiry when only re-encrypting with the current secret
+                const exp = current === original ? opened.payload.exp : Date.now() + maxAge;
+                const value = sealCookie({ data: req.session, exp }, keys[0]);
+                appendSetCookie(res, `${name}=${value}; ${attributes}; Max-Age=${Math.floor((exp - Date.now()) / 1000)}`);
+            }
+            return writeHead.apply(this, args);
+        };
+
+        next();
+    };
+}
+
+// --- Read-through cache in front of another express-session store -----------
+//
+// Sessions are cached in process for `ttlMs` after being read or written, and
+// touch() (which express-session calls on every unmodified request) is only
+// forwarded once per `touchIntervalMs`. Writes and destroys always go to the
+// backing store. With several processes a logout elsewhere is seen here within
+// `ttlMs`.
+
+class CachedSessionStore extends session.Store {
+    constructor(backingStore, { ttlMs = 5000, touchIntervalMs = 60000, maxEntries = 10000 } = {}) {
+        super();
+        this.backingStore = backingStore;
+        this.ttlMs = ttlMs;
+        this.touchIntervalMs = touchIntervalMs;
+        this.maxEntries = maxEntries;
+        this.entries = new Map();
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    remember(sid, sess) {
+        const previous = this.entries.get(sid);
+        this.entries.delete(sid);
+        this.entries.set(sid, {
+            json: JSON.stringify(sess),
+            expiresAt: Date.now() + this.ttlMs,
+            touchedAt: previous ? previous.touchedAt : Date.now()
+        });
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    get(sid, callback) {
+        const entry = this.entries.get(sid);
+        if (entry && entry.expiresAt > Date.now()) {
+            this.hits++;
+            // Hand out a fresh copy: express-session mutates what it is given
+            return callback(null, JSON.parse(entry.json));
+        }
+
+        this.misses++;
+        this.backingStore.get(sid, (error, sess) => {
+            if (!error && sess) {
+                this.remember(sid, sess);
+            }
+            callback(error, sess);
+        });
+    }
+
+    set(sid, sess, callback) {
+        this.backingStore.set(sid, sess, (error) => {
+            if (error) {
+                this.entries.delete(sid);
+            } else {
+                this.remember(sid, sess);
+            }
+            if (callback) {
+                callback(error);
+            }
+        });
+    }
+
+    destroy(sid, callback) {
+        this.entries.delete(sid);
+        this.backingStore.destroy(sid, callback);
+    }
+
+    touch(sid, sess, callback) {
+        const entry = this.entries.get(sid);
+        if (entry && Date.now() - entry.touchedAt < this.touchIntervalMs) {
+            return callback && callback(null);
+        }
+        if (entry) {
+            entry.touchedAt = Date.now();
+        }
+        this.backingStore.touch(sid, sess, callback);
+    }
+
+    close() {
+        this.entries.clear();
+        return this.backingStore.close();
+    }
+
+    stats() {
+        return { hits: this.hits, misses: this.misses, size: this.entries.size };
+    }
+}
+
+module.exports = {
+    createCookieSession,
+    CachedSessionStore
+};
\ No newline at end of file
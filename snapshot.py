@@ -0,0 +1,353 @@
+# Columnar on-disk snapshots of the transactions table
+#
+#   python snapshot.py write snapshots/transactions          # first run: full
+#   python snapshot.py write snapshots/transactions          # later: append new rows
+#   python snapshot.py read snapshots/transactions --user 7 --from 2024-01-01 --to 2024-12-31
+#   python snapshot.py info snapshots/transactions
+#   python snapshot.py compact snapshots/transactions
+#
+# A snapshot is a directory holding manifest.json and one or more segments.
+# Each segment stores its rows sorted by (user_id, date, id), one fixed-width
+# little-endian binary file per column, plus index.bin with the first row and
+# row count of every user. Every file starts with a 32-byte header (magic,
+# dtype, row count), so the reader can memory-map a column and hand out
+# slices of one user's date range without copying or parsing anything.
+#
+# `write` appends the rows created after the manifest's (created_at, id)
+# watermark as a new segment. Updates and deletes of rows that are already in
+# a snapshot are not picked up: take a fresh one with `write --full` when
+# those matter. `compact` merges the segments into one. Requires numpy.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from analytics import ALL_TRANSACTIONS, EPOCH_ORDINAL, Categories, category_codes, np, stream_integer_rows
+from benchmark import load_env
+
+FORMAT_VERSION = 1
+MAGIC = b'FTSNAP01'
+HEADER_SIZE = 32
+# Name and dtype of every column file, in the order the query returns them
+COLUMNS = [
+    ('user_id', '<i4'),
+    ('date', '<i4'),  # day ordinal (date.toordinal())
+    ('amount', '<i8'),  # cents
+    ('category', '<u2'),  # code into manifest["categories"]
+    ('type', '<u1'),  # code into manifest["types"]
+    ('id', '<i4'),
+    ('created_at', '<i8'),  # Unix seconds
+]
+CATEGORY_COLUMN, ID_COLUMN, CREATED_COLUMN = 3, 5, 6
+TYPES = ['expense', 'income']
+INDEX_DTYPE = '<i8'
+# Rows younger than this are left for the next append, so transactions that
+# commit a little after their created_at are not skipped by the watermark
+DEFAULT_SETTLE_SECONDS = 60
+
+
+def write_column(path, values, dtype):
+    values = np.ascontiguousarray(values, dtype=dtype)
+    header = MAGIC + dtype.encode('ascii').ljust(8, b'\0') + np.int64(len(values)).tobytes() + bytes(8)
+    with open(path, 'wb') as handle:
+        handle.write(header)
+        values.tofile(handle)
+
+
+def map_column(path, shape_columns=None):
+    """Memory-map a column file after checking its header."""
+    with open(path, 'rb') as handle:
+        header = handle.read(HEADER_SIZE)
+    if header[:8] != MAGIC:
+        raise ValueError(f'{path} is not a snapshot column')
+    dtype = header[8:16].rstrip(b'\0').decode('ascii')
+    rows = int(np.frombuffer(header[16:24], dtype='<i8')[0])
+    shape = (rows, shape_columns) if shape_columns else (rows,)
+    if rows == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=shape)
+
+
+def day_ordinal(value):
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+def to_datetime64(days):
+    """Day ordinals as numpy datetime64[D] values."""
+    return (np.asarray(days, dtype=np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+class Segment:
+    """One immutable group of rows, memory-mapped column by column."""
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = {name: map_column(path / f'{name}.col') for name, _ in COLUMNS}
+        index = map_column(path / 'index.bin', shape_columns=3)
+        self.users, self.starts, self.counts = index[:, 0], index[:, 1], index[:, 2]
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def user_range(self, user_id, start=None, end=None):
+        """(first, stop) rows of a user's transactions dated start..end inclusive."""
+        position = int(np.searchsorted(self.users, user_id))
+        if position == len(self.users) or self.users[position] != user_id:
+            return 0, 0
+        first = int(self.starts[position])
+        stop = first + int(self.counts[position])
+        # Within one user, rows are in date order
+        dates = self.columns['date'][first:stop]
+        low = first + (int(np.searchsorted(dates, start, side='left')) if start is not None else 0)
+        high = first + (int(np.searchsorted(dates, end, side='right')) if end is not None else stop - first)
+        return low, high
+
+    def slice(self, first, stop):
+        return {name: column[first:stop] for name, column in self.columns.items()}
+
+
+class Snapshot:
+    """Read side of a snapshot directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / 'manifest.json').read_text())
+        if self.manifest['format'] != FORMAT_VERSION:
+            raise ValueError(f'Unsupported snapshot format {self.manifest["format"]}')
+        self.categories = self.manifest['categories']
+        self.types = self.manifest['types']
+        self.segments = [Segment(self.path / 'segments' / name) for name in self.manifest['segments']]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def user(self, user_id, start=None, end=None):
+        """Columns of one user's transactions dated start..end inclusive (dates,
+        ISO strings or day ordinals), ordered by (date, id).
+
+        The arrays are views into the mapped files when a single segment holds
+        the user's rows, which is always the case right after `compact`."""
+        start, end = day_ordinal(start), day_ordinal(end)
+        pieces = [segment.slice(*segment.user_range(user_id, start, end)) for segment in self.segments]
+        pieces = [piece for piece in pieces if len(piece['id'])]
+        if not pieces:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+        if len(pieces) == 1:
+            return pieces[0]
+
+        merged = {name: np.concatenate([piece[name] for piece in pieces]) for name, _ in COLUMNS}
+        order = np.lexsort((merged['id'], merged['date']))
+        return {name: column[order] for name, column in merged.items()}
+
+    def scan(self):
+        """Yield every segment's full columns, as mapped views."""
+        for segment in self.segments:
+            yield segment.slice(0, len(segment))
+
+
+def build_segment(path, columns):
+    """Sort rows by (user_id, date, id) and write them with their user index."""
+    order = np.lexsort((columns['id'], columns['date'], columns['user_id']))
+    # Built under a temporary name so a crash never leaves a half-written segment
+    partial = path.with_name(path.name + '.partial')
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    for name, dtype in COLUMNS:
+        write_column(partial / f'{name}.col', columns[name][order], dtype)
+
+    users, starts, counts = np.unique(columns['user_id'][order], return_index=True, return_counts=True)
+    write_column(partial / 'index.bin', np.stack([users, starts, counts], axis=1).astype(np.int64), INDEX_DTYPE)
+    os.replace(partial, path)
+
+
+def save_manifest(path, manifest):
+    # Replace atomically: readers see either the old or the new segment list
+    temporary = path / 'manifest.json.tmp'
+    temporary.write_text(json.dumps(manifest, indent=2) + '\n')
+    os.replace(temporary, path / 'manifest.json')
+
+
+def next_segment_name(manifest):
+    return f'{max((int(name) for name in manifest["segments"]), default=0) + 1:06d}'
+
+
+def commit_segment(path, manifest, columns, replace=False):
+    """Write `columns` as a new segment and list it in the manifest. With
+    `replace`, it becomes the only segment and the old ones are deleted."""
+    name = next_segment_name(manifest)
+    build_segment(path / 'segments' / name, columns)
+
+    old = manifest['segments']
+    manifest['segments'] = [name] if replace else old + [name]
+    save_manifest(path, manifest)
+    if replace:
+        for stale in old:
+            shutil.rmtree(path / 'segments' / stale, ignore_errors=True)
+
+
+def write(args):
+    path = Path(args.path)
+    manifest_file = path / 'manifest.json'
+    existing = json.loads(manifest_file.read_text()) if manifest_file.exists() else None
+    full = args.full or existing is None
+    if full:
+        # The old segments stay listed until the new one replaces them
+        manifest = {'format': FORMAT_VERSION, 'categories': [], 'types': TYPES,
+                    'watermark': {'created_at': 0, 'id': 0},
+                    'segments': existing['segments'] if existing else [], 'rows': 0}
+    else:
+        manifest = existing
+
+    settings = load_env()
+    categories = Categories()
+    for name in manifest['categories']:
+        categories.code(name)
+    category = category_codes(settings, categories)
+    if not categories.names:
+        sys.exit('No transactions to snapshot')
+
+    watermark = manifest['watermark']
+    sql = f"""
+        SELECT user_id, TO_DAYS(date) - 365, CAST(amount * 100 AS SIGNED), {category},
+               transaction_type = 'income', id, UNIX_TIMESTAMP(created_at)
+        FROM {ALL_TRANSACTIONS}
+        WHERE created_at < NOW() - INTERVAL {int(args.settle_seconds)} SECOND
+          AND (created_at > FROM_UNIXTIME({int(watermark['created_at'])})
+               OR (created_at = FROM_UNIXTIME({int(watermark['created_at'])}) AND id > {int(watermark['id'])}));
+    """
+
+    started = time.perf_counter()
+    path.mkdir(parents=True, exist_ok=True)
+    # Rows are spooled to disk as they stream in; only sorting them into the
+    # segment needs the sort keys and one column at a time in memory
+    spool = path / 'spool'
+    try:
+        count, newest = spool_rows(spool, stream_integer_rows(settings, sql, len(COLUMNS)))
+        if count == 0 and not full:
+            print('No new transactions since the last snapshot')
+            return
+
+        columns = {name: map_spool(spool / f'{name}.col', dtype, count) for name, dtype in COLUMNS}
+        manifest['categories'] = categories.names
+        if count:
+            # The newest (created_at, id) written becomes the next append's starting point
+            manifest['watermark'] = {'created_at': newest[0], 'id': newest[1]}
+        manifest['rows'] = count if full else manifest['rows'] + count
+        commit_segment(path, manifest, columns, replace=full)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+
+    print(f'{"Wrote" if full else "Appended"} {count} transactions in {time.perf_counter() - started:.2f}s '
+          f'({len(manifest["segments"])} segments, {manifest["rows"]} rows)')
+
+
+def spool_rows(directory, chunks):
+    """Append each streamed chunk to one raw file per column, so only a chunk
+    is held in memory while the query runs. Returns the row count and the
+    newest (created_at, id)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {name: open(directory / f'{name}.col', 'wb') for name, _ in COLUMNS}
+    count, newest = 0, (0, 0)
+    try:
+        for rows in chunks:
+            codes = rows[:, CATEGORY_COLUMN]
+            # FIELD() yields -1 for a category created after category_codes() read the list
+            if codes.min() < 0 or codes.max() > np.iinfo(np.uint16).max:
+                sys.exit('A category was added while the snapshot was being taken: run write again')
+            for index, (name, dtype) in enumerate(COLUMNS):
+                np.ascontiguousarray(rows[:, index], dtype=dtype).tofile(files[name])
+            last = np.lexsort((rows[:, ID_COLUMN], rows[:, CREATED_COLUMN]))[-1]
+            newest = max(newest, (int(rows[last, CREATED_COLUMN]), int(rows[last, ID_COLUMN])))
+            count += len(rows)
+    finally:
+        for handle in files.values():
+            handle.close()
+    return count, newest
+
+
+def map_spool(path, dtype, count):
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,)) if count else np.zeros(0, dtype=dtype)
+
+
+def compact(args):
+    path = Path(args.path)
+    snapshot = Snapshot(path)
+    if len(snapshot.segments) < 2:
+        print('Nothing to compact')
+        return
+    columns = {name: np.concatenate([segment.columns[name] for segment in snapshot.segments])
+               for name, _ in COLUMNS}
+    commit_segment(path, snapshot.manifest, columns, replace=True)
+    print(f'Compacted {len(snapshot.segments)} segments into one ({len(columns["id"])} rows)')
+
+
+def info(args):
+    snapshot = Snapshot(args.path)
+    size = sum(file.stat().st_size for file in Path(args.path).rglob('*') if file.is_file())
+    users = np.unique(np.concatenate([segment.users for segment in snapshot.segments])) \
+        if snapshot.segments else []
+    watermark = snapshot.manifest['watermark']
+    print(f'{len(snapshot)} rows, {len(users)} users, {len(snapshot.segments)} segments, {size / 1e6:.1f} MB')
+    print(f'Watermark: created_at {time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(watermark["created_at"]))} UTC, '
+          f'id {watermark["id"]}')
+
+
+def read(args):
+    snapshot = Snapshot(args.path)
+    started = time.perf_counter()
+    rows = snapshot.user(args.user, args.start, args.end)
+    income = rows['type'] == TYPES.index('income')
+    totals = (int(rows['amount'][income].sum()), int(rows['amount'][~income].sum()))
+    elapsed = time.perf_counter() - started
+
+    print(f'{len(rows["id"])} transactions for user {args.user} in {elapsed * 1000:.2f}ms: '
+          f'income {totals[0] / 100:.2f}, expenses {totals[1] / 100:.2f}')
+    for day, amount, category, kind in list(zip(to_datetime64(rows['date'][:args.limit]).tolist(),
+                                                 rows['amount'][:args.limit].tolist(),
+                                                 rows['category'][:args.limit].tolist(),
+                                                 rows['type'][:args.limit].tolist())):
+        print(f'  {day}  {snapshot.types[kind]:<8}{snapshot.categories[category]:<16}{amount / 100:>12.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar snapshots of the transactions table')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    write_parser = commands.add_parser('write', help='append new transactions, or take a full snapshot')
+    write_parser.add_argument('path')
+    write_parser.add_argument('--full', action='store_true', help='replace the snapshot instead of appending')
+    write_parser.add_argument('--settle-seconds', type=int, default=DEFAULT_SETTLE_SECONDS,
+                              help='skip rows created more recently than this')
+    write_parser.set_defaults(handler=write)
+
+    read_parser = commands.add_parser('read', help="summarize one user's transactions")
+    read_parser.add_argument('path')
+    read_parser.add_argument('--user', type=int, required=True)
+    read_parser.add_argument('--from', dest='start', help='YYYY-MM-DD')
+    read_parser.add_argument('--to', dest='end', help='YYYY-MM-DD')
+    read_parser.add_argument('--limit', type=int, default=10, help='rows to print')
+    read_parser.set_defaults(handler=read)
+
+    info_parser = commands.add_parser('info', help='show snapshot size and watermark')
+    info_parser.add_argument('path')
+    info_parser.set_defaults(handler=info)
+
+    compact_parser = commands.add_parser('compact', help='merge all segments into one')
+    compact_parser.add_argument('path')
+    compact_parser.set_defaults(handler=compact)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()